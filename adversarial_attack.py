@@ -1,5 +1,6 @@
 import random
-from sklearn.metrics import classification_report
+import itertools
+from collections import Counter
 import joblib
 import os
 import re
@@ -277,13 +278,72 @@ def comprehensive_preprocess(raw_email):
     return body
 # 使用示例
 import numpy as np
+import weakref
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+class FeatureImportanceIndex:
+    """
+    特征重要性排序索引：用 argpartition 取出前 k 个后只对这一段排序，
+    结果按 k 缓存（数组 + frozenset），k 超出已排序范围时才按倍数扩展
+    """
+    def __init__(self, feature_importance, feature_names):
+        self.importance = np.asarray(feature_importance)
+        self.feature_names = np.asarray(feature_names, dtype=object)
+        self._spam_order = np.empty(0, dtype=int)  # 最大的若干个，按重要性升序
+        self._ham_order = np.empty(0, dtype=int)   # 最小的若干个，按重要性升序
+        self._words = {}
+    
+    def _ranked(self, k, spam):
+        n = len(self.importance)
+        order = self._spam_order if spam else self._ham_order
+        if len(order) < min(k, n):
+            size = min(n, max(k, 2 * len(order), 64))
+            if spam:
+                order = np.argpartition(self.importance, n - size)[n - size:]
+            else:
+                order = np.argpartition(self.importance, size - 1)[:size]
+            order = order[np.argsort(self.importance[order], kind='stable')]
+            if spam:
+                self._spam_order = order
+            else:
+                self._ham_order = order
+        return order
+    
+    def top_spam_indices(self, k):
+        """重要性最大的 k 个特征下标（升序，与 np.argsort(...)[-k:] 一致）"""
+        if k <= 0:
+            return np.empty(0, dtype=int)
+        return self._ranked(k, spam=True)[-k:]
+    
+    def top_ham_indices(self, k):
+        """重要性最小的 k 个特征下标（升序，与 np.argsort(...)[:k] 一致）"""
+        if k <= 0:
+            return np.empty(0, dtype=int)
+        return self._ranked(k, spam=False)[:k]
+    
+    def words(self, k, spam):
+        """前 k 个特征词：(frozenset 用于成员判断, 数组用于随机抽取)"""
+        key = (k, spam)
+        if key not in self._words:
+            indices = self.top_spam_indices(k) if spam else self.top_ham_indices(k)
+            names = self.feature_names[indices]
+            self._words[key] = (frozenset(names), names)
+        return self._words[key]
+
+# 每个模型只建立一次特征重要性索引，被该模型的所有伪装器共享
+_importance_indexes = weakref.WeakKeyDictionary()
+
+def get_importance_index(model, vectorizer, feature_importance):
+    index = _importance_indexes.get(model)
+    if index is None:
+        index = FeatureImportanceIndex(feature_importance, vectorizer.get_feature_names_out())
+        _importance_indexes[model] = index
+    return index
+
 class AdvancedSpamDisguiser:
     def __init__(self, model, vectorizer):
         self.model = model
         self.vectorizer = vectorizer
-        self.feature_names = vectorizer.get_feature_names_out()
         
         # 获取特征重要性
         if hasattr(model, 'coef_'):
@@ -292,6 +352,15 @@ class AdvancedSpamDisguiser:
             self.feature_importance = model.feature_importances_
         else:
             self.feature_importance = None
+        
+        if self.feature_importance is not None:
+            self.importance_index = get_importance_index(model, vectorizer, self.feature_importance)
+            self.feature_names = self.importance_index.feature_names
+        else:
+            self.importance_index = None
+            self.feature_names = vectorizer.get_feature_names_out()
+        
+        self.delta_scorer = None  # 增量打分器，首次贪心替换时创建
     
     def get_top_spam_features(self, top_n=20):
         """获取最重要的垃圾邮件特征词"""
@@ -299,7 +368,7 @@ class AdvancedSpamDisguiser:
             return []
         
         # 获取对垃圾邮件分类贡献最大的特征
-        spam_indices = np.argsort(self.feature_importance)[-top_n:]
+        spam_indices = self.importance_index.top_spam_indices(top_n)
         spam_features = [(self.feature_names[i], self.feature_importance[i]) 
                         for i in spam_indices]
         return spam_features
@@ -310,7 +379,7 @@ class AdvancedSpamDisguiser:
             return []
         
         # 获取对正常邮件分类贡献最大的特征
-        ham_indices = np.argsort(self.feature_importance)[:top_n]
+        ham_indices = self.importance_index.top_ham_indices(top_n)
         ham_features = [(self.feature_names[i], self.feature_importance[i]) 
                        for i in ham_indices]
         return ham_features
@@ -320,9 +389,9 @@ class AdvancedSpamDisguiser:
         if self.feature_importance is None:
             return text
         
-        # 获取重要特征
-        top_spam_features = [feat[0] for feat in self.get_top_spam_features(30)]
-        top_ham_features = [feat[0] for feat in self.get_top_ham_features(30)]
+        # 获取重要特征（索引已按模型缓存，不再每次排序）
+        top_spam_features, _ = self.importance_index.words(30, spam=True)
+        _, top_ham_features = self.importance_index.words(30, spam=False)
         
         words = text.lower().split()
         replaced_count = 0
@@ -336,6 +405,23 @@ class AdvancedSpamDisguiser:
                 replaced_count += 1
         
         return ' '.join(words)
+    
+    def greedy_coefficient_replacement(self, text, target_probability=0.3, max_edits=20):
+        """
+        基于增量打分的贪心替换（仅线性模型）：每次编辑只更新受影响的词项，
+        在所有候选删除/替换/插入中选择使垃圾邮件 logit 下降最多的一个
+        """
+        if not hasattr(self.model, 'coef_'):
+            return text
+        
+        from delta_scorer import IncrementalLinearScorer, greedy_coefficient_attack
+        if self.delta_scorer is None:
+            self.delta_scorer = IncrementalLinearScorer(self.model, self.vectorizer,
+                                                        preprocess=complete_preprocess)
+        
+        attacked_text, _ = greedy_coefficient_attack(self.delta_scorer, text,
+                                                     target_probability, max_edits)
+        return attacked_text
 class SemanticPreservingRewriter:
     def __init__(self):
         self.synonym_dict = {
@@ -423,11 +509,30 @@ class SemanticPreservingRewriter:
         
         return random.choice(contexts)
 class AdvancedAdversarialAttacker:
-    def __init__(self, model, vectorizer):
+    def __init__(self, model, vectorizer, search='hybrid', beam_width=4, num_candidates=8,
+                 featurize=None):
+        """
+        search: 'hybrid' 为原始的逐步随机攻击，'beam' 为批量评分的束搜索攻击
+        beam_width / num_candidates: 束搜索保留的候选数 B，以及每个候选每轮生成的扰动数 K
+        featurize: 将原始文本列表转换为模型输入（稀疏矩阵）的函数；
+                   默认为 complete_preprocess + vectorizer，特征构造不同的模型（如带对抗性特征的 Model 3）需传入
+        """
         self.model = model
         self.vectorizer = vectorizer
         self.disguiser = AdvancedSpamDisguiser(model, vectorizer)
         self.rewriter = SemanticPreservingRewriter()
+        self.search = search
+        self.beam_width = beam_width
+        self.num_candidates = num_candidates
+        self.model_calls = 0  # 模型调用次数（predict / predict_proba 各算一次）
+        self._accepts_sparse = None
+        self.featurize = featurize
+    
+    def features(self, texts):
+        """原始文本 -> 模型输入的稀疏特征矩阵"""
+        if self.featurize is not None:
+            return self.featurize(texts)
+        return self.vectorizer.transform([complete_preprocess(text) for text in texts])
     
     def method1_feature_manipulation(self, text):
         """方法1：特征操纵攻击"""
@@ -449,7 +554,7 @@ class AdvancedAdversarialAttacker:
             return self.rewriter.generate_plausible_context(text)
         return text
     
-    def method4_hybrid_attack(self, text, iterations=3):
+    def method4_hybrid_attack(self, text, iterations=3, verbose=True):
         """方法4：混合攻击（最强）"""
         current_text = text
         
@@ -465,82 +570,234 @@ class AdvancedAdversarialAttacker:
             current_text = method(current_text)
             
             # 测试当前文本是否能够欺骗模型
-            processed = complete_preprocess(current_text)
-            vector = self.vectorizer.transform([processed])
+            vector = self.features([current_text])
             
             if hasattr(self.model, 'predict'):
                 dense = vector.toarray()
                 prediction = self.model.predict(dense)[0]
                 probability = self.model.predict_proba(dense)[0]
+                self.model_calls += 2
                 
                 # 如果已经被分类为正常邮件，提前停止
                 if prediction == 0 and probability[0] > 0.7:
-                    print(f"在第 {i+1} 次迭代后成功欺骗模型")
+                    if verbose:
+                        print(f"在第 {i+1} 次迭代后成功欺骗模型")
                     break
         
         return current_text
     
-    def test_attack_effectiveness(self, original_spam_texts, num_tests=100):
-        """测试攻击效果"""
-        results = []
+    def score_texts(self, texts):
+        """
+        一次批量调用计算多段文本的正常邮件概率
+        模型支持稀疏输入时直接使用稀疏矩阵，否则整批转为稠密矩阵
+        """
+        vectors = self.features(texts)
+        self.model_calls += 1
         
-        for original_text in original_spam_texts[:num_tests]:
-            print(f"\n原始垃圾邮件: {original_text}")
+        if self._accepts_sparse is None:
+            try:
+                probabilities = self.model.predict_proba(vectors)
+                self._accepts_sparse = True
+                return probabilities[:, 0]
+            except (TypeError, ValueError):
+                self._accepts_sparse = False
+        
+        if self._accepts_sparse:
+            return self.model.predict_proba(vectors)[:, 0]
+        return self.model.predict_proba(vectors.toarray())[:, 0]
+    
+    def method4_beam_attack(self, text, iterations=3, verbose=True):
+        """
+        方法4（束搜索版）：每轮为束中每个文本生成 K 个随机扰动，
+        所有候选一次批量评分，保留正常邮件概率最高的 B 个
+        """
+        methods = [
+            self.method1_feature_manipulation,
+            self.method2_semantic_rewriting,
+            self.method3_context_injection
+        ]
+        beam = [(self.score_texts([text])[0], text)]
+        
+        for i in range(iterations):
+            seen = {candidate for _, candidate in beam}
+            candidates = []
+            for _, beam_text in beam:
+                for _ in range(self.num_candidates):
+                    candidate = random.choice(methods)(beam_text)
+                    if candidate not in seen:
+                        seen.add(candidate)
+                        candidates.append(candidate)
             
-            # 测试原始文本
-            original_processed = complete_preprocess(original_text)
-            original_vector = self.vectorizer.transform([original_processed])
-            original_dense = original_vector.toarray()
-            original_pred = self.model.predict(original_dense)[0]
-            original_prob = self.model.predict_proba(original_dense)[0]
+            if not candidates:
+                break
             
-            # 应用混合攻击
-            attacked_text = self.method4_hybrid_attack(original_text)
+            ham_probs = self.score_texts(candidates)
+            # 父节点也参与排序，保证最优结果不会变差
+            pool = beam + list(zip(ham_probs, candidates))
+            pool.sort(key=lambda item: item[0], reverse=True)
+            beam = pool[:self.beam_width]
             
-            # 测试攻击后文本
-            attacked_processed = complete_preprocess(attacked_text)
-            attacked_vector = self.vectorizer.transform([attacked_processed])
-            attacked_dense = attacked_vector.toarray()
-            attacked_pred = self.model.predict(attacked_dense)[0]
-            attacked_prob = self.model.predict_proba(attacked_dense)[0]
+            # 与 method4_hybrid_attack 相同的提前停止条件
+            if beam[0][0] > 0.7:
+                if verbose:
+                    print(f"在第 {i+1} 次迭代后成功欺骗模型")
+                break
+        
+        return beam[0][1]
+    
+    def attack_single(self, original_text, verbose=True):
+        """对单封垃圾邮件执行混合攻击，返回攻击前后的预测结果"""
+        # 测试原始文本
+        original_vector = self.features([original_text])
+        original_dense = original_vector.toarray()
+        original_pred = self.model.predict(original_dense)[0]
+        original_prob = self.model.predict_proba(original_dense)[0]
+        
+        # 应用混合攻击
+        if self.search == 'beam':
+            attacked_text = self.method4_beam_attack(original_text, verbose=verbose)
+        else:
+            attacked_text = self.method4_hybrid_attack(original_text, verbose=verbose)
+        
+        # 测试攻击后文本
+        attacked_vector = self.features([attacked_text])
+        attacked_dense = attacked_vector.toarray()
+        attacked_pred = self.model.predict(attacked_dense)[0]
+        attacked_prob = self.model.predict_proba(attacked_dense)[0]
+        
+        return {
+            'original_text': original_text,
+            'original_pred': original_pred,
+            'original_prob': original_prob,
+            'attacked_text': attacked_text,
+            'attacked_pred': attacked_pred,
+            'attacked_prob': attacked_prob,
+            'success': (original_pred == 1 and attacked_pred == 0)
+        }
+    
+    def test_attack_effectiveness(self, original_spam_texts, num_tests=100, seed=None, verbose=True,
+                                  sink=None):
+        """
+        测试攻击效果
+        seed: 给定时每封邮件使用由 (seed, 序号) 派生的独立随机种子，结果可复现
+        verbose: 是否打印每个样本的全文和预测
+        sink: adversarial_store.AdversarialResultSink，给定时每个结果产生后立即写入结果库，
+              不在内存中保留，返回值为结果库的统计信息
+        """
+        results = []
+        attempted = succeeded = 0
+        
+        for index, original_text in enumerate(itertools.islice(original_spam_texts, num_tests)):
+            if seed is not None:
+                seed_everything(sample_seed(seed, index))
             
-            results.append({
-                'original_text': original_text,
-                'original_pred': original_pred,
-                'original_prob': original_prob,
-                'attacked_text': attacked_text,
-                'attacked_pred': attacked_pred,
-                'attacked_prob': attacked_prob,
-                'success': (original_pred == 1 and attacked_pred == 0)
-            })
+            if verbose:
+                print(f"\n原始垃圾邮件: {original_text}")
             
-            print(f"攻击后: {attacked_text}")
-            print(f"原始预测: {'垃圾邮件' if original_pred == 1 else '正常邮件'} (概率: {original_prob[1]:.3f})")
-            print(f"攻击后预测: {'垃圾邮件' if attacked_pred == 1 else '正常邮件'} (概率: {attacked_prob[1]:.3f})")
-            print(f"攻击成功: {'是' if results[-1]['success'] else '否'}")
+            result = self.attack_single(original_text, verbose=verbose)
+            attempted += 1
+            succeeded += bool(result['success'])
+            if sink is not None:
+                sink.write(result)
+            else:
+                results.append(result)
+            
+            if verbose:
+                print(f"攻击后: {result['attacked_text']}")
+                print(f"原始预测: {'垃圾邮件' if result['original_pred'] == 1 else '正常邮件'} (概率: {result['original_prob'][1]:.3f})")
+                print(f"攻击后预测: {'垃圾邮件' if result['attacked_pred'] == 1 else '正常邮件'} (概率: {result['attacked_prob'][1]:.3f})")
+                print(f"攻击成功: {'是' if result['success'] else '否'}")
         
         # 统计成功率
-        success_rate = sum(1 for r in results if r['success']) / len(results)
+        success_rate = succeeded / attempted if attempted else 0.0
         print(f"\n=== 总体攻击成功率: {success_rate:.2%} ===")
         
-        return results
-def create_adversarial_examples_by_transfer(original_texts, target_model, reference_ham_emails):
+        return sink.summary if sink is not None else results
+def seed_everything(seed):
+    """同时设置 random 和 np.random 的全局种子（攻击方法都使用全局随机状态）"""
+    random.seed(seed)
+    np.random.seed(seed)
+def sample_seed(base_seed, index):
+    """每封邮件独立的确定性种子，只取决于 (base_seed, 序号)，与分片方式和进程数无关"""
+    return int(np.random.SeedSequence([base_seed, index]).generate_state(1)[0])
+_worker_attacker = None
+def _init_attack_worker(model_path, vectorizer_path, attacker_kwargs):
+    """进程池初始化：每个工作进程只加载一次模型和向量器"""
+    global _worker_attacker
+    # 旧版向量器序列化时引用了 __main__.complete_preprocess
+    import __main__
+    if not hasattr(__main__, 'complete_preprocess'):
+        __main__.complete_preprocess = complete_preprocess
+    model = joblib.load(model_path)
+    vectorizer = joblib.load(vectorizer_path)
+    _worker_attacker = AdvancedAdversarialAttacker(model, vectorizer, **attacker_kwargs)
+def _attack_shard(shard):
+    """在工作进程中处理一个分片，每封邮件先按自己的种子重置随机状态"""
+    results = []
+    for original_text, seed in shard:
+        seed_everything(seed)
+        results.append(_worker_attacker.attack_single(original_text, verbose=False))
+    return results
+def parallel_attack_effectiveness(model_path, vectorizer_path, original_spam_texts,
+                                  num_tests=100, seed=0, workers=None, shard_size=None,
+                                  sink=None, **attacker_kwargs):
+    """
+    并行版 test_attack_effectiveness：将垃圾邮件分片到进程池中攻击
+    attacker_kwargs 传给 AdvancedAdversarialAttacker（例如 search='beam'）
+    结果按原始顺序合并，与相同 seed 的串行运行
+    （attacker.test_attack_effectiveness(texts, num_tests, seed=seed)）完全一致
+    sink: 给定时各分片结果按顺序到达后立即写入结果库，返回结果库的统计信息
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    texts = original_spam_texts[:num_tests]
+    tasks = [(text, sample_seed(seed, index)) for index, text in enumerate(texts)]
+    if not tasks:
+        return sink.summary if sink is not None else []
+    
+    workers = workers or os.cpu_count() or 1
+    if shard_size is None:
+        shard_size = max(1, -(-len(tasks) // (workers * 4)))
+    shards = [tasks[i:i + shard_size] for i in range(0, len(tasks), shard_size)]
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_attack_worker,
+                             initargs=(model_path, vectorizer_path, attacker_kwargs)) as executor:
+        results = []
+        succeeded = 0
+        for shard_results in executor.map(_attack_shard, shards):
+            for result in shard_results:
+                succeeded += bool(result['success'])
+                if sink is not None:
+                    sink.write(result)
+                else:
+                    results.append(result)
+    
+    success_rate = succeeded / len(tasks)
+    print(f"\n=== 总体攻击成功率: {success_rate:.2%} ===")
+    
+    return sink.summary if sink is not None else results
+def create_adversarial_examples_by_transfer(original_texts, target_model, reference_ham_emails=None,
+                                            ham_index=None):
     """
     通过参考正常邮件风格创建对抗样本
+    reference_ham_emails 为 None 时使用持久化的正常邮件风格索引（ham_stats.HamStyleIndex），
+    不再每次重新预处理全部正常邮件
     """
     adversarial_examples = []
     
-    # 分析正常邮件的语言模式
-    ham_word_freq = {}
-    for email in reference_ham_emails:
-        processed = complete_preprocess(email)
-        words = processed.split()
-        for word in words:
-            ham_word_freq[word] = ham_word_freq.get(word, 0) + 1
-    
-    # 获取最常见的正常邮件词汇
-    common_ham_words = sorted(ham_word_freq.items(), key=lambda x: x[1], reverse=True)[:50]
-    common_ham_words = [word for word, freq in common_ham_words]
+    if reference_ham_emails is None:
+        if ham_index is None:
+            from ham_stats import HamStyleIndex
+            ham_index = HamStyleIndex.load(complete_preprocess)
+        common_ham_words = [word for word, freq in ham_index.top_terms(50)]
+    else:
+        # 分析正常邮件的语言模式
+        ham_word_freq = Counter()
+        for email in reference_ham_emails:
+            ham_word_freq.update(complete_preprocess(email).split())
+        
+        # 获取最常见的正常邮件词汇
+        common_ham_words = [word for word, freq in ham_word_freq.most_common(50)]
     
     for original_text in original_texts:
         words = original_text.split()
@@ -568,6 +825,7 @@ def create_adversarial_examples_by_transfer(original_texts, target_model, refere
 import pandas as pd
 import os
 from datetime import datetime
+from adversarial_store import AdversarialResultSink, export_all, iter_results
 
 def save_adversarial_results(results, filename=None):
     """将对抗样本结果保存为CSV文件"""
@@ -633,6 +891,7 @@ def save_as_readable_text(results, filename=None):
     print(f"✅ 文本报告已保存到: {filename}")
 
 import shutil
+from adversarial_store import CATEGORIES, categorize
 
 def organize_adversarial_samples(results, base_dir='adversarial_samples'):
     """按攻击效果分类组织样本"""
@@ -643,12 +902,7 @@ def organize_adversarial_samples(results, base_dir='adversarial_samples'):
     os.makedirs(base_dir)
     
     # 创建子目录
-    categories = {
-        'high_success': '高成功率（概率降低>0.5）',
-        'medium_success': '中等成功率（概率降低0.2-0.5）', 
-        'low_success': '低成功率（概率降低<0.2）',
-        'failed': '攻击失败'
-    }
+    categories = CATEGORIES
     
     for category in categories:
         os.makedirs(os.path.join(base_dir, category))
@@ -658,15 +912,7 @@ def organize_adversarial_samples(results, base_dir='adversarial_samples'):
     
     for i, result in enumerate(results):
         prob_change = result['attacked_prob'][1] - result['original_prob'][1]
-        
-        if prob_change <= -0.5:
-            category = 'high_success'
-        elif prob_change <= -0.2:
-            category = 'medium_success'
-        elif prob_change < 0:
-            category = 'low_success'
-        else:
-            category = 'failed'
+        category = categorize(prob_change)
         
         # 保存样本
         filename = f"sample_{i+1}.txt"
@@ -736,35 +982,18 @@ def save_for_retraining(results, filename='adversarial_training_data.csv'):
     
     return df
 def comprehensive_save(results, base_dir='adversarial_analysis'):
-    """综合保存所有格式"""
-    
-    # 创建主目录
-    if not os.path.exists(base_dir):
-        os.makedirs(base_dir)
-    
+    """
+    综合保存所有格式
+    结果先逐条写入结果库，再由 adversarial_store.export_all 单次扫描导出全部文件
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    store_path = os.path.join(base_dir, f'adversarial_results_{timestamp}.jsonl')
     
-    # 1. 保存CSV
-    csv_path = os.path.join(base_dir, f'adversarial_samples_{timestamp}.csv')
-    save_adversarial_results(results, csv_path)
-    
-    # 3. 保存可读文本
-    txt_path = os.path.join(base_dir, f'adversarial_report_{timestamp}.txt')
-    save_as_readable_text(results, txt_path)
+    with AdversarialResultSink(store_path) as sink:
+        for result in results:
+            sink.write(result)
     
-    # 4. 分类保存
-    organize_adversarial_samples(results, os.path.join(base_dir, 'categorized_samples'))
-    
-    # 5. 保存训练数据
-    training_path = os.path.join(base_dir, f'adversarial_training_data_{timestamp}.csv')
-    save_for_retraining(results, training_path)
-    
-    print(f"\n🎉 所有文件已保存到: {base_dir}/")
-    print("📋 生成的文件:")
-    print(f"  📄 CSV数据: adversarial_samples_{timestamp}.csv")
-    print(f"  📝 文本报告: adversarial_report_{timestamp}.txt")
-    print(f"  📁 分类样本: categorized_samples/")
-    print(f"  🎯 训练数据: adversarial_training_data_{timestamp}.csv")
+    return export_all(store_path, base_dir)
 
 
 if __name__ == "__main__":
@@ -777,13 +1006,18 @@ if __name__ == "__main__":
     vectorizer = joblib.load('vectorizer.joblib')
     
     attacker = AdvancedAdversarialAttacker(model, vectorizer)
-    results = attacker.test_attack_effectiveness(test_spam_emails)
+    
+    # 结果边攻击边写入结果库，报告和分类样本再从结果库导出
+    store_path = os.path.join('adversarial_analysis',
+                              f"adversarial_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    with AdversarialResultSink(store_path) as sink:
+        attacker.test_attack_effectiveness(test_spam_emails, sink=sink)
 
     print("\n=== 最成功的对抗样本 ===")
-    successful_attacks = [r for r in results if r['success']]
-    for i, attack in enumerate(successful_attacks[:3]):
+    successful_attacks = (r for r in iter_results(store_path) if r['success'])
+    for i, attack in enumerate(itertools.islice(successful_attacks, 3)):
         print(f"\n案例 {i+1}:")
         print(f"原始: {attack['original_text']}")
         print(f"攻击后: {attack['attacked_text']}")
         print(f"垃圾邮件概率: {attack['original_prob'][1]:.3f} → {attack['attacked_prob'][1]:.3f}")
-    comprehensive_save(results)
\ No newline at end of file
+    export_all(store_path)
\ No newline at end of file
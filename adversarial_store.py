@@ -0,0 +1,233 @@
+"""
+对抗样本结果的流式存储
+每个攻击结果产生后立即以一行 JSON 追加写入结果库（.jsonl），内存中只保留计数；
+CSV、文本报告、分类样本归档（见 sample_archive.py）和训练数据都在需要时从结果库单次扫描导出
+"""
+import csv
+import json
+import os
+from datetime import datetime
+
+# 按概率变化划分的样本类别
+CATEGORIES = {
+    'high_success': '高成功率（概率降低>0.5）',
+    'medium_success': '中等成功率（概率降低0.2-0.5）',
+    'low_success': '低成功率（概率降低<0.2）',
+    'failed': '攻击失败'
+}
+
+
+def categorize(prob_change):
+    """根据垃圾邮件概率变化返回样本类别"""
+    if prob_change <= -0.5:
+        return 'high_success'
+    elif prob_change <= -0.2:
+        return 'medium_success'
+    elif prob_change < 0:
+        return 'low_success'
+    return 'failed'
+
+
+def prob_change(record):
+    return record['attacked_prob'][1] - record['original_prob'][1]
+
+
+def to_record(result, index):
+    """攻击结果转换为可 JSON 序列化的记录（键名与攻击结果字典一致）"""
+    return {
+        'index': index,
+        'original_text': result['original_text'],
+        'attacked_text': result['attacked_text'],
+        'original_pred': int(result['original_pred']),
+        'attacked_pred': int(result['attacked_pred']),
+        'original_prob': [float(p) for p in result['original_prob']],
+        'attacked_prob': [float(p) for p in result['attacked_prob']],
+        'success': bool(result['success']),
+    }
+
+
+def empty_summary():
+    return {'total': 0, 'success': 0, 'categories': {category: 0 for category in CATEGORIES}}
+
+
+def summary_path(store_path):
+    return store_path + '.summary.json'
+
+
+class AdversarialResultSink:
+    """
+    追加写入的结果库
+    已存在的结果库会在末尾继续追加，序号接着已有记录编号
+    """
+
+    def __init__(self, path):
+        self.path = path
+        store_dir = os.path.dirname(path)
+        if store_dir and not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        self.summary = load_summary(path) if os.path.exists(path) else empty_summary()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, result):
+        """写入一个攻击结果，返回其记录"""
+        record = to_record(result, self.summary['total'])
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        self.summary['total'] += 1
+        self.summary['success'] += record['success']
+        self.summary['categories'][categorize(prob_change(record))] += 1
+        return record
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        _write_summary(self.path, self.summary)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _write_summary(store_path, summary):
+    summary = dict(summary, store_bytes=os.path.getsize(store_path))
+    with open(summary_path(store_path), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+def iter_results(store_path, category=None):
+    """逐条读取结果库中的记录，可只取某一类别"""
+    with open(store_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if category is None or categorize(prob_change(record)) == category:
+                yield record
+
+
+def load_summary(store_path):
+    """读取结果库的统计信息；摘要文件缺失或与结果库不一致时重新扫描生成"""
+    path = summary_path(store_path)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            summary = json.load(f)
+        if summary.pop('store_bytes', None) == os.path.getsize(store_path):
+            return summary
+
+    summary = empty_summary()
+    for record in iter_results(store_path):
+        summary['total'] += 1
+        summary['success'] += record['success']
+        summary['categories'][categorize(prob_change(record))] += 1
+    _write_summary(store_path, summary)
+    return summary
+
+
+def _csv_row(record):
+    return [
+        record['original_text'],
+        record['attacked_text'],
+        '垃圾邮件' if record['original_pred'] == 1 else '正常邮件',
+        '垃圾邮件' if record['attacked_pred'] == 1 else '正常邮件',
+        f"{record['original_prob'][1]:.3f}",
+        f"{record['attacked_prob'][1]:.3f}",
+        '是' if record['success'] else '否',
+        f"{prob_change(record):+.3f}",
+    ]
+
+
+def _training_rows(record):
+    yield [record['original_text'], 1, 'original']
+    if record['success']:
+        # 攻击成功的样本仍标为垃圾邮件，用于纠正模型
+        yield [record['attacked_text'], 1, 'adversarial_success']
+    else:
+        yield [record['attacked_text'], record['attacked_pred'], 'adversarial_failed']
+
+
+def _report_entry(record):
+    return (
+        f"样本 {record['index'] + 1}:\n"
+        f"攻击成功: {'✅ 是' if record['success'] else '❌ 否'}\n"
+        f"原始垃圾邮件概率: {record['original_prob'][1]:.3f}\n"
+        f"对抗样本垃圾邮件概率: {record['attacked_prob'][1]:.3f}\n"
+        f"概率变化: {prob_change(record):+.3f}\n\n"
+        f"原始文本:\n{record['original_text']}\n\n"
+        f"对抗文本:\n{record['attacked_text']}\n\n"
+        + "-" * 80 + "\n\n"
+    )
+
+
+def export_all(store_path, base_dir='adversarial_analysis'):
+    """
+    从结果库单次扫描导出 comprehensive_save 的全部文件：
+    CSV、文本报告、分类样本归档和对抗训练数据
+    """
+    from sample_archive import ArchiveWriter
+
+    if not os.path.exists(base_dir):
+        os.makedirs(base_dir)
+
+    summary = load_summary(store_path)
+    total = summary['total']
+    success_rate = summary['success'] / total if total else 0.0
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = os.path.join(base_dir, f'adversarial_samples_{timestamp}.csv')
+    txt_path = os.path.join(base_dir, f'adversarial_report_{timestamp}.txt')
+    training_path = os.path.join(base_dir, f'adversarial_training_data_{timestamp}.csv')
+    archive_path = os.path.join(base_dir, 'categorized_samples')
+    categorized = ArchiveWriter(archive_path, store_path)
+
+    with open(csv_path, 'w', newline='', encoding='utf-8-sig') as csv_file, \
+            open(txt_path, 'w', encoding='utf-8') as report, \
+            open(training_path, 'w', newline='', encoding='utf-8-sig') as training_file:
+        samples = csv.writer(csv_file, lineterminator='\n')
+        samples.writerow(['original_text', 'adversarial_text', 'original_prediction',
+                          'adversarial_prediction', 'original_spam_prob', 'adversarial_spam_prob',
+                          'attack_success', 'confidence_change'])
+        training = csv.writer(training_file, lineterminator='\n')
+        training.writerow(['text', 'label', 'type'])
+
+        report.write("=== 垃圾邮件对抗样本测试报告 ===\n\n")
+        report.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        report.write(f"总样本数: {total}\n")
+        report.write(f"攻击成功率: {success_rate:.2%}\n\n")
+        report.write("=" * 80 + "\n")
+
+        for record in iter_results(store_path):
+            samples.writerow(_csv_row(record))
+            report.write(_report_entry(record))
+            training.writerows(_training_rows(record))
+            categorized.write(record)
+
+    categorized.close()
+
+    print(f"✅ 对抗样本已保存到: {csv_path}")
+    print(f"📊 统计信息:")
+    print(f"  总样本数: {total}")
+    print(f"  攻击成功率: {success_rate:.2%}")
+    print(f"✅ 文本报告已保存到: {txt_path}")
+    print(f"✅ 样本已分类归档到: {categorized.data_path}")
+    print("📁 分类统计:")
+    for category, count in summary['categories'].items():
+        print(f"  {CATEGORIES[category]}: {count}个样本")
+    print(f"✅ 训练数据已保存到: {training_path}")
+    print(f"📊 训练数据统计:")
+    print(f"  原始样本: {total}")
+    print(f"  成功对抗样本: {summary['success']}")
+    print(f"  失败对抗样本: {total - summary['success']}")
+
+    print(f"\n🎉 所有文件已保存到: {base_dir}/")
+    print("📋 生成的文件:")
+    print(f"  🗃️ 结果库: {store_path}")
+    print(f"  📄 CSV数据: adversarial_samples_{timestamp}.csv")
+    print(f"  📝 文本报告: adversarial_report_{timestamp}.txt")
+    print(f"  📁 分类样本归档: categorized_samples.dat / categorized_samples.idx.npz")
+    print(f"  🎯 训练数据: adversarial_training_data_{timestamp}.csv")
+
+    return {'csv': csv_path, 'report': txt_path, 'categorized': archive_path,
+            'training': training_path}
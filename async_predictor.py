@@ -0,0 +1,136 @@
+"""
+SpamPredictor 的 asyncio 接口
+打分在执行器中进行（默认线程池，也可以传入 batch_executor.BatchExecutor 合并成批），
+中文邮件的各个翻译片段在 I/O 线程池中并发翻译，都不会阻塞事件循环
+待打分的邮件进入有界队列：队列满时 predict_async 在 await 处等待（背压），
+由 max_concurrency 个工作协程取出打分；每次调用都可以单独取消或设置超时
+
+    async with AsyncSpamPredictor(predictor, max_concurrency=4) as async_predictor:
+        result = await async_predictor.predict_async(email_text, timeout=2.0)
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chinese_washer as cw
+from batch_executor import BatchExecutor
+from translation import has_chinese, make_translator, split_chunks, translate_chunk
+
+
+class AsyncSpamPredictor:
+    """
+    max_concurrency: 同时在执行器中打分的邮件数上限
+    queue_size: 等待打分的邮件数上限
+    executor: concurrent.futures 执行器或 BatchExecutor，默认使用事件循环的默认线程池
+    translate_workers: 并发翻译的线程数
+    """
+
+    def __init__(self, predictor, max_concurrency=4, queue_size=64, executor=None, translate_workers=8):
+        self.predictor = predictor
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.executor = executor
+        self.translate_workers = translate_workers
+        self._translate_pool = None
+        self._queue = None
+        self._workers = []
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self):
+        """
+        在当前事件循环中创建队列、工作协程和翻译线程池（首次调用 predict_async 时自动执行）
+        close() 之后可以再次 start()，同一实例能在多个 async with 中重复使用
+        """
+        if self._queue is None:
+            self._translate_pool = ThreadPoolExecutor(self.translate_workers, thread_name_prefix='spam-translate')
+            self._queue = asyncio.Queue(self.queue_size)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def close(self):
+        """等待已排队的邮件处理完，然后停止工作协程并关闭翻译线程池"""
+        if self._queue is None:
+            return
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+        self._translate_pool.shutdown(wait=False)
+        self._translate_pool = None
+
+    @property
+    def pending(self):
+        """队列中等待打分的邮件数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def translate_async(self, text, max_length=400):
+        """与 translation.split_and_translate 结果相同，各片段并发翻译"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        translator = await loop.run_in_executor(self._translate_pool, make_translator)
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(self._translate_pool, translate_chunk, translator, chunk)
+            for chunk in split_chunks(text, max_length)
+        ))
+        return " ".join(parts)
+
+    async def predict_async(self, email_text, timeout=None):
+        """
+        预测单封邮件，结果与 predictor.predict 相同；含中文时先清理并翻译
+        timeout: 包括排队、翻译和打分在内的总时限（秒），超时抛出 asyncio.TimeoutError
+        取消调用时，尚未开始打分的邮件不会再被处理
+        """
+        if timeout is None:
+            return await self._predict(email_text)
+        return await asyncio.wait_for(self._predict(email_text), timeout)
+
+    async def predict_many_async(self, email_texts, timeout=None, return_exceptions=False):
+        """
+        并发预测多封邮件，按顺序返回结果；timeout 对每封邮件分别计算
+        return_exceptions 为 True 时，超时或出错的邮件在结果中以异常对象代替
+        """
+        return await asyncio.gather(*(self.predict_async(text, timeout) for text in email_texts),
+                                    return_exceptions=return_exceptions)
+
+    async def _predict(self, email_text):
+        self.start()
+        if has_chinese(email_text):
+            start = time.perf_counter()
+            email_text = await self.translate_async(cw.powerful_wash(email_text))
+            if self.predictor.metrics is not None:
+                self.predictor.metrics.observe_stage('translate', time.perf_counter() - start)
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((email_text, future))
+        return await future
+
+    async def _score(self, email_text):
+        if isinstance(self.executor, BatchExecutor):
+            return await asyncio.wrap_future(self.executor.submit(email_text))
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.predictor.predict,
+                                                                email_text)
+
+    async def _worker(self):
+        while True:
+            email_text, future = await self._queue.get()
+            try:
+                # 调用方已取消或超时的邮件直接跳过
+                if future.done():
+                    continue
+                try:
+                    result = await self._score(email_text)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self._queue.task_done()
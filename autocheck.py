@@ -1,19 +1,14 @@
 import utils
 import os
-import re
 import chinese_washer as cw
-import interface
-
-
-def has_chinese(text):
-    pattern = re.compile(r'[\u4e00-\u9fff]')
-    return bool(pattern.search(text))
+from translation import has_chinese, split_and_translate
 
 
 def check(text, predictor):
     if has_chinese(text):
         # print(cw.powerful_wash(text))
-        text = interface.split_and_translate(cw.powerful_wash(text))
+        with predictor.stage_timer('translate'):
+            text = split_and_translate(cw.powerful_wash(text))
         # print(text)
     result = predictor.predict(text)
     return result
@@ -43,6 +38,7 @@ def check_spam(predictor, spam_dir="./data/english/hard_ham"):
     return final_error_rate
 
 
-# 使用改进的模型
-predictor = utils.SpamPredictor()
-check_spam(predictor)
\ No newline at end of file
+if __name__ == "__main__":
+    # 使用改进的模型
+    predictor = utils.SpamPredictor()
+    check_spam(predictor)
@@ -0,0 +1,114 @@
+"""
+线程池批量执行器
+网关的多个线程各自提交单封邮件，执行器把排队中的邮件合并成批交给共享的 SpamPredictor.predict_batch，
+使稀疏向量化、特征拼接和模型预测以大批量的 NumPy / SciPy 调用进行（计算期间释放 GIL，
+多个工作线程的批次可以并行），而不是每个线程各自做一遍单封邮件的 Python 开销
+
+    with BatchExecutor(predictor, workers=2) as executor:
+        future = executor.submit(email_text)
+        result = future.result()
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class BatchExecutor:
+    """
+    workers: 工作线程数，每个线程一次处理一批
+    max_batch: 每批最多的邮件数
+    max_wait: 取到第一封邮件后，最多再等待多少秒凑满一批（秒）
+    """
+
+    def __init__(self, predictor, workers=2, max_batch=64, max_wait=0.002):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.emails = 0
+        self._threads = [threading.Thread(target=self._worker, name=f'spam-batch-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def submit(self, email_text):
+        """提交一封邮件，返回 Future，结果与 predictor.predict 的格式相同"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("执行器已关闭")
+            self._queue.put((email_text, future))
+        return future
+
+    def predict(self, email_text, timeout=None):
+        return self.submit(email_text).result(timeout)
+
+    def map(self, email_texts, timeout=None):
+        """提交多封邮件并按顺序返回结果列表"""
+        futures = [self.submit(text) for text in email_texts]
+        return [future.result(timeout) for future in futures]
+
+    @property
+    def mean_batch_size(self):
+        return self.emails / self.batches if self.batches else 0.0
+
+    def shutdown(self, wait=True):
+        """不再接受新邮件；已排队的邮件处理完后工作线程退出"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next_batch(self):
+        """阻塞取到第一封邮件，再在 max_wait 内尽量凑满一批；返回 (批次, 是否收到停止信号)"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.predictor.predict_batch([text for text, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.emails += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,421 @@
+"""
+预测流程性能基准：分阶段计时，并对每一代模型（models/model*）分别运行
+结果保存为 JSON，可与基线结果对比，发现性能回退
+
+    python benchmark.py run --output benchmarks/baseline.json
+    python benchmark.py compare benchmarks/baseline.json benchmarks/new.json
+    python benchmark.py threads --threads 1 2 4 8      # 共享预测器的多线程吞吐量
+    python benchmark.py importtime                     # 各入口模块的导入耗时（-X importtime）
+"""
+import argparse
+import glob
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from scipy.sparse import hstack
+
+import corpus
+
+
+def time_call(fn, repeat=5, min_time=0.02):
+    """
+    多次运行 fn 并返回每次调用耗时（秒）的中位数与最小值
+    先校准循环次数，使每轮总耗时不少于 min_time
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 10000:
+            break
+        loops *= 2
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - start) / loops)
+
+    return {
+        'median_s': float(np.median(timings)),
+        'min_s': float(np.min(timings)),
+        'loops': loops,
+    }
+
+
+def load_generation(model_dir):
+    """按模型目录加载对应代的 utils.py 和 SpamPredictor"""
+    name = f"bench_{os.path.basename(os.path.normpath(model_dir))}_utils"
+    spec = importlib.util.spec_from_file_location(name, os.path.join(model_dir, 'utils.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    kwargs = {
+        'model_path': os.path.join(model_dir, 'spam_model.joblib'),
+        'vectorizer_path': os.path.join(model_dir, 'vectorizer.joblib'),
+    }
+    if 'threshold_path' in inspect.signature(module.SpamPredictor.__init__).parameters:
+        kwargs['threshold_path'] = os.path.join(model_dir, 'optimal_threshold.joblib')
+
+    return module, module.SpamPredictor(**kwargs)
+
+
+def build_features(module, predictor, processed_texts, raw_texts):
+    """按该代模型的特征构造方式生成稀疏特征矩阵"""
+    features = predictor.vectorizer.transform(processed_texts)
+    if hasattr(module, 'extract_enhanced_adversarial_features'):
+        adversarial = module.extract_enhanced_adversarial_features(raw_texts)
+        features = hstack([features, adversarial]).tocsr()
+    return features
+
+
+def batch_predict(module, predictor, texts):
+    """端到端批量预测；旧版本 SpamPredictor 没有 predict_batch 时按相同流程组合"""
+    if hasattr(predictor, 'predict_batch'):
+        return predictor.predict_batch(texts)
+    processed = [predictor.preprocess_email(text) for text in texts]
+    features = build_features(module, predictor, processed, texts)
+    return predictor.model.predict_proba(features.toarray())
+
+
+def select_emails(data_dir='data/english', batch_size=64):
+    """从语料中选出最小、中位数和最大的邮件，以及固定的一批邮件"""
+    texts, _, _, paths = corpus.load_labeled_corpus(data_dir)
+    # 空文件不进入预测流程，不参与挑选
+    kept = [i for i, text in enumerate(texts) if text.strip()]
+    texts = [texts[i] for i in kept]
+    paths = [paths[i] for i in kept]
+    order = np.argsort([len(text) for text in texts], kind='stable')
+
+    picks = {
+        'small': order[0],
+        'median': order[len(order) // 2],
+        'largest': order[-1],
+    }
+    emails = {label: texts[i] for label, i in picks.items()}
+    sources = {label: {'path': paths[i], 'chars': len(texts[i])} for label, i in picks.items()}
+
+    step = max(1, len(texts) // batch_size)
+    batch = texts[::step][:batch_size]
+
+    return emails, sources, batch
+
+
+def benchmark_generation(model_dir, emails, batch, repeat=5):
+    """对一代模型的各个阶段分别计时"""
+    module, predictor = load_generation(model_dir)
+    results = {}
+
+    def record(stage, label, fn):
+        try:
+            results.setdefault(stage, {})[label] = time_call(fn, repeat)
+        except Exception as e:
+            results.setdefault(stage, {})[label] = {'error': f"{type(e).__name__}: {e}"}
+
+    for label, email in emails.items():
+        processed = predictor.preprocess_email(email)
+
+        if hasattr(module, 'extract_email_body'):
+            record('extract_email_body', label, lambda: module.extract_email_body(email))
+        if hasattr(module, 'enhanced_cleaner'):
+            body = module.extract_email_body(email)
+            record('enhanced_cleaner', label, lambda: module.enhanced_cleaner(body))
+        record('preprocess_email', label, lambda: predictor.preprocess_email(email))
+        if hasattr(module, 'extract_enhanced_adversarial_features'):
+            record('extract_enhanced_adversarial_features', label,
+                   lambda: module.extract_enhanced_adversarial_features([email]))
+        record('vectorizer.transform', label, lambda: predictor.vectorizer.transform([processed]))
+
+        features = build_features(module, predictor, [processed], [email])
+        dense = features.toarray()
+        record('predict_proba_dense', label, lambda: predictor.model.predict_proba(dense))
+        record('predict_proba_sparse', label, lambda: predictor.model.predict_proba(features))
+
+        record('predict_single', label, lambda: predictor.predict(email))
+
+    # 单封逐个预测与批量预测，均折算为每封邮件耗时
+    label = f'batch{len(batch)}'
+    record('predict_single', label, lambda: [predictor.predict(text) for text in batch])
+    record('predict_batch', label, lambda: batch_predict(module, predictor, batch))
+    for stage in ('predict_single', 'predict_batch'):
+        timing = results[stage][label]
+        if 'error' not in timing:
+            timing['per_email_s'] = timing['median_s'] / len(batch)
+
+    return results
+
+
+def environment_info():
+    import sklearn
+    import scipy
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'sklearn': sklearn.__version__,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def run(args):
+    model_dirs = args.models or sorted(glob.glob('models/model*'))
+    emails, sources, batch = select_emails(args.data_dir, args.batch_size)
+
+    report = {
+        'environment': environment_info(),
+        'emails': sources,
+        'results': {},
+    }
+
+    for model_dir in model_dirs:
+        generation = os.path.basename(os.path.normpath(model_dir))
+        print(f"\n=== {generation} ===")
+        report['results'][generation] = benchmark_generation(model_dir, emails, batch, args.repeat)
+        print_results(report['results'][generation])
+
+    output = args.output or os.path.join(
+        'benchmarks', f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output_dir = os.path.dirname(output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 基准结果已保存到: {output}")
+
+
+def print_results(results):
+    for stage, by_label in results.items():
+        for label, timing in by_label.items():
+            if 'error' in timing:
+                print(f"  {stage:<40} {label:<10} 不支持 ({timing['error'].split(':')[0]})")
+            else:
+                print(f"  {stage:<40} {label:<10} {timing['median_s'] * 1e6:>12.1f} µs")
+
+
+def compare(args):
+    """对比两次基准结果，超过容忍度的变慢视为回退，返回码为 1"""
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)['results']
+
+    regressions = 0
+    for generation, stages in current.items():
+        if generation not in baseline:
+            continue
+        print(f"\n=== {generation} ===")
+        for stage, by_label in stages.items():
+            for label, timing in by_label.items():
+                base = baseline[generation].get(stage, {}).get(label)
+                if not base or 'median_s' not in base or 'median_s' not in timing:
+                    continue
+                ratio = timing['median_s'] / base['median_s']
+                flag = ''
+                if ratio > 1 + args.tolerance:
+                    flag = ' ❌ 回退'
+                    regressions += 1
+                elif ratio < 1 - args.tolerance:
+                    flag = ' ✅ 提升'
+                print(f"  {stage:<40} {label:<10} {base['median_s'] * 1e6:>10.1f} -> "
+                      f"{timing['median_s'] * 1e6:>10.1f} µs ({ratio:.2f}x){flag}")
+
+    print(f"\n性能回退项: {regressions}")
+    return 1 if regressions else 0
+
+
+def thread_scaling(predictor, texts, thread_counts, clients=16, max_batch=64):
+    """
+    同一个预测器实例在不同线程数下的吞吐量（封/秒）
+    direct: N 个线程各自调用 predictor.predict
+    batched: clients 个客户端线程逐封提交给 N 个工作线程的 BatchExecutor，合并成批后打分
+    """
+    from batch_executor import BatchExecutor
+
+    predictor.predict_batch(texts[:max_batch])  # 预热
+    results = {}
+    for threads in thread_counts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(predictor.predict, texts))
+        direct = len(texts) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with BatchExecutor(predictor, workers=threads, max_batch=max_batch) as executor:
+            with ThreadPoolExecutor(clients) as pool:
+                list(pool.map(executor.predict, texts))
+        batched = len(texts) / (time.perf_counter() - start)
+
+        results[str(threads)] = {
+            'direct_emails_per_s': direct,
+            'batched_emails_per_s': batched,
+            'mean_batch_size': executor.mean_batch_size,
+        }
+        print(f"  {threads:>3} 线程  直接调用 {direct:>8.1f} 封/秒  "
+              f"合并批量 {batched:>8.1f} 封/秒（平均每批 {executor.mean_batch_size:.1f} 封）")
+    return results
+
+
+def run_threads(args):
+    import utils
+    from threshold_optimizer import model_paths
+
+    predictor = utils.SpamPredictor(*model_paths(args.model_dir), metrics=False)
+    texts = [text for text in corpus.load_labeled_corpus(args.data_dir)[0] if text.strip()]
+    step = max(1, len(texts) // args.emails)
+    texts = texts[::step][:args.emails]
+
+    print(f"\n=== 线程扩展性（{len(texts)} 封邮件，{os.cpu_count()} 个 CPU）===")
+    report = {
+        'environment': environment_info(),
+        'emails': len(texts),
+        'cpu_count': os.cpu_count(),
+        'results': thread_scaling(predictor, texts, args.threads, args.clients, args.max_batch),
+    }
+    base = report['results'][str(args.threads[0])]
+    for threads, result in report['results'].items():
+        print(f"  {threads:>3} 线程  相对 {args.threads[0]} 线程: "
+              f"直接调用 {result['direct_emails_per_s'] / base['direct_emails_per_s']:.2f}x，"
+              f"合并批量 {result['batched_emails_per_s'] / base['direct_emails_per_s']:.2f}x")
+
+    output = args.output or os.path.join(
+        'benchmarks', f"threads_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output_dir = os.path.dirname(output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 基准结果已保存到: {output}")
+
+
+# 导入耗时基准默认测量的模块
+IMPORT_MODULES = ('score', 'utils', 'autocheck', 'chinese_washer', 'load_files', 'english_spam_check', 'interface')
+
+
+def import_time(module, repeat=3):
+    """
+    在新的解释器中用 -X importtime 导入 module，取 repeat 次中总耗时最少的一次
+    返回 (总耗时秒, {module 直接导入的模块: 累计耗时秒})；导入失败时返回 (None, 错误信息)
+    """
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None, proc.stderr.strip().splitlines()[-1]
+        packages = {}
+        total = 0.0
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            if not cumulative.strip().isdigit():
+                continue  # 表头
+            # 名称前的缩进表示嵌套层级（第 0 层一个空格，每深一层多两个空格）
+            level = (len(name) - len(name.lstrip(' ')) - 1) // 2
+            if level == 0 and name.strip() == module:
+                total = int(cumulative) / 1e6
+            elif level == 1:
+                packages[name.strip()] = int(cumulative) / 1e6
+        if best is None or total < best[0]:
+            best = (total, packages)
+    return best
+
+
+def startup_time(argv, repeat=3):
+    """完整运行一次命令（新的解释器）的最短墙钟时间"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *argv], capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_importtime(args):
+    print(f"\n=== 导入耗时（-X importtime，{args.repeat} 次取最少）===")
+    report = {'environment': environment_info(), 'modules': {}}
+    for module in args.modules:
+        total, packages = import_time(module, args.repeat)
+        if total is None:
+            print(f"  {module:<20} 导入失败: {packages}")
+            report['modules'][module] = {'error': packages}
+            continue
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"  {module:<20} {total * 1000:>8.1f} ms  "
+              + "，".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in heaviest))
+        report['modules'][module] = {'total_s': total, 'packages': packages}
+
+    email = corpus.list_folder(os.path.join(args.data_dir, 'spam'))[0]
+    report['score_cli_s'] = startup_time(['score.py', email], args.repeat)
+    print(f"\n📊 python score.py 单封邮件（含模型加载）: {report['score_cli_s'] * 1000:.0f} ms")
+
+    output = args.output or os.path.join(
+        'benchmarks', f"importtime_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output_dir = os.path.dirname(output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 基准结果已保存到: {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预测流程性能基准")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="运行基准测试")
+    run_parser.add_argument('--models', nargs='*', help="模型目录（默认 models/model*）")
+    run_parser.add_argument('--data-dir', default='data/english')
+    run_parser.add_argument('--batch-size', type=int, default=64)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--output', default=None, help="结果 JSON 路径")
+
+    compare_parser = subparsers.add_parser('compare', help="与基线结果对比")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.2,
+                                help="允许的相对变慢比例（默认 20%%）")
+
+    threads_parser = subparsers.add_parser('threads', help="多线程吞吐量扩展性")
+    threads_parser.add_argument('--model-dir', default='.', help="包含 spam_model/vectorizer/optimal_threshold 的目录")
+    threads_parser.add_argument('--data-dir', default='data/english')
+    threads_parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    threads_parser.add_argument('--emails', type=int, default=512)
+    threads_parser.add_argument('--clients', type=int, default=16, help="合并批量模式下的客户端线程数")
+    threads_parser.add_argument('--max-batch', type=int, default=64)
+    threads_parser.add_argument('--output', default=None, help="结果 JSON 路径")
+
+    importtime_parser = subparsers.add_parser('importtime', help="入口模块的导入耗时")
+    importtime_parser.add_argument('--modules', nargs='+', default=list(IMPORT_MODULES))
+    importtime_parser.add_argument('--data-dir', default='data/english')
+    importtime_parser.add_argument('--repeat', type=int, default=3)
+    importtime_parser.add_argument('--top', type=int, default=4, help="每个模块列出最耗时的几个顶层导入")
+    importtime_parser.add_argument('--output', default=None, help="结果 JSON 路径")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'threads':
+        run_threads(args)
+    elif args.command == 'importtime':
+        run_importtime(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
-import pandas as pd
+import math
 import re
 
-def wash(text):
-    if pd.isna(text) or text == "":
+from domain_reputation import host_collector
+
+def _is_missing(text):
+    """与 pd.isna 对单个值的判断相同（None 或 NaN），不必为此导入 pandas"""
+    return text is None or (isinstance(text, float) and math.isnan(text))
+
+def wash(text, hosts=None):
+    """hosts: 传入列表时，删除 URL 和域名的同时把其中的主机名追加进去"""
+    if _is_missing(text) or text == "":
         return ""
 
     text = str(text)
@@ -13,8 +20,9 @@ def wash(text):
         r'[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
     ]
 
+    remove_host = '' if hosts is None else host_collector(hosts)
     for pattern in url_patterns:
-        text = re.sub(pattern, '', text)
+        text = re.sub(pattern, remove_host, text)
 
     text = re.sub(r'<[^>]+>', '', text)
 
@@ -0,0 +1,101 @@
+import os
+import re
+
+# data/english 下各文件夹对应的标签：1 表示垃圾邮件，0 表示正常邮件
+ENGLISH_FOLDERS = {
+    'ham': 0,
+    'hard_ham': 0,
+    'spam': 1,
+    'reinforced_spam': 1,
+    'low_reinforced_spam': 1,
+    'medium_reinforced_spam': 1,
+    'failed_spam': 1,
+}
+
+
+# 按中文编码解码后至少包含这么多汉字才当作中文邮件
+# （英文邮件中零星的 latin-1 字符可能恰好组成几个 GBK 双字节汉字，语料中最多 5 个）
+MIN_DECODED_HANZI = 10
+_HANZI = re.compile(r'[\u4e00-\u9fff]')
+
+
+def read_email(file_path):
+    """读取单封邮件（与 autocheck 相同，使用 latin-1 编码）"""
+    with open(file_path, 'r', encoding='latin-1') as file:
+        return file.read()
+
+
+def decode_email(data):
+    """
+    字节串解码为文本：依次尝试 UTF-8、GBK（与 load_files.read_file_safe 一样兼容中文邮件），
+    解码结果包含足够多的汉字才采用，否则按 latin-1 解码，英文邮件与 read_email 的结果相同
+    """
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            text = data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        if len(_HANZI.findall(text, 0, 65536)) >= MIN_DECODED_HANZI:
+            return text
+    return data.decode('latin-1')
+
+
+def read_email_auto(file_path):
+    """读取单封邮件，中文邮件按 UTF-8 / GBK 解码（见 decode_email）；换行与文本模式读取一样统一为 LF"""
+    with open(file_path, 'rb') as file:
+        return decode_email(file.read()).replace('\r\n', '\n').replace('\r', '\n')
+
+
+def list_folder(folder_path):
+    """按文件名排序列出文件夹中的邮件路径，保证每次加载顺序一致"""
+    paths = []
+    for filename in sorted(os.listdir(folder_path)):
+        file_path = os.path.join(folder_path, filename)
+        if os.path.isfile(file_path):
+            paths.append(file_path)
+    return paths
+
+
+def corpus_stamp(base_dir='data/english', folders=None):
+    """
+    各文件夹的邮件数和最新修改时间，用于判断按语料缓存的结果是否过期
+    （strip.py 等向文件夹写入邮件后缓存随之失效）
+    """
+    if folders is None:
+        folders = ENGLISH_FOLDERS
+    parts = []
+    for folder in folders:
+        folder_path = os.path.join(base_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        paths = list_folder(folder_path)
+        latest = max((os.path.getmtime(path) for path in paths), default=0)
+        parts.append(f"{folder}:{len(paths)}:{int(latest)}")
+    return '|'.join(parts)
+
+
+def load_labeled_corpus(base_dir='data/english', folders=None):
+    """
+    加载带标签的英文语料
+    返回 (邮件文本列表, 标签列表, 所属文件夹列表, 文件路径列表)
+    """
+    if folders is None:
+        folders = ENGLISH_FOLDERS
+
+    texts = []
+    labels = []
+    groups = []
+    paths = []
+
+    for folder, label in folders.items():
+        folder_path = os.path.join(base_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+
+        for file_path in list_folder(folder_path):
+            texts.append(read_email(file_path))
+            labels.append(label)
+            groups.append(folder)
+            paths.append(file_path)
+
+    return texts, labels, groups, paths
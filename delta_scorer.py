@@ -0,0 +1,403 @@
+"""
+线性模型的增量打分
+为每封邮件记录预处理后的词序列、各词项计数和当前 logit，
+替换、插入或删除单词时只重新统计受影响窗口内的 n-gram（O(改动词项数)），
+同时增量更新 TF-IDF 归一化和 9 个对抗性特征，不再对整封邮件重新清洗、向量化和打分
+
+在其上实现了基于系数引导的贪心攻击 greedy_coefficient_attack
+"""
+import heapq
+import math
+from collections import Counter
+
+import numpy as np
+
+import utils
+
+N_ADVERSARIAL = 9
+
+
+class EmailState:
+    """
+    一封邮件的增量打分状态
+    对应的邮件文本为：原始邮件头 + 空行 + 预处理后的单词（见 text()）
+    """
+
+    def __init__(self, header, words):
+        self.header = header
+        self.words = words
+        self.counts = {}          # 词表下标 -> 出现次数
+        self.dot = 0.0            # sum(tf * idf * coef)
+        self.norm_acc = 0.0       # l2: sum((tf * idf)^2)；l1: sum(tf * idf)
+        self.occurrences = None   # 每个指示词在全文中的出现次数
+        self.total_words = 0
+        self.sentence_count = 0
+        self.length = 0
+
+    def text(self):
+        body = ' '.join(self.words)
+        return f"{self.header}\n\n{body}" if self.header else body
+
+
+class IncrementalLinearScorer:
+    """
+    基于线性模型 coef_ 的增量打分器
+    支持纯 TF-IDF 特征，以及 TF-IDF + 9 个对抗性特征（与 utils.SpamPredictor 相同的拼接方式）
+    """
+
+    def __init__(self, model, vectorizer, preprocess=utils.complete_preprocess):
+        if not hasattr(model, 'coef_'):
+            raise ValueError("增量打分只支持线性模型（需要 coef_）")
+        if vectorizer.analyzer != 'word':
+            raise ValueError("增量打分只支持 analyzer='word' 的向量器")
+
+        coef = np.ravel(model.coef_)
+        self.vocabulary = vectorizer.vocabulary_
+        n_terms = len(self.vocabulary)
+        if len(coef) == n_terms:
+            self.adversarial_coef = None
+        elif len(coef) == n_terms + N_ADVERSARIAL:
+            self.adversarial_coef = coef[n_terms:]
+        else:
+            raise ValueError(f"模型特征数 {len(coef)} 与词表大小 {n_terms} 不匹配")
+
+        self.term_coef = coef[:n_terms]
+        self.intercept = float(np.ravel(model.intercept_)[0])
+        self.idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(n_terms)
+        self.weighted_coef = self.idf * self.term_coef
+        self.binary = vectorizer.binary
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.norm = vectorizer.norm
+        self.min_n, self.max_n = vectorizer.ngram_range
+        self.tokenize = vectorizer.build_tokenizer()
+        self.stop_words = vectorizer.get_stop_words() or frozenset()
+        self.preprocess = preprocess
+
+        # 对抗性特征的指示词，按组展开；多词指示词会跨越单词边界
+        self.indicators = [word for group in utils.INDICATOR_GROUPS for word in group]
+        self.group_matrix = np.zeros((len(utils.INDICATOR_GROUPS), len(self.indicators)))
+        offset = 0
+        for g, group in enumerate(utils.INDICATOR_GROUPS):
+            self.group_matrix[g, offset:offset + len(group)] = 1
+            offset += len(group)
+        self.spanning = [j for j, word in enumerate(self.indicators) if ' ' in word]
+
+        self.evaluations = 0
+        self._word_cache = {}
+        self._normalized = {}
+
+    # ---- 单词级缓存 ----
+
+    def _word_info(self, word):
+        """单词 -> (分词结果, 指示词出现次数, 句末标点数)"""
+        info = self._word_cache.get(word)
+        if info is None:
+            tokens = tuple(token for token in self.tokenize(word) if token not in self.stop_words)
+            occurrences = np.array([word.count(indicator) for indicator in self.indicators], dtype=float)
+            punctuation = word.count('.') + word.count('!') + word.count('?')
+            info = (tokens, occurrences, punctuation)
+            self._word_cache[word] = info
+        return info
+
+    def _pair_occurrences(self, left, right):
+        """跨越 left 与 right 之间空格的多词指示词出现次数"""
+        occurrences = np.zeros(len(self.indicators))
+        if self.spanning:
+            joined = f"{left} {right}"
+            for j in self.spanning:
+                occurrences[j] = joined.count(self.indicators[j])
+        return occurrences
+
+    def normalize(self, word):
+        """把待插入的词按模型的预处理规则规范化，可能得到 0 个或多个单词"""
+        words = self._normalized.get(word)
+        if words is None:
+            words = self.preprocess(word).split()
+            self._normalized[word] = words
+        return words
+
+    def _tf(self, count):
+        if count <= 0:
+            return 0.0
+        if self.binary:
+            return 1.0
+        if self.sublinear_tf:
+            return 1.0 + math.log(count)
+        return float(count)
+
+    def _ngrams(self, tokens):
+        grams = Counter()
+        for n in range(self.min_n, self.max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                index = self.vocabulary.get(' '.join(tokens[i:i + n]))
+                if index is not None:
+                    grams[index] += 1
+        return grams
+
+    # ---- 初始化 ----
+
+    def init_state(self, raw_email):
+        """对原始邮件做一次完整预处理，建立增量打分状态"""
+        body = utils.extract_email_body(raw_email)
+        header = ''
+        if body is not raw_email:
+            lines = raw_email.split('\n')
+            end = next(i for i, line in enumerate(lines) if not line.strip())
+            header = '\n'.join(lines[:end])
+
+        state = EmailState(header, self.preprocess(raw_email).split())
+
+        tokens = []
+        for word in state.words:
+            tokens.extend(self._word_info(word)[0])
+        state.counts = dict(self._ngrams(tokens))
+        self._refresh_sums(state)
+
+        header_lower = header.lower()
+        state.occurrences = np.array([header_lower.count(indicator) for indicator in self.indicators],
+                                     dtype=float)
+        state.sentence_count = header.count('.') + header.count('!') + header.count('?')
+        state.total_words = len(header_lower.split()) + len(state.words)
+        state.length = len(header) + (2 if header else 0)
+        for i, word in enumerate(state.words):
+            _, occurrences, punctuation = self._word_info(word)
+            state.occurrences += occurrences
+            state.sentence_count += punctuation
+            state.length += len(word) + (1 if i else 0)
+            if i:
+                state.occurrences += self._pair_occurrences(state.words[i - 1], word)
+
+        return state
+
+    def _refresh_sums(self, state):
+        """根据词项计数重新精确计算累加量（可用于消除浮点累积误差）"""
+        state.dot = 0.0
+        state.norm_acc = 0.0
+        for index, count in state.counts.items():
+            weight = self._tf(count) * self.idf[index]
+            state.dot += weight * self.term_coef[index]
+            state.norm_acc += weight * weight if self.norm == 'l2' else weight
+
+    # ---- 打分 ----
+
+    def _logit(self, dot, norm_acc, occurrences, total_words, sentence_count, length):
+        if self.norm == 'l2':
+            norm = math.sqrt(max(norm_acc, 0.0))
+        elif self.norm == 'l1':
+            norm = norm_acc
+        else:
+            norm = 1.0
+        logit = self.intercept + (dot / norm if norm > 0 else 0.0)
+
+        if self.adversarial_coef is not None:
+            group_counts = self.group_matrix @ (occurrences > 0)
+            row = utils.adversarial_feature_row(*group_counts, total_words, sentence_count, length)
+            logit += float(np.dot(self.adversarial_coef, row))
+        return logit
+
+    def logit(self, state):
+        return self._logit(state.dot, state.norm_acc, state.occurrences,
+                           state.total_words, state.sentence_count, state.length)
+
+    def probability(self, state):
+        """当前状态的垃圾邮件概率"""
+        return 1.0 / (1.0 + math.exp(-self.logit(state)))
+
+    # ---- 增量编辑 ----
+
+    def _splice_delta(self, state, start, end, new_words):
+        """计算把 words[start:end] 替换为 new_words 带来的变化（不修改状态）"""
+        words = state.words
+        context = self.max_n - 1
+
+        # 左右各取 max_n - 1 个词元作为上下文，窗口外的 n-gram 不受影响
+        left = []
+        i = start - 1
+        while i >= 0 and len(left) < context:
+            left[:0] = self._word_info(words[i])[0]
+            i -= 1
+        left = left[-context:] if context else []
+        right = []
+        i = end
+        while i < len(words) and len(right) < context:
+            right.extend(self._word_info(words[i])[0])
+            i += 1
+        right = right[:context]
+
+        old_mid = [token for word in words[start:end] for token in self._word_info(word)[0]]
+        new_mid = [token for word in new_words for token in self._word_info(word)[0]]
+        term_diff = self._ngrams(left + new_mid + right)
+        term_diff.subtract(self._ngrams(left + old_mid + right))
+
+        dot_delta = 0.0
+        norm_delta = 0.0
+        for index, change in term_diff.items():
+            if change == 0:
+                continue
+            old_count = state.counts.get(index, 0)
+            old_tf = self._tf(old_count)
+            new_tf = self._tf(old_count + change)
+            dot_delta += (new_tf - old_tf) * self.weighted_coef[index]
+            if self.norm == 'l2':
+                idf = self.idf[index]
+                norm_delta += (new_tf * new_tf - old_tf * old_tf) * idf * idf
+            else:
+                norm_delta += (new_tf - old_tf) * self.idf[index]
+
+        # 对抗性特征的计数变化：被删/新增单词本身，以及受影响的相邻词对
+        occurrences = np.zeros(len(self.indicators))
+        sentence_delta = 0
+        length_delta = 0
+        for word in words[start:end]:
+            _, word_occurrences, punctuation = self._word_info(word)
+            occurrences -= word_occurrences
+            sentence_delta -= punctuation
+            length_delta -= len(word)
+        for word in new_words:
+            _, word_occurrences, punctuation = self._word_info(word)
+            occurrences += word_occurrences
+            sentence_delta += punctuation
+            length_delta += len(word)
+
+        before = [words[start - 1]] if start > 0 else []
+        after = [words[end]] if end < len(words) else []
+        old_seq = before + words[start:end] + after
+        new_seq = before + list(new_words) + after
+        if self.spanning:
+            for a, b in zip(old_seq, old_seq[1:]):
+                occurrences -= self._pair_occurrences(a, b)
+            for a, b in zip(new_seq, new_seq[1:]):
+                occurrences += self._pair_occurrences(a, b)
+        # 正文长度 = 各单词长度之和 + 单词之间的空格数
+        word_delta = len(new_words) - (end - start)
+        length_delta += max(len(words) + word_delta - 1, 0) - max(len(words) - 1, 0)
+
+        return {
+            'start': start,
+            'end': end,
+            'new_words': list(new_words),
+            'term_diff': term_diff,
+            'dot': dot_delta,
+            'norm_acc': norm_delta,
+            'occurrences': occurrences,
+            'total_words': word_delta,
+            'sentence_count': sentence_delta,
+            'length': length_delta,
+        }
+
+    def _logit_after(self, state, delta):
+        return self._logit(state.dot + delta['dot'],
+                           state.norm_acc + delta['norm_acc'],
+                           state.occurrences + delta['occurrences'],
+                           state.total_words + delta['total_words'],
+                           state.sentence_count + delta['sentence_count'],
+                           state.length + delta['length'])
+
+    def _commit(self, state, delta):
+        for index, change in delta['term_diff'].items():
+            if change == 0:
+                continue
+            count = state.counts.get(index, 0) + change
+            if count:
+                state.counts[index] = count
+            else:
+                del state.counts[index]
+        state.dot += delta['dot']
+        state.norm_acc += delta['norm_acc']
+        state.occurrences = state.occurrences + delta['occurrences']
+        state.total_words += delta['total_words']
+        state.sentence_count += delta['sentence_count']
+        state.length += delta['length']
+        state.words[delta['start']:delta['end']] = delta['new_words']
+        return self.logit(state)
+
+    def preview_splice(self, state, start, end, new_words):
+        """把 words[start:end] 换成 new_words 之后的 logit（不修改状态）"""
+        self.evaluations += 1
+        return self._logit_after(state, self._splice_delta(state, start, end, new_words))
+
+    def splice(self, state, start, end, new_words):
+        """把 words[start:end] 换成 new_words，返回新的 logit"""
+        return self._commit(state, self._splice_delta(state, start, end, new_words))
+
+    def preview_replace(self, state, position, word):
+        return self.preview_splice(state, position, position + 1, self.normalize(word))
+
+    def preview_insert(self, state, position, word):
+        return self.preview_splice(state, position, position, self.normalize(word))
+
+    def preview_delete(self, state, position):
+        return self.preview_splice(state, position, position + 1, [])
+
+    def replace(self, state, position, word):
+        return self.splice(state, position, position + 1, self.normalize(word))
+
+    def insert(self, state, position, word):
+        return self.splice(state, position, position, self.normalize(word))
+
+    def delete(self, state, position):
+        return self.splice(state, position, position + 1, [])
+
+    # ---- 攻击辅助 ----
+
+    def top_ham_words(self, k=20):
+        """系数 * idf 最负（最像正常邮件）的 k 个单字词"""
+        unigram = [(term, index) for term, index in self.vocabulary.items() if ' ' not in term]
+        indices = np.array([index for _, index in unigram])
+        weights = self.weighted_coef[indices]
+        k = min(k, len(indices))
+        top = np.argpartition(weights, k - 1)[:k]
+        top = top[np.argsort(weights[top])]
+        inverse = {index: term for term, index in unigram}
+        return [inverse[indices[i]] for i in top]
+
+    def spam_positions(self, state, k=30):
+        """对 logit 贡献最大（单字词项系数为正）的 k 个单词位置"""
+        scored = []
+        for position, word in enumerate(state.words):
+            weight = 0.0
+            for token in self._word_info(word)[0]:
+                index = self.vocabulary.get(token)
+                if index is not None:
+                    weight += self.weighted_coef[index]
+            if weight > 0:
+                scored.append((weight, position))
+        return [position for _, position in heapq.nlargest(k, scored)]
+
+
+def greedy_coefficient_attack(scorer, raw_email, target_probability=0.3, max_edits=20,
+                              num_positions=30, num_replacements=20):
+    """
+    系数引导的贪心攻击：每一步对贡献最大的位置尝试删除或替换为正常邮件特征词，
+    并尝试在末尾插入正常邮件特征词，增量评估所有候选后执行 logit 下降最多的一个
+    返回 (攻击后的邮件文本, 攻击后的垃圾邮件概率)
+    """
+    state = scorer.init_state(raw_email)
+    ham_words = scorer.top_ham_words(num_replacements)
+    target_logit = math.log(target_probability / (1 - target_probability))
+
+    for _ in range(max_edits):
+        current = scorer.logit(state)
+        if current < target_logit:
+            break
+
+        best_logit, best_edit = current, None
+        for position in scorer.spam_positions(state, num_positions):
+            logit = scorer.preview_delete(state, position)
+            if logit < best_logit:
+                best_logit, best_edit = logit, (position, position + 1, [])
+            for word in ham_words:
+                logit = scorer.preview_replace(state, position, word)
+                if logit < best_logit:
+                    best_logit, best_edit = logit, (position, position + 1, scorer.normalize(word))
+        end = len(state.words)
+        for word in ham_words:
+            logit = scorer.preview_insert(state, end, word)
+            if logit < best_logit:
+                best_logit, best_edit = logit, (end, end, scorer.normalize(word))
+
+        if best_edit is None:
+            break
+        scorer.splice(state, *best_edit)
+
+    return state.text(), scorer.probability(state)
@@ -0,0 +1,203 @@
+"""
+域名信誉索引
+清理阶段删除 URL / www 主机 / 域名时顺带收集主机名（见 utils.enhanced_cleaner 与 chinese_washer.wash 的 hosts 参数），
+再在磁盘上的排序数组中查找：每个域名取 64 位哈希作键，与其出现在垃圾邮件 / 正常邮件中的次数一起
+保存为形状 (3, n) 的 uint64 .npy 文件，以 mmap 方式打开，多个进程共享同一份页缓存
+批量查找是一次 np.searchsorted，百万级域名下平均每个域名不到 1 微秒
+
+    python domain_reputation.py build --blocklist blocked_domains.txt
+    python domain_reputation.py check example.com www.foo.net
+"""
+import argparse
+import os
+import re
+
+import numpy as np
+
+import corpus
+
+DEFAULT_PATH = 'domain_reputation.npy'
+CORPUS_FOLDERS = {
+    **{os.path.join('data/english', folder): label for folder, label in corpus.ENGLISH_FOLDERS.items()},
+    'data/chinese/spam': 1,
+    'data/chinese/ham': 0,
+}
+# 黑名单中的域名按出现在这么多封垃圾邮件中计
+BLOCKLIST_WEIGHT = 1000
+# 形如 co.uk、com.cn 的二级后缀下，注册域名取最后三级
+PUBLIC_SECOND_LEVEL = {'co', 'com', 'net', 'org', 'edu', 'gov', 'ac', 'ne', 'or'}
+
+# 64 位乘法混合常数和初值，uint64 运算按 2^64 自然回绕
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SEED = np.uint64(0xCBF29CE484222325)
+_HOST_END = re.compile(r'[/?#&=\\\s]')
+
+
+def url_host(url):
+    """从清理时匹配到的 URL、www 主机或裸域名中取出主机名（小写），不是主机名时返回 None"""
+    host = url.split('://', 1)[-1]
+    end = _HOST_END.search(host)
+    if end:
+        host = host[:end.start()]
+    host = host.rpartition('@')[2].partition(':')[0].strip('.-').lower()
+    return host if '.' in host else None
+
+
+def host_collector(hosts):
+    """re.sub 的替换函数：把匹配到的主机名追加到 hosts，并删除匹配内容"""
+    def collect(match):
+        host = url_host(match.group(0))
+        if host:
+            hosts.append(host)
+        return ''
+    return collect
+
+
+def host_suffixes(host):
+    """
+    主机名本身及其注册域名（最后两级；co.uk 这类二级后缀下为最后三级）
+    如 mail.a.example.com -> [mail.a.example.com, example.com]；本身是后缀时返回 []
+    """
+    last = host.rfind('.')
+    if last < 0:
+        return []
+    second = host.rfind('.', 0, last)
+    if host[second + 1:last] in PUBLIC_SECOND_LEVEL and len(host) - last == 3:
+        if second < 0:
+            return []
+        second = host.rfind('.', 0, second)
+    if second < 0:
+        return [host]
+    return [host, host[second + 1:]]
+
+
+def domain_keys(domains):
+    """
+    一批域名的 64 位键：UTF-8 字节按 8 字节一组视为 uint64，逐组乘法混合
+    整批只需与最长域名的组数相同的几次向量运算；全零的填充组跳过，结果与批内其他域名的长度无关
+    """
+    encoded = np.array([domain.encode('utf-8', 'surrogatepass') for domain in domains])
+    width = -(-encoded.dtype.itemsize // 8) * 8
+    words = encoded.astype(f'S{width}').view('<u8').reshape(len(domains), -1)
+    keys = np.full(len(domains), _SEED, dtype=np.uint64)
+    for column in words.T:
+        mixed = (keys ^ column) * _MIX
+        keys = np.where(column != 0, mixed ^ (mixed >> np.uint64(29)), keys)
+    return keys
+
+
+def extract_hosts(email_text):
+    """与 SpamPredictor 预处理相同的正文提取和清理，返回其中出现的主机名列表"""
+    import utils
+    hosts = []
+    utils.enhanced_cleaner(utils.extract_email_body(email_text), hosts)
+    return hosts
+
+
+class DomainReputation:
+    """
+    table: 形状 (3, n) 的 uint64 数组，三行分别为按升序排列的域名键、垃圾邮件计数、正常邮件计数
+    信誉分为 (垃圾邮件计数 + 1) / (总计数 + 2)
+    min_score / min_count: spam_domains 判定为垃圾邮件域名所需的信誉分和出现次数
+    """
+
+    def __init__(self, table, min_score=0.99, min_count=10):
+        self.table = table
+        self.keys = np.asarray(table[0])
+        self.min_score = min_score
+        self.min_count = min_count
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH, min_score=0.99, min_count=10):
+        return cls(np.load(path, mmap_mode='r'), min_score, min_count)
+
+    def save(self, path=DEFAULT_PATH):
+        np.save(path, np.asarray(self.table))
+
+    @classmethod
+    def from_counts(cls, counts):
+        """counts: {域名: (垃圾邮件计数, 正常邮件计数)}"""
+        table = np.zeros((3, len(counts)), dtype=np.uint64)
+        if counts:
+            table[0] = domain_keys(list(counts))
+            table[1:] = np.array(list(counts.values()), dtype=np.uint64).T
+        return cls(table[:, np.argsort(table[0], kind='stable')])
+
+    def lookup(self, hosts):
+        """
+        批量查找主机名及其注册域名
+        返回 [(域名, 垃圾邮件计数, 正常邮件计数), ...]，只包含索引中存在的域名
+        """
+        domains = list(dict.fromkeys(d for host in hosts for d in host_suffixes(host)))
+        if not domains or not len(self.keys):
+            return []
+        keys = domain_keys(domains)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = np.flatnonzero(self.keys[positions] == keys)
+        counts = self.table[1:, positions[found]].tolist()
+        return [(domains[i], spam, ham) for i, spam, ham in zip(found.tolist(), *counts)]
+
+    @staticmethod
+    def score(spam, ham):
+        return (spam + 1) / (spam + ham + 2)
+
+    def spam_domains(self, hosts):
+        """信誉分不低于 min_score 且至少出现 min_count 次的域名，[(域名, 信誉分), ...]"""
+        return [(domain, self.score(spam, ham)) for domain, spam, ham in self.lookup(hosts)
+                if spam + ham >= self.min_count and self.score(spam, ham) >= self.min_score]
+
+
+def count_corpus(folders=CORPUS_FOLDERS):
+    """统计每个主机名和注册域名出现在多少封垃圾邮件 / 正常邮件中"""
+    counts = {}
+    for folder, label in folders.items():
+        if not os.path.isdir(folder):
+            continue
+        for file_path in corpus.list_folder(folder):
+            domains = {d for host in extract_hosts(corpus.read_email(file_path)) for d in host_suffixes(host)}
+            for domain in domains:
+                spam, ham = counts.get(domain, (0, 0))
+                counts[domain] = (spam + label, ham + 1 - label)
+    return counts
+
+
+def add_blocklist(counts, path):
+    """黑名单文件每行一个域名（# 开头为注释）"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            domain = line.strip().lower()
+            if domain and not domain.startswith('#'):
+                spam, ham = counts.get(domain, (0, 0))
+                counts[domain] = (spam + BLOCKLIST_WEIGHT, ham)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="域名信誉索引")
+    parser.add_argument('--path', default=DEFAULT_PATH, help="索引文件路径")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="由带标签的语料（和黑名单）构建索引")
+    build.add_argument('--blocklist', nargs='*', default=[], help="黑名单文件，每行一个域名")
+    check = commands.add_parser('check', help="查询主机名")
+    check.add_argument('hosts', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        counts = count_corpus()
+        for blocklist in args.blocklist:
+            add_blocklist(counts, blocklist)
+        index = DomainReputation.from_counts(counts)
+        index.save(args.path)
+        print(f"✅ 域名信誉索引已保存到: {args.path}（{len(index)} 个域名，"
+              f"{index.table.nbytes / 1024:.1f} KB）")
+        return
+
+    index = DomainReputation.load(args.path)
+    for domain, spam, ham in index.lookup([host.lower() for host in args.hosts]):
+        print(f"{domain:<40} 垃圾邮件 {spam:>6}  正常邮件 {ham:>6}  信誉分 {index.score(spam, ham):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,136 @@
-import gradio as gr
+"""
+垃圾邮件分类网页界面（Gradio）
+所有用户共享同一个 SpamPredictor（首次请求时加载）；提交经 Gradio 队列合并成批，
+一次交给 predict_batch 打分，结果显示垃圾邮件概率和每封邮件均摊的各阶段耗时
+
+    python english_spam_check.py --port 7860 --max-batch-size 32
+"""
+import argparse
+import threading
+import time
+
 import utils
 
-def check(text):
-    predictor = utils.SpamPredictor()
-    result = predictor.predict(text)
-    print(result['prediction'])
-    if 'spam_probability' in result:
-        print(f"垃圾邮件概率: {result['spam_probability']:.2%}")
-    return result['prediction'] != "正常邮件"
-
-def process_large_text(text):
-    word_count = len(text.split())
-    char_count = len(text)
-    rubbish = check(text)
+# 网页上显示耗时的阶段
+SHOWN_STAGES = (('headers', '邮件头'), ('preprocess', '预处理'), ('vectorize', '向量化'),
+                ('features', '对抗特征'), ('predict', '模型预测'))
+
+_predictor = None
+_predictor_lock = threading.Lock()
+# 批次之间串行打分，各阶段耗时的差值才属于当前批次
+_batch_lock = threading.Lock()
+
+
+def get_predictor():
+    """共享的预测器，只加载一次"""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                _predictor = utils.SpamPredictor()
+    return _predictor
+
+
+def _stage_totals(predictor):
+    if predictor.metrics is None:
+        return {}
+    return {stage: predictor.metrics.stages[stage].total for stage, _ in SHOWN_STAGES
+            if stage in predictor.metrics.stages}
+
+
+def score_texts(texts):
+    """
+    批量打分，返回 (结果列表, 各阶段每封邮件均摊耗时（秒）, 整批耗时（秒）)
+    """
+    predictor = get_predictor()
+    with _batch_lock:
+        before = _stage_totals(predictor)
+        start = time.perf_counter()
+        results = predictor.predict_batch(texts)
+        elapsed = time.perf_counter() - start
+        after = _stage_totals(predictor)
+    per_email = {stage: (after[stage] - before[stage]) / len(texts) for stage in after}
+    return results, per_email, elapsed
+
+
+def render_result(text, result, stage_times, batch_size, elapsed):
+    rubbish = result['prediction'] == '垃圾邮件'
     if rubbish:
         color = "#ffdce0"
         status = "垃圾内容"
-    else:
+    elif result['prediction'] == '正常邮件':
         color = "#e6ffed"
         status = "正常内容"
+    else:
+        color = "#fff5d6"
+        status = result['prediction']
+    detail = result.get('reason') or result.get('error') or ''
+    probability = result.get('spam_probability')
+    shown_probability = f"{probability:.2%}" if probability is not None else '-'
+    timings = "，".join(f"{label} {stage_times[stage] * 1000:.2f} ms"
+                       for stage, label in SHOWN_STAGES if stage in stage_times)
     return f"""
-        <div style='padding: 15px; border-radius: 8px; background-color: {color}; border: 1px solid {'#c3e6cb' if rubbish == 0 else '#f5c6cb'};'>
-            <b>处理结果：{status}</b><br>
-            单词数：{word_count}，字符数：{char_count}
+        <div style='padding: 15px; border-radius: 8px; background-color: {color}; border: 1px solid {'#f5c6cb' if rubbish else '#c3e6cb'};'>
+            <b>处理结果：{status}</b>{f'（{detail}）' if detail else ''}<br>
+            垃圾邮件概率：{shown_probability}，字符数：{len(text)}<br>
+            <small>各阶段耗时（每封均摊）：{timings or '-'}<br>
+            本批 {batch_size} 封，共 {elapsed * 1000:.1f} ms</small>
         </div>
         """
 
-with gr.Blocks() as demo:
-    gr.Markdown("# 垃圾邮件分类器")
-    large_textbox = gr.Textbox(
-        label = "请输入文本",
-        placeholder = "在这里输入你的内容...",
-        lines = 18,
-        max_lines = 50,
-        autofocus = True
-    )
-    submit_button = gr.Button(
-        "提交",
-        variant = "primary"
-    )
-    output = gr.HTML(
-        label="处理结果"
-    )
-    submit_button.click(
-        fn = process_large_text,
-        inputs = large_textbox,
-        outputs = output
-    )
-
-demo.launch()
\ No newline at end of file
+
+def process_batch(texts):
+    """Gradio 批处理函数：输入为文本列表，返回 [HTML 列表]"""
+    results, stage_times, elapsed = score_texts(texts)
+    return [[render_result(text, result, stage_times, len(texts), elapsed)
+             for text, result in zip(texts, results)]]
+
+
+def build_demo(max_batch_size=32):
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# 垃圾邮件分类器")
+        large_textbox = gr.Textbox(
+            label = "请输入文本",
+            placeholder = "在这里输入你的内容...",
+            lines = 18,
+            max_lines = 50,
+            autofocus = True
+        )
+        submit_button = gr.Button(
+            "提交",
+            variant = "primary"
+        )
+        output = gr.HTML(
+            label="处理结果"
+        )
+        submit_button.click(
+            fn = process_batch,
+            inputs = large_textbox,
+            outputs = output,
+            batch = True,
+            max_batch_size = max_batch_size,
+            concurrency_limit = 1,
+            api_name = "check"
+        )
+    return demo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="垃圾邮件分类网页界面")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7860)
+    parser.add_argument('--max-batch-size', type=int, default=32, help="每批最多合并的提交数")
+    parser.add_argument('--max-queue', type=int, default=256, help="排队请求数上限，超出时拒绝新请求")
+    args = parser.parse_args()
+
+    # 启动前加载模型，第一个用户不用等待
+    get_predictor()
+    demo = build_demo(args.max_batch_size)
+    demo.queue(max_size=args.max_queue)
+    demo.launch(server_name=args.host, server_port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+单封邮件的预测解释：每个特征对垃圾邮件 log-odds 的贡献
+  - 线性模型：稀疏 TF-IDF 行与 coef_ 逐元素相乘，只遍历非零项
+  - HistGradientBoosting：沿每棵树的决策路径累加节点值的变化（Saabas 近似），
+    所有树同时向量化前进，只需与树深相同的几次 NumPy 运算
+各特征贡献之和加上 bias 等于模型的原始得分（decision_function）
+"""
+import numpy as np
+from scipy import sparse
+
+
+class LinearExplainer:
+    def __init__(self, model):
+        self.coef = np.asarray(model.coef_).ravel()
+        self.bias = float(np.ravel(model.intercept_)[0])
+
+    def contributions(self, X):
+        """返回 (n_samples, n_features) 的贡献矩阵（稀疏输入时为稀疏矩阵）"""
+        if sparse.issparse(X):
+            X = sparse.csr_matrix(X)
+            return sparse.csr_matrix((X.data * self.coef[X.indices], X.indices, X.indptr), shape=X.shape)
+        return np.asarray(X) * self.coef
+
+
+class TreePathExplainer:
+    """
+    把所有树的节点拼接成扁平数组，按深度同步前进
+    叶子节点指向自身（贡献为 0），循环中不需要区分已到达叶子的路径
+    """
+
+    def __init__(self, model):
+        if model.n_trees_per_iteration_ != 1:
+            raise ValueError("只支持二分类梯度提升模型")
+        trees = [predictors[0].nodes for predictors in model._predictors]
+        offsets = np.cumsum([0] + [len(nodes) for nodes in trees[:-1]])
+        nodes = np.concatenate(trees)
+        tree_index = np.repeat(np.arange(len(trees)), [len(nodes) for nodes in trees])
+        is_leaf = nodes['is_leaf'].astype(bool)
+        node_ids = np.arange(len(nodes))
+
+        self.roots = offsets
+        self.feature = np.where(is_leaf, 0, nodes['feature_idx']).astype(np.intp)
+        self.threshold = np.where(is_leaf, np.inf, nodes['num_threshold'])
+        self.missing_left = nodes['missing_go_to_left'].astype(bool) | is_leaf
+        # children[节点, 是否走左边]
+        self.children = np.column_stack([
+            np.where(is_leaf, node_ids, nodes['right'].astype(np.intp) + offsets[tree_index]),
+            np.where(is_leaf, node_ids, nodes['left'].astype(np.intp) + offsets[tree_index]),
+        ])
+        # 叶子节点的值已乘以学习率，内部节点没有
+        self.value = np.where(is_leaf, nodes['value'], nodes['value'] * model.learning_rate)
+        self.bias = float(np.ravel(model._baseline_prediction)[0] + self.value[self.roots].sum())
+        self.n_features = model.n_features_in_
+        self.max_depth = int(nodes['depth'].max())
+
+    def contributions(self, X):
+        """返回 (n_samples, n_features) 的稠密贡献矩阵"""
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X)
+        n_samples = X.shape[0]
+        flat_X = X.ravel()
+        has_missing = np.isnan(flat_X).any()
+        # 每条路径（样本 × 树）在 X.ravel() 中的行起点
+        row_starts = np.repeat(np.arange(n_samples) * self.n_features, len(self.roots))
+        current = np.tile(self.roots, n_samples)
+        indices = []
+        deltas = []
+
+        for _ in range(self.max_depth):
+            index = row_starts + self.feature[current]
+            values = flat_X[index]
+            go_left = values <= self.threshold[current]
+            if has_missing:
+                missing = np.isnan(values)
+                go_left[missing] = self.missing_left[current[missing]]
+            child = self.children[current, go_left.view(np.int8)]
+            indices.append(index)
+            deltas.append(self.value[child] - self.value[current])
+            current = child
+
+        return np.bincount(np.concatenate(indices), weights=np.concatenate(deltas),
+                           minlength=n_samples * self.n_features).reshape(n_samples, self.n_features)
+
+
+def make_explainer(model):
+    if hasattr(model, 'coef_'):
+        return LinearExplainer(model)
+    if hasattr(model, '_predictors'):
+        return TreePathExplainer(model)
+    raise ValueError(f"不支持解释的模型类型: {type(model).__name__}")
+
+
+def summarize(contributions, x, feature_names, n_tokens, bias, top_k=10):
+    """
+    将一封邮件的贡献整理为可读结果（feature_names 为字符串列表）
+    spam_tokens / ham_tokens: 邮件中出现的词项里，最推向垃圾邮件 / 正常邮件的 top_k 个
+    adversarial_features: 其余（非 TF-IDF）特征的取值和贡献
+    """
+    token_indices = np.flatnonzero(x[:n_tokens])
+    token_contributions = contributions[token_indices]
+    order = np.argsort(token_contributions)
+    spam_order = order[::-1][:top_k]
+    ham_order = order[:top_k]
+
+    return {
+        'bias': bias,
+        'spam_tokens': [(feature_names[token_indices[i]], float(token_contributions[i]))
+                        for i in spam_order if token_contributions[i] > 0],
+        'ham_tokens': [(feature_names[token_indices[i]], float(token_contributions[i]))
+                       for i in ham_order if token_contributions[i] < 0],
+        'adversarial_features': [
+            (feature_names[i], float(x[i]), float(contributions[i]))
+            for i in range(n_tokens, len(feature_names))
+        ],
+        'other_tokens': float(contributions[:n_tokens].sum() - token_contributions.sum()),
+    }
@@ -0,0 +1,228 @@
+"""
+正常邮件风格统计索引
+按 ham 文件夹持久化保存预处理后的词频和二元词组频率（NumPy 数组，np.bincount 计数），只需构建一次；
+文件夹中新增邮件时只统计新文件。迁移攻击等基于风格的生成器直接从索引中取高频词
+"""
+import os
+import random
+
+import numpy as np
+
+import corpus
+
+HAM_FOLDERS = tuple(folder for folder, label in corpus.ENGLISH_FOLDERS.items() if label == 0)
+
+
+def default_index_path(preprocess):
+    return os.path.join('cache', f'ham_style_{preprocess.__module__}.npz')
+
+
+def preprocess_name(preprocess):
+    return f'{preprocess.__module__}.{preprocess.__qualname__}'
+
+
+def file_stamp(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def _empty_folder():
+    return {
+        'files': {},
+        'terms': np.zeros(0, dtype=np.int64),
+        'bigram_keys': np.zeros(0, dtype=np.int64),
+        'bigram_counts': np.zeros(0, dtype=np.int64),
+    }
+
+
+class HamStyleIndex:
+    """
+    词表在各文件夹间共享，词的编号按首次出现顺序分配
+    每个文件夹记录: 已统计文件的 (大小, 修改时间)、按词编号的词频数组、
+    二元词组键（前词编号 << 32 | 后词编号，升序）及其频次
+    合并后的高频词表按需计算并缓存，取样为 O(1)
+    """
+
+    def __init__(self, preprocess, base_dir='data/english', folders=HAM_FOLDERS, path=None):
+        self.preprocess = preprocess
+        self.base_dir = base_dir
+        self.folders = tuple(folders)
+        self.path = path or default_index_path(preprocess)
+        self.vocab = []
+        self.word_ids = {}
+        self.stats = {}
+        self._top_cache = {}
+
+    @classmethod
+    def load(cls, preprocess, base_dir='data/english', folders=HAM_FOLDERS, path=None, update=True):
+        """加载已保存的索引（预处理函数或语料目录不同时重新构建），并按需增量更新"""
+        index = cls(preprocess, base_dir, folders, path)
+        if os.path.exists(index.path):
+            with np.load(index.path) as saved:
+                if (str(saved['preprocess']) == preprocess_name(preprocess)
+                        and str(saved['base_dir']) == base_dir):
+                    index._restore(saved)
+        if update and index.update():
+            index.save()
+        return index
+
+    def _restore(self, saved):
+        vocab = str(saved['vocab'])
+        self.vocab = vocab.split('\n') if vocab else []
+        self.word_ids = {word: i for i, word in enumerate(self.vocab)}
+        for folder in saved['folder_names'].tolist():
+            names = str(saved[f'{folder}/file_names'])
+            stamps = saved[f'{folder}/file_stamps'].tolist()
+            self.stats[folder] = {
+                'files': dict(zip(names.split('\n') if names else [], map(tuple, stamps))),
+                'terms': saved[f'{folder}/terms'],
+                'bigram_keys': saved[f'{folder}/bigram_keys'],
+                'bigram_counts': saved[f'{folder}/bigram_counts'],
+            }
+
+    def save(self):
+        index_dir = os.path.dirname(self.path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        arrays = {
+            'preprocess': preprocess_name(self.preprocess),
+            'base_dir': self.base_dir,
+            'vocab': '\n'.join(self.vocab),
+            'folder_names': np.array(list(self.stats)),
+        }
+        for folder, stats in self.stats.items():
+            arrays[f'{folder}/file_names'] = '\n'.join(stats['files'])
+            arrays[f'{folder}/file_stamps'] = np.array(list(stats['files'].values()),
+                                                       dtype=np.int64).reshape(-1, 2)
+            arrays[f'{folder}/terms'] = stats['terms']
+            arrays[f'{folder}/bigram_keys'] = stats['bigram_keys']
+            arrays[f'{folder}/bigram_counts'] = stats['bigram_counts']
+        np.savez(self.path, **arrays)
+
+    def _ids(self, words):
+        ids = np.empty(len(words), dtype=np.int64)
+        for i, word in enumerate(words):
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = self.word_ids[word] = len(self.vocab)
+                self.vocab.append(word)
+            ids[i] = word_id
+        return ids
+
+    def _add(self, stats, texts):
+        """统计一批文本并合并进文件夹的计数数组"""
+        term_ids = []
+        bigram_keys = []
+        for text in texts:
+            ids = self._ids(self.preprocess(text).split())
+            term_ids.append(ids)
+            bigram_keys.append((ids[:-1] << 32) | ids[1:])
+        if not term_ids:
+            return
+
+        terms = np.bincount(np.concatenate(term_ids), minlength=len(self.vocab))
+        terms[:len(stats['terms'])] += stats['terms']
+        stats['terms'] = terms
+
+        keys, inverse = np.unique(np.concatenate([stats['bigram_keys']] + bigram_keys),
+                                  return_inverse=True)
+        weights = np.concatenate([stats['bigram_counts'],
+                                  np.ones(len(inverse) - len(stats['bigram_counts']), dtype=np.int64)])
+        stats['bigram_keys'] = keys
+        stats['bigram_counts'] = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+        self._top_cache.clear()
+
+    def update(self):
+        """
+        统计新增的邮件文件；有文件被删除或修改时该文件夹重新统计
+        返回本次统计的文件数
+        """
+        processed = 0
+        for folder in self.folders:
+            folder_path = os.path.join(self.base_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            paths = corpus.list_folder(folder_path)
+            current = {os.path.basename(p): file_stamp(p) for p in paths}
+
+            stats = self.stats.get(folder)
+            if stats is None or any(current.get(name) != stamp for name, stamp in stats['files'].items()):
+                stats = self.stats[folder] = _empty_folder()
+
+            new_paths = [p for p in paths if os.path.basename(p) not in stats['files']]
+            self._add(stats, (corpus.read_email(p) for p in new_paths))
+            for file_path in new_paths:
+                stats['files'][os.path.basename(file_path)] = current[os.path.basename(file_path)]
+            processed += len(new_paths)
+
+        if processed:
+            print(f"正常邮件风格索引已更新: {processed} 封新邮件")
+        return processed
+
+    def add_texts(self, texts, folder='ham'):
+        """直接加入不在语料目录中的正常邮件文本"""
+        self._add(self.stats.setdefault(folder, _empty_folder()), texts)
+
+    def _folders(self, folders):
+        return [folder for folder in (folders if folders is not None else self.stats) if folder in self.stats]
+
+    def term_counts(self, folders=None):
+        """按词编号的合并词频数组"""
+        counts = np.zeros(len(self.vocab), dtype=np.int64)
+        for folder in self._folders(folders):
+            terms = self.stats[folder]['terms']
+            counts[:len(terms)] += terms
+        return counts
+
+    def bigram_counts(self, folders=None):
+        """合并后的 (二元词组键, 频次)"""
+        stats = [self.stats[folder] for folder in self._folders(folders)]
+        if not stats:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        keys, inverse = np.unique(np.concatenate([s['bigram_keys'] for s in stats]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([s['bigram_counts'] for s in stats]),
+                             minlength=len(keys)).astype(np.int64)
+        return keys, counts
+
+    @staticmethod
+    def _top_k(counts, k):
+        """频次从高到低取前 k 个下标，频次相同按编号（首次出现顺序）排列"""
+        if len(counts) > k:
+            cutoff = np.partition(counts, len(counts) - k)[len(counts) - k]
+            candidates = np.flatnonzero(counts >= cutoff)
+        else:
+            candidates = np.arange(len(counts))
+        order = np.lexsort((candidates, -counts[candidates]))
+        return candidates[order[:k]]
+
+    def top_terms(self, k=50, folders=None):
+        """最常见的 k 个词，[(词, 频次), ...]"""
+        key = ('terms', k, tuple(folders) if folders is not None else None)
+        if key not in self._top_cache:
+            counts = self.term_counts(folders)
+            self._top_cache[key] = [(self.vocab[i], int(counts[i])) for i in self._top_k(counts, k)]
+        return self._top_cache[key]
+
+    def top_bigrams(self, k=50, folders=None):
+        """最常见的 k 个二元词组，[((词1, 词2), 频次), ...]"""
+        key = ('bigrams', k, tuple(folders) if folders is not None else None)
+        if key not in self._top_cache:
+            keys, counts = self.bigram_counts(folders)
+            self._top_cache[key] = [((self.vocab[keys[i] >> 32], self.vocab[keys[i] & 0xFFFFFFFF]), int(counts[i]))
+                                    for i in self._top_k(counts, k)]
+        return self._top_cache[key]
+
+    def term_frequency(self, word, folders=None):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return 0
+        return int(sum(self.stats[folder]['terms'][word_id] for folder in self._folders(folders)
+                       if word_id < len(self.stats[folder]['terms'])))
+
+    def random_term(self, k=50, folders=None):
+        """从前 k 个高频词中均匀取一个"""
+        return random.choice(self.top_terms(k, folders))[0]
+
+    def random_bigram(self, k=50, folders=None):
+        """从前 k 个高频二元词组中均匀取一个，返回 '词1 词2'"""
+        return ' '.join(random.choice(self.top_bigrams(k, folders))[0])
@@ -0,0 +1,292 @@
+"""
+邮件头预分类：只读到第一个空行，把邮件头解析为紧凑结构，
+由轻量的线性模型（哈希特征 + 逻辑回归）给出垃圾邮件概率，
+高于拒收阈值的邮件在正文解码和清理之前直接判为垃圾邮件
+
+    python header_model.py train --max-ham-reject 0.001
+    python header_model.py check some_email.txt
+"""
+import argparse
+import math
+import os
+import re
+import zlib
+
+import joblib
+import numpy as np
+
+import corpus
+
+DEFAULT_PATH = 'header_model.joblib'
+# 有完整邮件头的语料（reinforced 系列是压成一行的正文，不参与训练）
+TRAIN_FOLDERS = {
+    'data/english/ham': 0,
+    'data/english/hard_ham': 0,
+    'data/english/spam': 1,
+    'data/english/failed_spam': 1,
+    'data/chinese/ham': 0,
+    'data/chinese/spam': 1,
+}
+# 解析出的邮件头字段少于该数目时不做预分类
+MIN_HEADERS = 3
+# 只解析前这么多字符，避免没有空行的超长文本
+MAX_HEADER_CHARS = 65536
+HASH_BUCKETS = 2 ** 14
+
+NUMERIC_FEATURE_NAMES = [
+    'num_headers', 'num_received', 'header_size', 'has_message_id', 'has_date', 'has_x_mailer',
+    'reply_to_mismatch', 'return_path_mismatch', 'from_display_name', 'subject_length',
+    'subject_upper_ratio', 'subject_exclaims', 'subject_money', 'subject_encoded',
+    'is_multipart', 'is_html', 'high_priority', 'num_recipients', 'list_headers', 'is_reply',
+]
+
+_FIELD = re.compile(r'([!-9;-~]+):[ \t]*(.*)')
+_DOMAIN = re.compile(r'@([\w.-]+)')
+_CHARSET = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+_WORD = re.compile(r'[a-z0-9$]+')
+
+
+class EmailHeaders:
+    """解析后的邮件头：字段名（小写）-> 值列表（续行已合并），以及邮件头的字符数"""
+    __slots__ = ('fields', 'size')
+
+    def __init__(self, fields, size):
+        self.fields = fields
+        self.size = size
+
+    def __len__(self):
+        return sum(len(values) for values in self.fields.values())
+
+    def get(self, name, default=''):
+        values = self.fields.get(name)
+        return values[0] if values else default
+
+    def count(self, name):
+        return len(self.fields.get(name, ()))
+
+
+def parse_headers(raw_email):
+    """只读取第一个空行之前的部分；正文不做任何处理"""
+    end = raw_email.find('\n\n', 0, MAX_HEADER_CHARS)
+    crlf_end = raw_email.find('\r\n\r\n', 0, MAX_HEADER_CHARS)
+    if crlf_end >= 0 and (end < 0 or crlf_end < end):
+        end = crlf_end
+    head = raw_email[:end] if end >= 0 else raw_email[:MAX_HEADER_CHARS]
+
+    fields = {}
+    name = None
+    for line in head.splitlines():
+        if line[:1] in (' ', '\t'):
+            if name is not None:
+                values = fields[name]
+                values[-1] = f'{values[-1]} {line.strip()}'
+            continue
+        match = _FIELD.match(line)
+        if match is None:
+            # mbox 的 "From xxx 日期" 分隔行等
+            name = None
+            continue
+        name = match.group(1).lower()
+        fields.setdefault(name, []).append(match.group(2).strip())
+    return EmailHeaders(fields, len(head))
+
+
+def _domain(value):
+    match = _DOMAIN.search(value)
+    return match.group(1).lower().strip('.') if match else ''
+
+
+def header_features(headers):
+    """
+    数值特征（顺序见 NUMERIC_FEATURE_NAMES）和哈希特征词列表
+    哈希特征词包括出现的字段名、邮件客户端、字符集、内容类型、发件域名后缀和主题中的词
+    """
+    subject = headers.get('subject')
+    from_value = headers.get('from')
+    from_domain = _domain(from_value)
+    reply_domain = _domain(headers.get('reply-to'))
+    return_domain = _domain(headers.get('return-path'))
+    content_type = headers.get('content-type').lower()
+    letters = [c for c in subject if c.isalpha()]
+    priority = headers.get('x-priority')[:1]
+
+    numeric = [
+        math.log1p(len(headers)),
+        math.log1p(headers.count('received')),
+        math.log1p(headers.size),
+        float('message-id' in headers.fields),
+        float('date' in headers.fields),
+        float('x-mailer' in headers.fields),
+        float(bool(reply_domain) and reply_domain != from_domain),
+        float(bool(return_domain) and return_domain != from_domain),
+        float('<' in from_value and not from_value.startswith('<')),
+        math.log1p(len(subject)),
+        sum(c.isupper() for c in letters) / len(letters) if letters else 0.0,
+        float(subject.count('!')),
+        float('$' in subject or '%' in subject),
+        float('=?' in subject),
+        float('multipart' in content_type),
+        float('text/html' in content_type),
+        float(priority in ('1', '2')),
+        math.log1p(headers.get('to').count(',') + headers.get('cc').count(',') + 1),
+        float('list-id' in headers.fields or 'list-unsubscribe' in headers.fields),
+        float('in-reply-to' in headers.fields or 'references' in headers.fields),
+    ]
+
+    tokens = [f'field:{name}' for name in headers.fields]
+    mailer = headers.get('x-mailer').lower().split()
+    if mailer:
+        tokens.append(f'mailer:{mailer[0]}')
+    charsets = _CHARSET.findall(content_type)
+    tokens.extend(f'charset:{charset.lower()}' for charset in charsets)
+    if content_type:
+        tokens.append(f'ctype:{content_type.split(";")[0].strip()}')
+    if from_domain:
+        tokens.append(f'from_tld:{from_domain.rsplit(".", 1)[-1]}')
+    tokens.extend(f'subj:{word}' for word in _WORD.findall(subject.lower()))
+    return numeric, tokens
+
+
+def token_index(token):
+    return len(NUMERIC_FEATURE_NAMES) + zlib.crc32(token.encode('utf-8', 'surrogatepass')) % HASH_BUCKETS
+
+
+def feature_matrix(headers_list):
+    """训练用的稀疏特征矩阵"""
+    from scipy import sparse
+
+    rows, columns, values = [], [], []
+    for row, headers in enumerate(headers_list):
+        numeric, tokens = header_features(headers)
+        for column, value in enumerate(numeric):
+            if value:
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+        for index in {token_index(token) for token in tokens}:
+            rows.append(row)
+            columns.append(index)
+            values.append(1.0)
+    return sparse.csr_matrix((values, (rows, columns)),
+                             shape=(len(headers_list), len(NUMERIC_FEATURE_NAMES) + HASH_BUCKETS))
+
+
+class HeaderClassifier:
+    """
+    逻辑回归的系数和截距直接保存为数组，单封邮件打分只是几十个系数相加，不经过 sklearn
+    threshold: 拒收阈值，训练时按验证集上正常邮件的误拒率上限选取
+    """
+
+    def __init__(self, coef, intercept, threshold):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.threshold = float(threshold)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        saved = joblib.load(path)
+        if saved['hash_buckets'] != HASH_BUCKETS or saved['numeric_features'] != NUMERIC_FEATURE_NAMES:
+            raise ValueError(f"邮件头模型 {path} 的特征定义与当前版本不一致，请重新训练")
+        return cls(saved['coef'], saved['intercept'], saved['threshold'])
+
+    def save(self, path=DEFAULT_PATH, **info):
+        joblib.dump({'coef': self.coef, 'intercept': self.intercept, 'threshold': self.threshold,
+                     'hash_buckets': HASH_BUCKETS, 'numeric_features': NUMERIC_FEATURE_NAMES, **info}, path)
+
+    def spam_probability(self, headers):
+        numeric, tokens = header_features(headers)
+        coef = self.coef
+        score = self.intercept + sum(c * v for c, v in zip(coef, numeric))
+        score += sum(coef[index] for index in {token_index(token) for token in tokens})
+        return 1.0 / (1.0 + math.exp(-score))
+
+    def reject_probability(self, raw_email):
+        """
+        邮件头足以拒收时返回垃圾邮件概率，否则返回 None
+        （邮件头字段过少或概率低于拒收阈值时都返回 None，交给完整流程判定）
+        """
+        headers = parse_headers(raw_email)
+        if len(headers) < MIN_HEADERS:
+            return None
+        probability = self.spam_probability(headers)
+        return probability if probability >= self.threshold else None
+
+
+def load_training_headers(folders=TRAIN_FOLDERS):
+    headers_list, labels = [], []
+    for folder, label in folders.items():
+        if not os.path.isdir(folder):
+            continue
+        for file_path in corpus.list_folder(folder):
+            headers = parse_headers(corpus.read_email(file_path))
+            if len(headers) >= MIN_HEADERS:
+                headers_list.append(headers)
+                labels.append(label)
+    return headers_list, np.array(labels)
+
+
+def train(folders=TRAIN_FOLDERS, max_ham_reject=0.001, min_threshold=0.95, seed=0):
+    """
+    训练集 / 验证集按 8:2 分层划分；拒收阈值取验证集正常邮件概率的 (1 - max_ham_reject) 分位数，
+    且不低于 min_threshold
+    返回 (HeaderClassifier, 验证集统计)
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    headers_list, labels = load_training_headers(folders)
+    X = feature_matrix(headers_list)
+    X_train, X_val, y_train, y_val = train_test_split(X, labels, test_size=0.2, stratify=labels,
+                                                      random_state=seed)
+    model = LogisticRegression(C=1.0, max_iter=2000).fit(X_train, y_train)
+    val_probs = model.predict_proba(X_val)[:, 1]
+
+    ham_probs = np.sort(val_probs[y_val == 0])
+    allowed = int(max_ham_reject * len(ham_probs))
+    cutoff = np.nextafter(ham_probs[len(ham_probs) - 1 - allowed], 1.0) if len(ham_probs) else 0.5
+    threshold = max(float(cutoff), min_threshold)
+
+    rejected = val_probs >= threshold
+    stats = {
+        'train_size': int(len(y_train)),
+        'val_size': int(len(y_val)),
+        'threshold': threshold,
+        'spam_reject_rate': float(rejected[y_val == 1].mean()),
+        'ham_reject_rate': float(rejected[y_val == 0].mean()),
+    }
+    return HeaderClassifier(model.coef_.ravel(), model.intercept_[0], threshold), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件头预分类模型")
+    parser.add_argument('--path', default=DEFAULT_PATH, help="模型文件路径")
+    commands = parser.add_subparsers(dest='command', required=True)
+    train_parser = commands.add_parser('train', help="由带邮件头的语料训练")
+    train_parser.add_argument('--max-ham-reject', type=float, default=0.001,
+                              help="验证集正常邮件允许被拒收的比例")
+    train_parser.add_argument('--min-threshold', type=float, default=0.95, help="拒收阈值下限")
+    train_parser.add_argument('--seed', type=int, default=0)
+    check = commands.add_parser('check', help="对邮件文件做邮件头预分类")
+    check.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        classifier, stats = train(max_ham_reject=args.max_ham_reject,
+                                  min_threshold=args.min_threshold, seed=args.seed)
+        classifier.save(args.path, stats=stats)
+        print(f"📊 验证集 {stats['val_size']} 封：拒收阈值 {stats['threshold']:.4f}，"
+              f"垃圾邮件拒收率 {stats['spam_reject_rate']:.2%}，正常邮件误拒率 {stats['ham_reject_rate']:.2%}")
+        print(f"✅ 邮件头模型已保存到: {args.path}")
+        return
+
+    classifier = HeaderClassifier.load(args.path)
+    for file_path in args.files:
+        headers = parse_headers(corpus.read_email(file_path))
+        probability = classifier.spam_probability(headers) if len(headers) >= MIN_HEADERS else None
+        verdict = '拒收' if probability is not None and probability >= classifier.threshold else '放行'
+        shown = '-' if probability is None else f'{probability:.4f}'
+        print(f"{verdict}  {shown:>8}  {file_path}")
+
+
+if __name__ == "__main__":
+    main()
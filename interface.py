@@ -1,62 +1,87 @@
+"""
+Tkinter 界面（支持中文）
+模型加载、翻译和打分都在后台线程中进行，结果放入队列，由主线程用 root.after 定时取出更新界面，
+窗口不会卡住；输入停顿片刻后自动实时打分，未改动的段落直接复用缓存的翻译和预处理结果；
+文件夹批量模式逐批打分并显示进度（安装了 tkinterdnd2 时支持把文件夹拖进窗口）
+"""
+import os
+import queue
+import re
+import threading
 import tkinter as tk
+from collections import OrderedDict
+from tkinter import filedialog, ttk
+
 import utils
 import chinese_washer as cw
-import re
-from translate import Translator
-
-def has_chinese(text):
-    pattern = re.compile(r'[\u4e00-\u9fff]')
-    return bool(pattern.search(text))
-
-def split_and_translate(text, max_length=400):
-    tr = Translator(from_lang="zh", to_lang="en")
-    translated_parts = []
-
-    sentences = re.split(r'[。！？!?]', text)
-    current_chunk = ""
-
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-
-        if len(current_chunk) + len(sentence) <= max_length:
-            if current_chunk:
-                current_chunk += "。" + sentence
-            else:
-                current_chunk = sentence
-        else:
-            if current_chunk:
-                try:
-                    translated = tr.translate(current_chunk)
-                    translated_parts.append(translated)
-                except Exception as e:
-                    translated_parts.append(current_chunk)
-                current_chunk = sentence
-            else:
-
-                for i in range(0, len(sentence), max_length):
-                    chunk = sentence[i:i + max_length]
-                    try:
-                        translated = tr.translate(chunk)
-                        translated_parts.append(translated)
-                    except Exception as e:
-                        translated_parts.append(chunk)
-
-    if current_chunk:
-        try:
-            translated = tr.translate(current_chunk)
-            translated_parts.append(translated)
-        except Exception as e:
-            translated_parts.append(current_chunk)
+import corpus
+from translation import has_chinese, split_and_translate
+
+# 停止输入多久后开始实时打分（毫秒）
+LIVE_DELAY_MS = 600
+# 主线程检查结果队列的间隔（毫秒）
+POLL_MS = 50
+# 文件夹批量模式每批的邮件数
+BATCH_SIZE = 32
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+class ParagraphCache:
+    """
+    (段落, 是否中文模式) -> (英文文本, 预处理结果) 的 LRU 缓存
+    编辑时只有改动过的段落需要重新清理、翻译和预处理
+    """
+
+    def __init__(self, predictor, capacity=512):
+        self.predictor = predictor
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def paragraph(self, paragraph, chinese_mode):
+        """
+        中文模式下每个段落都先用 powerful_wash 清理（与原来对整段文本清理相同，邮件头等段落也会被清掉），
+        清理后仍含中文的段落再翻译；英文模式下段落原样保留
+        """
+        key = (paragraph, chinese_mode)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        english = paragraph
+        if chinese_mode:
+            # 补上行尾换行，段落最后一行的邮件头也能被按行匹配的清理规则去掉
+            english = cw.powerful_wash(paragraph + "\n").strip()
+            if has_chinese(english):
+                with self.predictor.stage_timer('translate'):
+                    english = split_and_translate(english)
+        entry = (english, self.predictor.preprocess_email(english))
+        self._entries[key] = entry
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return entry
+
+    def prepare(self, text):
+        """
+        返回 (送入模型的英文文本, 其预处理结果)
+        含中文的文本：各段落清理、翻译后连成一段（逐段清理和翻译，结果与对整段文本处理相近但不保证逐字相同）；
+        纯英文的多段文本按邮件格式把第一段当作邮件头，不参与打分，与对整段文本预处理的结果一致
+        """
+        paragraphs = [p.strip() for p in _PARAGRAPH_BREAK.split(text) if p.strip()]
+        chinese_mode = has_chinese(text)
+        entries = [self.paragraph(p, chinese_mode) for p in paragraphs]
+        if chinese_mode:
+            return (" ".join(english for english, _ in entries if english),
+                    " ".join(p for _, p in entries if p))
+        body = entries[1:] if len(entries) > 1 else entries
+        return "\n\n".join(english for english, _ in entries), " ".join(p for _, p in body if p)
 
-    return " ".join(translated_parts)
 
 class Interface:
     def __init__(self, root):
         self.root = root
         self.root.title("Spam Checker")
-        self.root.geometry("800x700")
+        self.root.geometry("800x800")
 
         self.label = tk.Label(
             self.root,
@@ -67,19 +92,29 @@ class Interface:
 
         self.text_box = tk.Text(
             self.root,
-            height=20,
+            height=14,
             width=50,
             font=("Arial", 20)
         )
         self.text_box.pack(pady=10)
+        self.text_box.bind("<<Modified>>", self.on_text_modified)
 
+        buttons = tk.Frame(self.root)
+        buttons.pack(pady=10)
         self.button = tk.Button(
-            self.root,
+            buttons,
             text="检查",
             command=self.on_button_click,
             font=("Arial", 24, "bold")
         )
-        self.button.pack(pady=10)
+        self.button.pack(side="left", padx=10)
+        self.folder_button = tk.Button(
+            buttons,
+            text="批量检查文件夹",
+            command=self.on_folder_click,
+            font=("Arial", 24)
+        )
+        self.folder_button.pack(side="left", padx=10)
 
         self.output = tk.Text(
             self.root,
@@ -90,20 +125,177 @@ class Interface:
         )
         self.output.pack(pady=10)
 
+        self.status = tk.Label(
+            self.root,
+            text="模型加载中...",
+            font=("Arial", 16)
+        )
+        self.status.pack(pady=5)
+
+        self.progress = ttk.Progressbar(self.root, length=600, mode="determinate")
+        self.progress.pack(pady=5)
+
+        self._enable_drop()
+
+        self.predictor = None
+        self.cache = None
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._live_job = None
+        # 实时打分的编号，后台只处理最新一次，过期的请求直接丢弃
+        self._live_generation = 0
+        self._worker = threading.Thread(target=self._work, name="spam-checker-worker", daemon=True)
+        self._worker.start()
+        self._tasks.put(("load",))
+        self.root.after(POLL_MS, self._poll_results)
+
+    def _enable_drop(self):
+        """窗口由 tkinterdnd2.TkinterDnD.Tk 创建时，支持把文件夹拖进来批量检查"""
+        try:
+            from tkinterdnd2 import DND_FILES
+            self.root.drop_target_register(DND_FILES)
+        except (ImportError, AttributeError, tk.TclError):
+            return
+        self.root.dnd_bind("<<Drop>>", self.on_drop)
+        self.label.config(text="请输入邮件内容（或把文件夹拖到窗口中）:")
+
+    # ---- 主线程：界面事件 ----
+
     def on_button_click(self):
-        predictor = utils.SpamPredictor()
-        text = self.text_box.get("1.0", tk.END)
-        if has_chinese(text):
-            print(cw.powerful_wash(text))
-            text = split_and_translate(cw.powerful_wash(text))
-            print(text)
-        result = predictor.predict(text)
+        self._set_output("检查中...")
+        self._tasks.put(("check", self.text_box.get("1.0", tk.END)))
+
+    def on_text_modified(self, event=None):
+        if not self.text_box.edit_modified():
+            return
+        self.text_box.edit_modified(False)
+        if self._live_job is not None:
+            self.root.after_cancel(self._live_job)
+        self._live_job = self.root.after(LIVE_DELAY_MS, self._request_live_score)
+
+    def _request_live_score(self):
+        self._live_job = None
+        self._live_generation += 1
+        self._tasks.put(("live", self.text_box.get("1.0", tk.END), self._live_generation))
+
+    def on_folder_click(self):
+        folder = filedialog.askdirectory(title="选择要批量检查的邮件文件夹")
+        if folder:
+            self._start_batch(folder)
+
+    def on_drop(self, event):
+        for path in self.root.tk.splitlist(event.data):
+            if os.path.isdir(path):
+                self._start_batch(path)
+                break
+
+    def _start_batch(self, folder):
+        self.folder_button.config(state="disabled")
+        self.progress.config(value=0, maximum=1)
+        self.status.config(text=f"批量检查: {folder}")
+        self._tasks.put(("batch", folder))
+
+    def _set_output(self, text):
         self.output.config(state="normal")
         self.output.delete("1.0", tk.END)
-        self.output.insert("1.0", result['prediction'])
+        self.output.insert("1.0", text)
         self.output.config(state="disabled")
 
+    def _poll_results(self):
+        try:
+            while True:
+                self._handle_result(*self._results.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self._poll_results)
+
+    def _handle_result(self, kind, *payload):
+        if kind == "loaded":
+            self.status.config(text="模型已加载")
+        elif kind == "check":
+            result, = payload
+            probability = result.get('spam_probability')
+            shown = f"（垃圾邮件概率 {probability:.2%}）" if probability is not None else ""
+            self._set_output(f"{result['prediction']}{shown}")
+        elif kind == "live":
+            generation, probability = payload
+            if generation == self._live_generation:
+                self.status.config(text=f"实时评分：垃圾邮件概率 {probability:.2%}"
+                                   if probability is not None else "实时评分：内容过短")
+        elif kind == "progress":
+            done, total = payload
+            self.progress.config(value=done, maximum=max(total, 1))
+            self.status.config(text=f"批量检查中：{done}/{total}")
+        elif kind == "batch":
+            counts, total = payload
+            self.folder_button.config(state="normal")
+            summary = "，".join(f"{label} {count} 封" for label, count in counts.items())
+            self.status.config(text=f"批量检查完成，共 {total} 封：{summary or '-'}")
+        elif kind == "error":
+            message, = payload
+            self.folder_button.config(state="normal")
+            self.status.config(text=f"出错：{message}")
+
+    # ---- 后台线程：加载、翻译和打分 ----
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            try:
+                self._run_task(*task)
+            except Exception as e:
+                self._results.put(("error", str(e)))
+
+    def _run_task(self, kind, *args):
+        if kind == "load":
+            self.predictor = utils.SpamPredictor()
+            self.cache = ParagraphCache(self.predictor)
+            self._results.put(("loaded",))
+        elif kind == "check":
+            text, = args
+            english, _ = self.cache.prepare(text)
+            self._results.put(("check", self.predictor.predict(english)))
+        elif kind == "live":
+            text, generation = args
+            # 已有更新的输入时跳过（读取整数不需要加锁）
+            if generation != self._live_generation:
+                return
+            english, processed = self.cache.prepare(text)
+            probs, valid = self.predictor.spam_probabilities([english], [processed])
+            self._results.put(("live", generation, float(probs[0]) if valid else None))
+        elif kind == "batch":
+            folder, = args
+            self._run_batch(folder)
+
+    def _run_batch(self, folder):
+        paths = corpus.list_folder(folder)
+        counts = {}
+        self._results.put(("progress", 0, len(paths)))
+        for start in range(0, len(paths), BATCH_SIZE):
+            texts = []
+            for path in paths[start:start + BATCH_SIZE]:
+                # 中文邮件多为 GBK / UTF-8 编码，按 latin-1 读取会变成乱码而不被翻译
+                text = corpus.read_email_auto(path)
+                if has_chinese(text):
+                    with self.predictor.stage_timer('translate'):
+                        text = split_and_translate(cw.powerful_wash(text))
+                texts.append(text)
+            for result in self.predictor.predict_batch(texts):
+                counts[result['prediction']] = counts.get(result['prediction'], 0) + 1
+            self._results.put(("progress", min(start + BATCH_SIZE, len(paths)), len(paths)))
+        self._results.put(("batch", counts, len(paths)))
+
+
+def make_root():
+    """安装了 tkinterdnd2 时创建支持拖放的窗口"""
+    try:
+        from tkinterdnd2 import TkinterDnD
+        return TkinterDnD.Tk()
+    except ImportError:
+        return tk.Tk()
+
+
 if __name__ == "__main__":
-    root = tk.Tk()
+    root = make_root()
     app = Interface(root)
     root.mainloop()
@@ -1,4 +1,3 @@
-import pandas as pd
 import os
 import chinese_washer
 
@@ -22,6 +21,8 @@ def load_files(base_path):
                 data.append(content)
                 labels.append(label)
 
+    import pandas as pd
+
     df = pd.DataFrame({
         'message': data,
         'label': labels
@@ -45,5 +46,6 @@ def read_file_safe(file_path):
     print(f"无法读取文件: {file_path}")
     return None
 
-load_files('data')
-print('done')
\ No newline at end of file
+if __name__ == "__main__":
+    load_files('data')
+    print('done')
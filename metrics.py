@@ -0,0 +1,209 @@
+"""
+SpamPredictor 运行指标：各阶段耗时、滚动延迟分布、按结果分类的计数和缓存命中率
+可导出为 JSON 或 Prometheus 文本格式，并可通过内置 HTTP 端点暴露
+"""
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# 延迟直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 预测流程的各个阶段
+STAGES = ('headers', 'preprocess', 'features', 'vectorize', 'predict', 'explain', 'translate')
+
+
+class LatencyHistogram:
+    """累积桶计数（供 Prometheus 使用）+ 最近 window 次观测（用于计算分位数）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)):
+        if not self.recent:
+            return {q: 0.0 for q in qs}
+        values = np.quantile(np.fromiter(self.recent, dtype=float), qs)
+        return dict(zip(qs, (float(v) for v in values)))
+
+    def snapshot(self):
+        cumulative = np.cumsum(self.counts).tolist()
+        return {
+            'count': self.count,
+            'sum_s': self.total,
+            'mean_s': self.total / self.count if self.count else 0.0,
+            'recent': {f'p{int(q * 100)}': v for q, v in self.quantiles().items()},
+            'buckets': {str(bound): cumulative[i] for i, bound in enumerate(self.buckets)},
+        }
+
+
+class PredictorMetrics:
+    """线程安全的预测指标收集器"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024, rate_window=60.0):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._window = window
+        self.rate_window = rate_window
+        self.started = time.time()
+        self.stages = {stage: LatencyHistogram(buckets, window) for stage in STAGES}
+        self.latency = LatencyHistogram(buckets, window)
+        self.verdicts = {}
+        self.cache = {}
+        self.emails_total = 0
+        self._recent_emails = deque()
+
+    def observe_stage(self, stage, seconds):
+        """记录某阶段的一次耗时（批量调用时为整批耗时）"""
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = LatencyHistogram(self._buckets, self._window)
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """用 with 语句为一段代码计时，例如翻译阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def observe_request(self, seconds, prediction):
+        """记录一次端到端预测：总耗时与结果（垃圾邮件/正常邮件/无法判断/错误）"""
+        now = time.time()
+        with self._lock:
+            self.latency.observe(seconds)
+            self.verdicts[prediction] = self.verdicts.get(prediction, 0) + 1
+            self.emails_total += 1
+            self._recent_emails.append(now)
+            self._trim(now)
+
+    def observe_batch(self, seconds, predictions):
+        """记录一次批量预测：延迟按每封邮件均摊"""
+        now = time.time()
+        per_email = seconds / len(predictions) if predictions else 0.0
+        with self._lock:
+            for prediction in predictions:
+                self.latency.observe(per_email)
+                self.verdicts[prediction] = self.verdicts.get(prediction, 0) + 1
+                self._recent_emails.append(now)
+            self.emails_total += len(predictions)
+            self._trim(now)
+
+    def observe_cache(self, name, hit):
+        """记录缓存访问结果，用于计算命中率"""
+        with self._lock:
+            stats = self.cache.setdefault(name, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+
+    def _trim(self, now):
+        while self._recent_emails and now - self._recent_emails[0] > self.rate_window:
+            self._recent_emails.popleft()
+
+    def snapshot(self):
+        """当前所有指标的字典形式"""
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            uptime = now - self.started
+            return {
+                'uptime_s': uptime,
+                'emails_total': self.emails_total,
+                'throughput_per_s': len(self._recent_emails) / min(self.rate_window, max(uptime, 1e-9)),
+                'verdicts': dict(self.verdicts),
+                'latency': self.latency.snapshot(),
+                'stages': {name: hist.snapshot() for name, hist in self.stages.items()},
+                'cache': {
+                    name: dict(stats, hit_rate=stats['hits'] / max(stats['hits'] + stats['misses'], 1))
+                    for name, stats in self.cache.items()
+                },
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        snap = self.snapshot()
+        lines = [
+            '# TYPE spam_predictor_emails_total counter',
+            f"spam_predictor_emails_total {snap['emails_total']}",
+            '# TYPE spam_predictor_throughput_per_second gauge',
+            f"spam_predictor_throughput_per_second {snap['throughput_per_s']:.6f}",
+            '# TYPE spam_predictor_verdicts_total counter',
+        ]
+        for verdict, count in snap['verdicts'].items():
+            lines.append(f'spam_predictor_verdicts_total{{verdict="{verdict}"}} {count}')
+
+        lines.append('# TYPE spam_predictor_latency_seconds histogram')
+        lines.extend(_histogram_lines('spam_predictor_latency_seconds', snap['latency']))
+
+        lines.append('# TYPE spam_predictor_stage_seconds histogram')
+        for stage, hist in snap['stages'].items():
+            lines.extend(_histogram_lines('spam_predictor_stage_seconds', hist, f'stage="{stage}",'))
+
+        lines.append('# TYPE spam_predictor_cache_requests_total counter')
+        for name, stats in snap['cache'].items():
+            lines.append(f'spam_predictor_cache_requests_total{{cache="{name}",result="hit"}} {stats["hits"]}')
+            lines.append(f'spam_predictor_cache_requests_total{{cache="{name}",result="miss"}} {stats["misses"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, hist, labels=''):
+    lines = []
+    for bound, count in hist['buckets'].items():
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {hist["count"]}')
+    suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+    lines.append(f'{name}_sum{suffix} {hist["sum_s"]:.6f}')
+    lines.append(f'{name}_count{suffix} {hist["count"]}')
+    return lines
+
+
+def start_metrics_server(metrics, host='127.0.0.1', port=9108):
+    """
+    在后台线程启动指标端点
+    /metrics 返回 Prometheus 文本，/metrics.json 返回 JSON
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = metrics.to_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = metrics.to_json().encode('utf-8')
+                content_type = 'application/json; charset=utf-8'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"指标端点已启动: http://{host}:{server.server_port}/metrics")
+    return server
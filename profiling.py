@@ -0,0 +1,216 @@
+"""
+在线预测器的按需采样分析
+开启后对接下来 N 次 SpamPredictor.predict 调用（或一段时间内的批量预测）进行栈采样，
+输出 flamegraph.pl / speedscope 可直接读取的 collapsed-stack 文本，
+每条栈以邮件大小分档作为根节点，便于把热点与邮件形态对应起来
+
+开启方式：
+  - API:     profiling.profile_next_calls(predictor, 100)
+             profiling.profile_window(predictor, 30)
+  - 环境变量: SPAM_PROFILE_CALLS=100 [SPAM_PROFILE_OUTPUT=profile.folded]
+  - 信号:     profiling.install_signal_handler(predictor)，之后 kill -USR1 <pid>
+
+未开启时不做任何包装，predict 走类上的原始方法，没有额外开销
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# 邮件大小分档（字符数上界, 标签）
+SIZE_BUCKETS = (
+    (1000, 'lt_1k'),
+    (10000, '1k_10k'),
+    (100000, '10k_100k'),
+)
+
+
+def size_tag(texts):
+    """按邮件（或整批邮件的平均）大小返回分档标签"""
+    if isinstance(texts, str):
+        size = len(texts)
+        prefix = 'email_size'
+    else:
+        size = sum(len(text) for text in texts) // max(len(texts), 1)
+        prefix = f'batch{len(texts)}_avg_size'
+    for bound, label in SIZE_BUCKETS:
+        if size < bound:
+            return f'{prefix}={label}'
+    return f'{prefix}=ge_100k'
+
+
+def default_output_path():
+    return os.path.join('profiles', f"predict_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded")
+
+
+class StackSampler:
+    """后台线程定时采样正在被分析的线程的调用栈"""
+
+    def __init__(self, interval=0.0005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='predict-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def enter(self, tag, root_code):
+        with self._lock:
+            self._active[threading.get_ident()] = (tag, root_code)
+
+    def leave(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, (tag, root_code) in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[self._collapse(frame, tag, root_code)] += 1
+
+    @staticmethod
+    def _collapse(frame, tag, root_code):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            names.append(f'{module}:{code.co_name}')
+            if code is root_code:
+                break
+            frame = frame.f_back
+        names.append(tag)
+        return ';'.join(reversed(names))
+
+    def write(self, output):
+        output_dir = os.path.dirname(output)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        with open(output, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+
+
+class PredictProfiler:
+    """
+    在预测器实例上临时包装 predict / predict_batch
+    达到调用次数或时间窗口结束后自动卸载包装并写出结果
+    """
+
+    def __init__(self, predictor, calls=None, seconds=None, output=None, interval=0.0005):
+        self.predictor = predictor
+        self.remaining = calls
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.output = output or default_output_path()
+        self.sampler = StackSampler(interval)
+        self.calls_profiled = 0
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def attach(self):
+        if 'predict' in vars(self.predictor):
+            raise RuntimeError("该预测器已在分析中")
+
+        predict = type(self.predictor).predict.__get__(self.predictor)
+        predict_batch = type(self.predictor).predict_batch.__get__(self.predictor)
+
+        def profiled_predict(email_text, *args, **kwargs):
+            return self._profiled(predict, email_text, profiled_predict.__code__, *args, **kwargs)
+
+        def profiled_predict_batch(email_texts, *args, **kwargs):
+            return self._profiled(predict_batch, email_texts, profiled_predict_batch.__code__,
+                                  *args, **kwargs)
+
+        self.predictor.predict = profiled_predict
+        self.predictor.predict_batch = profiled_predict_batch
+        self.sampler.start()
+        print(f"已开启预测分析，结果将写入: {self.output}")
+        return self
+
+    def _profiled(self, fn, texts, root_code, *args, **kwargs):
+        if self._finished or (self.deadline is not None and time.monotonic() > self.deadline):
+            self.finish()
+            return fn(texts, *args, **kwargs)
+
+        self.sampler.enter(size_tag(texts), root_code)
+        try:
+            return fn(texts, *args, **kwargs)
+        finally:
+            self.sampler.leave()
+            with self._lock:
+                self.calls_profiled += 1
+                if self.remaining is not None:
+                    self.remaining -= 1
+                    done = self.remaining <= 0
+                else:
+                    done = False
+            if done:
+                self.finish()
+
+    def finish(self):
+        """卸载包装、停止采样并写出 collapsed-stack 文件"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        vars(self.predictor).pop('predict', None)
+        vars(self.predictor).pop('predict_batch', None)
+        self.sampler.stop()
+        self.sampler.write(self.output)
+        print(f"✅ 预测分析完成（{self.calls_profiled} 次调用，"
+              f"{sum(self.sampler.stacks.values())} 个样本），结果已保存到: {self.output}")
+
+
+def profile_next_calls(predictor, calls=100, output=None, interval=0.0005):
+    """分析接下来 calls 次 predict / predict_batch 调用"""
+    return PredictProfiler(predictor, calls=calls, output=output, interval=interval).attach()
+
+
+def profile_window(predictor, seconds=30.0, output=None, interval=0.0005):
+    """分析接下来 seconds 秒内的预测调用（适合批量打分）"""
+    profiler = PredictProfiler(predictor, seconds=seconds, output=output, interval=interval).attach()
+    timer = threading.Timer(seconds, profiler.finish)
+    timer.daemon = True
+    timer.start()
+    return profiler
+
+
+def install_from_env(predictor):
+    """若设置了 SPAM_PROFILE_CALLS 或 SPAM_PROFILE_SECONDS，则立即开启分析"""
+    output = os.environ.get('SPAM_PROFILE_OUTPUT')
+    if os.environ.get('SPAM_PROFILE_CALLS'):
+        return profile_next_calls(predictor, int(os.environ['SPAM_PROFILE_CALLS']), output)
+    if os.environ.get('SPAM_PROFILE_SECONDS'):
+        return profile_window(predictor, float(os.environ['SPAM_PROFILE_SECONDS']), output)
+    return None
+
+
+def install_signal_handler(predictor, calls=100, signum=None):
+    """收到信号（默认 SIGUSR1）时分析接下来 calls 次调用；仅支持 Unix"""
+    if signum is None:
+        signum = getattr(signal, 'SIGUSR1', None)
+        if signum is None:
+            raise RuntimeError("当前平台不支持 SIGUSR1")
+
+    def handler(signum, frame):
+        if 'predict' not in vars(predictor):
+            profile_next_calls(predictor, calls)
+
+    signal.signal(signum, handler)
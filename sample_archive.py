@@ -0,0 +1,195 @@
+"""
+分类对抗样本的索引归档
+用一个数据文件（<name>.dat，每个样本一段 JSON）加一个索引（<name>.idx.npz）取代
+categorized_samples 下成千上万的小文件；索引记录类别、概率和数据偏移，
+支持按类别 / 概率下降幅度筛选和按序号随机读取，并可直接导出到训练数据目录
+"""
+import json
+import os
+
+import numpy as np
+
+from adversarial_store import CATEGORIES, categorize, prob_change
+
+CATEGORY_NAMES = tuple(CATEGORIES)
+
+INDEX_DTYPE = np.dtype([
+    ('sample', np.int64),               # 结果库中的序号
+    ('category', np.int8),              # CATEGORY_NAMES 中的下标
+    ('success', np.bool_),
+    ('original_spam_prob', np.float32),
+    ('attacked_spam_prob', np.float32),
+    ('offset', np.int64),
+    ('length', np.int64),
+])
+
+
+def archive_paths(path):
+    """归档的数据文件与索引文件路径"""
+    return path + '.dat', path + '.idx.npz'
+
+
+class SampleArchive:
+    """只读访问：索引整体载入内存，样本文本按偏移读取"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data_path, self.index_path = archive_paths(path)
+        with np.load(self.index_path) as saved:
+            self.index = saved['index']
+            self.store = str(saved['store'])
+        self._file = open(self.data_path, 'rb')
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, position):
+        """按归档中的位置随机读取一个样本"""
+        row = self.index[position]
+        self._file.seek(int(row['offset']))
+        record = json.loads(self._file.read(int(row['length'])).decode('utf-8'))
+        record.update(
+            sample=int(row['sample']),
+            category=CATEGORY_NAMES[row['category']],
+            success=bool(row['success']),
+            original_spam_prob=float(row['original_spam_prob']),
+            attacked_spam_prob=float(row['attacked_spam_prob']),
+        )
+        return record
+
+    def prob_changes(self):
+        return (self.index['attacked_spam_prob'].astype(float)
+                - self.index['original_spam_prob'].astype(float))
+
+    def select(self, category=None, success=None, min_drop=None, max_drop=None):
+        """
+        返回满足条件的样本位置数组
+        min_drop / max_drop: 垃圾邮件概率下降幅度的范围（例如 min_drop=0.5）
+        """
+        mask = np.ones(len(self.index), dtype=bool)
+        if category is not None:
+            mask &= self.index['category'] == CATEGORY_NAMES.index(category)
+        if success is not None:
+            mask &= self.index['success'] == success
+        drops = -self.prob_changes()
+        if min_drop is not None:
+            mask &= drops >= min_drop
+        if max_drop is not None:
+            mask &= drops <= max_drop
+        return np.flatnonzero(mask)
+
+    def iter_samples(self, positions=None):
+        """按位置顺序逐个读取样本（默认全部）"""
+        if positions is None:
+            positions = range(len(self.index))
+        for position in positions:
+            yield self[position]
+
+    def counts(self):
+        """各类别的样本数"""
+        counts = np.bincount(self.index['category'], minlength=len(CATEGORY_NAMES))
+        return dict(zip(CATEGORY_NAMES, counts.tolist()))
+
+    def success_rate(self, category=None):
+        """攻击成功率，可限定类别"""
+        positions = self.select(category=category)
+        if len(positions) == 0:
+            return 0.0
+        return float(self.index['success'][positions].mean())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveWriter:
+    """
+    从结果库增量写入归档
+    归档已由同一结果库生成时只追加新增样本，否则重新生成
+    """
+
+    def __init__(self, path, store_path):
+        self.path = path
+        self.data_path, self.index_path = archive_paths(path)
+        self.store = os.path.abspath(store_path)
+        archive_dir = os.path.dirname(path)
+        if archive_dir and not os.path.exists(archive_dir):
+            os.makedirs(archive_dir)
+
+        rows = np.empty(0, dtype=INDEX_DTYPE)
+        if os.path.exists(self.index_path) and os.path.exists(self.data_path):
+            with np.load(self.index_path) as saved:
+                if str(saved['store']) == self.store:
+                    rows = saved['index']
+        self._existing = rows
+        self.exported = int(rows['sample'].max()) + 1 if len(rows) else 0
+        self._rows = []
+        self._file = open(self.data_path, 'ab' if len(rows) else 'wb')
+        self._file.truncate(int(rows['offset'][-1] + rows['length'][-1]) if len(rows) else 0)
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, record):
+        """写入结果库中的一条记录；已归档的序号会被跳过"""
+        if record['index'] < self.exported:
+            return
+        payload = json.dumps({'original_text': record['original_text'],
+                              'attacked_text': record['attacked_text'],
+                              'attacked_pred': record['attacked_pred']},
+                             ensure_ascii=False).encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(payload)
+        self._rows.append((
+            record['index'],
+            CATEGORY_NAMES.index(categorize(prob_change(record))),
+            record['success'],
+            record['original_prob'][1],
+            record['attacked_prob'][1],
+            offset,
+            len(payload),
+        ))
+
+    def close(self):
+        """写出索引，返回归档中的样本总数"""
+        self._file.close()
+        rows = np.concatenate([self._existing, np.array(self._rows, dtype=INDEX_DTYPE)])
+        np.savez(self.index_path, index=rows, store=self.store)
+        return len(rows)
+
+
+def build_archive(store_path, path):
+    """由结果库生成（或增量更新）归档"""
+    from adversarial_store import iter_results
+
+    writer = ArchiveWriter(path, store_path)
+    for record in iter_results(store_path):
+        writer.write(record)
+    return writer.close()
+
+
+def export_to_folder(path, output_dir, category=None, success=None, min_drop=None,
+                     field='attacked_text', last_line=False, prefix='sample_'):
+    """
+    将归档中筛选出的样本直接写入训练数据目录（每个样本一个文件，文件名为 <prefix><序号+1>.txt）
+    last_line=True 时只取文本最后一行，对应 strip.save_last_lines_separately 的旧行为
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"已创建输出目录: {output_dir}")
+
+    with SampleArchive(path) as archive:
+        positions = archive.select(category=category, success=success, min_drop=min_drop)
+        for sample in archive.iter_samples(positions):
+            text = sample[field]
+            if last_line:
+                text = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')[-1].strip()
+            filename = f"{prefix}{sample['sample'] + 1}.txt"
+            with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
+                f.write(text)
+
+    print(f"✅ 已导出 {len(positions)} 个样本到: {output_dir}")
+    return len(positions)
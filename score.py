@@ -0,0 +1,74 @@
+"""
+轻量的命令行打分入口，适合短时运行的批处理任务
+启动时只导入打分必需的模块；GUI、翻译、pandas 都不导入，含中文的邮件才按需导入翻译
+
+    python score.py data/english/spam/0001.txt data/english/ham/0002.txt
+    python score.py --json some_email.txt > result.json
+    cat some_email.txt | python score.py -
+    python score.py --encoding gbk data/chinese/spam/1
+"""
+import argparse
+import contextlib
+import json
+import sys
+
+import corpus
+
+
+def decode(data, encoding=None):
+    """指定编码时按该编码解码，否则依次尝试 UTF-8、GBK、latin-1（见 corpus.decode_email）"""
+    if encoding:
+        text = data.decode(encoding, errors='replace')
+    else:
+        text = corpus.decode_email(data)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_inputs(paths, encoding=None):
+    for path in paths:
+        if path == '-':
+            yield '<stdin>', decode(sys.stdin.buffer.read(), encoding)
+        else:
+            with open(path, 'rb') as file:
+                yield path, decode(file.read(), encoding)
+
+
+def to_english(text):
+    """含中文的邮件先清理再翻译（与 autocheck 相同）"""
+    from translation import has_chinese
+    if not has_chinese(text):
+        return text
+    import chinese_washer as cw
+    from translation import split_and_translate
+    return split_and_translate(cw.powerful_wash(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对邮件文件打分")
+    parser.add_argument('files', nargs='+', help="邮件文件路径，- 表示从标准输入读取")
+    parser.add_argument('--model-dir', default='.', help="包含 spam_model/vectorizer/optimal_threshold 的目录")
+    parser.add_argument('--json', action='store_true', help="每行输出一个 JSON 结果")
+    parser.add_argument('--encoding', help="邮件编码，默认依次尝试 UTF-8、GBK、latin-1")
+    args = parser.parse_args()
+
+    names, texts = [], []
+    for name, text in read_inputs(args.files, args.encoding):
+        names.append(name)
+        texts.append(to_english(text))
+
+    import utils
+    from threshold_optimizer import model_paths
+
+    # 加载信息输出到标准错误，标准输出只有结果
+    with contextlib.redirect_stdout(sys.stderr):
+        predictor = utils.SpamPredictor(*model_paths(args.model_dir), metrics=False)
+    for name, result in zip(names, predictor.predict_batch(texts)):
+        if args.json:
+            result = {key: float(value) if hasattr(value, 'dtype') else value for key, value in result.items()}
+            print(json.dumps(dict(result, file=name), ensure_ascii=False))
+        else:
+            print(f"{result['prediction']}  {result.get('spam_probability', 0.0):.4f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
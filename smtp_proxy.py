@@ -0,0 +1,400 @@
+"""
+本地 SMTP 过滤代理：在本地端口接收邮件，DATA 读完后交给 SpamPredictor 打分，
+按结果添加 X-Spam-* 邮件头（tag 模式）或直接拒收垃圾邮件（reject 模式），再转发给下游的本地 SMTP 服务
+服务端和转发客户端都基于 asyncio 流，单个事件循环即可处理大量并发连接；打分经 AsyncSpamPredictor 在执行器中进行
+
+    python smtp_proxy.py proxy --listen 127.0.0.1:10025 --downstream 127.0.0.1:10026 --mode tag
+    python smtp_proxy.py sink --listen 127.0.0.1:10026          # 本地测试用的收件端
+    python smtp_proxy.py selftest                               # 在回环地址上检查转发和 X-Spam-* 处理
+"""
+import argparse
+import asyncio
+import re
+import socket
+
+import corpus
+from async_predictor import AsyncSpamPredictor
+from batch_executor import BatchExecutor
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+SESSION_TIMEOUT = 300.0
+# 邮件头中的 X-Spam-* 字段（含续行）
+_SPAM_HEADER = re.compile(rb'^X-Spam-[^:\r\n]*:.*(?:\r?\n[ \t].*)*\r?\n', re.IGNORECASE | re.MULTILINE)
+
+
+class SMTPError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f'{code} {message}')
+        self.code = code
+        self.message = message
+
+
+def parse_address(argument, keyword):
+    """从 'FROM:<a@b.c> SIZE=123' 之类的参数中取出地址；格式不对时返回 None"""
+    if not argument.upper().startswith(keyword):
+        return None
+    address = argument[len(keyword):].strip()
+    if address.startswith('<'):
+        end = address.find('>')
+        return address[1:end] if end >= 0 else None
+    return address.split()[0] if address else None
+
+
+class SMTPSession:
+    """
+    单个连接的 SMTP 会话（EHLO/HELO、MAIL、RCPT、DATA、RSET、NOOP、QUIT）
+    收完一封邮件后调用 handler.handle_message(mail_from, rcpt_tos, data)，返回值作为 DATA 的应答
+    """
+
+    def __init__(self, handler, reader, writer, hostname, max_size=DEFAULT_MAX_SIZE):
+        self.handler = handler
+        self.reader = reader
+        self.writer = writer
+        self.hostname = hostname
+        self.max_size = max_size
+        self.reset()
+
+    def reset(self):
+        self.mail_from = None
+        self.rcpt_tos = []
+
+    async def reply(self, line):
+        self.writer.write(line.encode('ascii') + b'\r\n')
+        await self.writer.drain()
+
+    async def readline(self):
+        return await asyncio.wait_for(self.reader.readline(), SESSION_TIMEOUT)
+
+    async def run(self):
+        try:
+            await self.reply(f'220 {self.hostname} ESMTP spam filter')
+            while True:
+                line = await self.readline()
+                if not line:
+                    break
+                command, _, argument = line.decode('latin-1').strip().partition(' ')
+                if not await self.dispatch(command.upper(), argument.strip()):
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def dispatch(self, command, argument):
+        """处理一条命令，返回 False 时结束会话"""
+        if command == 'EHLO':
+            self.reset()
+            await self.reply(f'250-{self.hostname}\r\n250-SIZE {self.max_size}\r\n250 8BITMIME')
+        elif command == 'HELO':
+            self.reset()
+            await self.reply(f'250 {self.hostname}')
+        elif command == 'MAIL':
+            address = parse_address(argument, 'FROM:')
+            if self.mail_from is not None:
+                await self.reply('503 5.5.1 Nested MAIL command')
+            elif address is None:
+                await self.reply('501 5.5.4 Syntax: MAIL FROM:<address>')
+            else:
+                self.mail_from = address
+                await self.reply('250 2.1.0 OK')
+        elif command == 'RCPT':
+            address = parse_address(argument, 'TO:')
+            if self.mail_from is None:
+                await self.reply('503 5.5.1 Need MAIL command')
+            elif not address:
+                await self.reply('501 5.5.4 Syntax: RCPT TO:<address>')
+            else:
+                self.rcpt_tos.append(address)
+                await self.reply('250 2.1.5 OK')
+        elif command == 'DATA':
+            if not self.rcpt_tos:
+                await self.reply('503 5.5.1 Need RCPT command')
+            else:
+                await self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = await self.read_data()
+                if data is None:
+                    await self.reply('552 5.3.4 Message size exceeds limit')
+                else:
+                    await self.reply(await self.handler.handle_message(self.mail_from, self.rcpt_tos, data))
+                self.reset()
+        elif command == 'RSET':
+            self.reset()
+            await self.reply('250 2.0.0 OK')
+        elif command == 'NOOP':
+            await self.reply('250 2.0.0 OK')
+        elif command == 'VRFY':
+            await self.reply('252 2.0.0 Cannot VRFY user')
+        elif command == 'QUIT':
+            await self.reply('221 2.0.0 Bye')
+            return False
+        else:
+            await self.reply('500 5.5.2 Command not recognized')
+        return True
+
+    async def read_data(self):
+        """读取 DATA 内容直到单独一行的 '.'，去掉点填充；超过 max_size 时读完但返回 None"""
+        lines = []
+        size = 0
+        while True:
+            line = await self.readline()
+            if not line:
+                raise ConnectionError("DATA 过程中连接关闭")
+            if line in (b'.\r\n', b'.\n'):
+                break
+            if line.startswith(b'.'):
+                line = line[1:]
+            size += len(line)
+            if size <= self.max_size:
+                lines.append(line)
+        return b''.join(lines) if size <= self.max_size else None
+
+
+async def serve(handler, host, port, max_size=DEFAULT_MAX_SIZE):
+    """启动 SMTP 服务，返回 asyncio Server"""
+    hostname = socket.gethostname()
+
+    async def on_connect(reader, writer):
+        await SMTPSession(handler, reader, writer, hostname, max_size).run()
+
+    return await asyncio.start_server(on_connect, host, port, limit=64 * 1024)
+
+
+async def read_reply(reader):
+    """读取一个（可能多行的）SMTP 应答，返回 (代码, 文本)"""
+    lines = []
+    while True:
+        line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+        if len(line) < 3:
+            raise SMTPError(421, "连接已关闭")
+        lines.append(line[4:])
+        if line[3:4] != '-':
+            return int(line[:3]), '\n'.join(lines)
+
+
+async def send_message(host, port, mail_from, rcpt_tos, data, timeout=30.0):
+    """
+    用 SMTP 把一封邮件发送到 host:port（data 为字节串）
+    下游拒绝时抛出 SMTPError
+    """
+    async def expect(expected, command=None):
+        if command is not None:
+            writer.write(command.encode('latin-1') + b'\r\n')
+            await writer.drain()
+        code, message = await read_reply(reader)
+        if code != expected:
+            raise SMTPError(code, message)
+
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        async def transaction():
+            await expect(220)
+            await expect(250, f'EHLO {socket.gethostname()}')
+            await expect(250, f'MAIL FROM:<{mail_from}>')
+            for rcpt in rcpt_tos:
+                await expect(250, f'RCPT TO:<{rcpt}>')
+            await expect(354, 'DATA')
+            body = data if data.endswith(b'\n') else data + b'\r\n'
+            stuffed = b''.join(b'.' + line if line.startswith(b'.') else line
+                               for line in body.splitlines(keepends=True))
+            writer.write(stuffed + b'.\r\n')
+            await expect(250)
+            await expect(221, 'QUIT')
+        await asyncio.wait_for(transaction(), timeout)
+    finally:
+        writer.close()
+
+
+def strip_spam_headers(data):
+    """删除邮件头中发件方自带的 X-Spam-* 字段（伪造的 X-Spam-Flag: NO 可能误导下游过滤器），正文不变"""
+    # 邮件头截到空行开头为止，保留最后一个字段的换行（CRLF 时为 i + 2），最后一个字段也能匹配
+    crlf, lf = data.find(b'\r\n\r\n'), data.find(b'\n\n')
+    ends = [i + offset for i, offset in ((crlf, 2), (lf, 1)) if i >= 0]
+    end = min(ends) if ends else len(data)
+    return _SPAM_HEADER.sub(b'', data[:end]) + data[end:]
+
+
+def decode_message(data):
+    """打分用的文本：与 corpus.read_email_auto 一样按 UTF-8 / GBK / latin-1 解码，换行统一为 LF"""
+    return corpus.decode_email(data).replace('\r\n', '\n').replace('\r', '\n')
+
+
+def spam_headers(result):
+    """根据判定结果生成 X-Spam-* 邮件头（ASCII）"""
+    if result is None or result.get('prediction') not in ('垃圾邮件', '正常邮件'):
+        return b'X-Spam-Status: Unknown\r\n'
+    flag = 'YES' if result['prediction'] == '垃圾邮件' else 'NO'
+    probability = result.get('spam_probability', 0.0)
+    return (f'X-Spam-Flag: {flag}\r\n'
+            f'X-Spam-Status: {"Yes" if flag == "YES" else "No"}, probability={probability:.4f}\r\n').encode('ascii')
+
+
+class SpamFilterProxy:
+    """
+    mode='tag': 所有邮件删除自带的 X-Spam-* 字段、加上本代理的 X-Spam-* 邮件头后转发
+    mode='reject': 垃圾邮件以 550 拒收，其余加邮件头后转发
+    reject_threshold: reject 模式下拒收所需的垃圾邮件概率，默认按预测器的判定（其阈值）
+    打分出错或超时时不拦截邮件（标记为 Unknown 后转发）
+    """
+
+    def __init__(self, async_predictor, downstream, mode='tag', reject_threshold=None, timeout=10.0):
+        if mode not in ('tag', 'reject'):
+            raise ValueError("mode 只能是 'tag' 或 'reject'")
+        self.async_predictor = async_predictor
+        self.downstream = downstream
+        self.mode = mode
+        self.reject_threshold = reject_threshold
+        self.timeout = timeout
+        self.stats = {'received': 0, 'forwarded': 0, 'rejected': 0, 'unscored': 0, 'failed': 0}
+
+    def should_reject(self, result):
+        if self.mode != 'reject' or result is None:
+            return False
+        if self.reject_threshold is not None:
+            return result.get('spam_probability', 0.0) >= self.reject_threshold
+        return result.get('prediction') == '垃圾邮件'
+
+    async def handle_message(self, mail_from, rcpt_tos, data):
+        self.stats['received'] += 1
+        data = strip_spam_headers(data)
+        try:
+            # 中文邮件按 latin-1 解码会变成乱码而不被清理和翻译；转发的仍是原始字节
+            result = await self.async_predictor.predict_async(decode_message(data), self.timeout)
+        except Exception:
+            result = None
+            self.stats['unscored'] += 1
+
+        if self.should_reject(result):
+            self.stats['rejected'] += 1
+            return '550 5.7.1 Message rejected as spam'
+
+        try:
+            await send_message(*self.downstream, mail_from, rcpt_tos, spam_headers(result) + data)
+        except (OSError, asyncio.TimeoutError, SMTPError):
+            self.stats['failed'] += 1
+            return '451 4.3.0 Downstream delivery failed, try again later'
+        self.stats['forwarded'] += 1
+        return '250 2.0.0 OK queued'
+
+
+class SinkHandler:
+    """收件端：把收到的邮件保存在内存中（可选打印），用于本地测试"""
+
+    def __init__(self, verbose=False):
+        self.messages = []
+        self.verbose = verbose
+
+    async def handle_message(self, mail_from, rcpt_tos, data):
+        self.messages.append((mail_from, rcpt_tos, data))
+        if self.verbose:
+            status = [line for line in data.split(b'\r\n', 2)[:2] if line.startswith(b'X-Spam')]
+            print(f"收到邮件 {mail_from} -> {', '.join(rcpt_tos)}  {b' '.join(status).decode('ascii')}")
+        return '250 2.0.0 OK'
+
+
+def parse_endpoint(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+async def run_proxy(args):
+    import utils
+    from threshold_optimizer import model_paths
+
+    predictor = utils.SpamPredictor(*model_paths(args.model_dir))
+    executor = BatchExecutor(predictor, workers=args.workers)
+    async with AsyncSpamPredictor(predictor, max_concurrency=args.max_concurrency,
+                                  executor=executor) as async_predictor:
+        proxy = SpamFilterProxy(async_predictor, parse_endpoint(args.downstream), args.mode,
+                                args.reject_threshold, args.timeout)
+        server = await serve(proxy, *parse_endpoint(args.listen), max_size=args.max_size)
+        print(f"✅ SMTP 过滤代理已启动: {args.listen} -> {args.downstream}（{args.mode} 模式）")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            executor.shutdown()
+            print(f"📊 {proxy.stats}")
+
+
+async def run_sink(args):
+    server = await serve(SinkHandler(verbose=True), *parse_endpoint(args.listen))
+    print(f"✅ 本地收件端已启动: {args.listen}")
+    async with server:
+        await server.serve_forever()
+
+
+# 自检用的邮件：(说明, 原始字节, 转发时应保留的部分)；发件方伪造的 X-Spam-* 字段应被删除
+SELFTEST_MESSAGES = (
+    ('CRLF，最后一个字段为 X-Spam-Flag',
+     b'Subject: hi\r\nX-Spam-Flag: NO\r\n\r\nHello, see you at the meeting tomorrow.\r\n',
+     b'Subject: hi\r\n\r\nHello, see you at the meeting tomorrow.\r\n'),
+    ('LF，X-Spam-Status 带续行',
+     b'X-Spam-Status: No,\n\tscore=-5\nSubject: offer\n\nClick here to claim your free prize now!\n',
+     b'Subject: offer\n\nClick here to claim your free prize now!\n'),
+    ('GBK 中文邮件，正文中的 X-Spam 不删除',
+     'Subject: 会议\r\nX-Spam-Flag: NO\r\n\r\n明天下午三点在会议室开会，请准时参加。\r\nX-Spam-Flag: body\r\n'.encode('gbk'),
+     'Subject: 会议\r\n\r\n明天下午三点在会议室开会，请准时参加。\r\nX-Spam-Flag: body\r\n'.encode('gbk')),
+)
+
+
+async def run_selftest(args):
+    """在回环地址的临时端口上启动收件端和代理，逐封发送 SELFTEST_MESSAGES 并检查收件端收到的内容"""
+    import utils
+    from threshold_optimizer import model_paths
+
+    sink = SinkHandler()
+    sink_server = await serve(sink, '127.0.0.1', 0)
+    sink_port = sink_server.sockets[0].getsockname()[1]
+    predictor = utils.SpamPredictor(*model_paths(args.model_dir))
+    failures = 0
+    async with sink_server, AsyncSpamPredictor(predictor) as async_predictor:
+        proxy = SpamFilterProxy(async_predictor, ('127.0.0.1', sink_port), timeout=args.timeout)
+        proxy_server = await serve(proxy, '127.0.0.1', 0)
+        proxy_port = proxy_server.sockets[0].getsockname()[1]
+        async with proxy_server:
+            for label, message, expected in SELFTEST_MESSAGES:
+                await send_message('127.0.0.1', proxy_port, 'sender@example.com', ['rcpt@example.com'], message)
+                received = sink.messages[-1][2]
+                added = received[:len(received) - len(expected)]
+                ok = received.endswith(expected) and added.count(b'X-Spam-') in (1, 2)
+                failures += not ok
+                status = added.decode('ascii', 'replace').strip().replace('\r\n', ' | ')
+                print(f"{'✅' if ok else '❌'} {label}: {status}")
+    print(f"📊 {proxy.stats}")
+    if failures:
+        raise SystemExit(f"{failures} 封邮件的检查未通过")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 SMTP 垃圾邮件过滤代理")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    proxy = commands.add_parser('proxy', help="过滤并转发邮件")
+    proxy.add_argument('--listen', default='127.0.0.1:10025')
+    proxy.add_argument('--downstream', default='127.0.0.1:10026')
+    proxy.add_argument('--mode', choices=('tag', 'reject'), default='tag')
+    proxy.add_argument('--reject-threshold', type=float, default=None,
+                       help="reject 模式下拒收所需的垃圾邮件概率（默认按模型阈值判定）")
+    proxy.add_argument('--model-dir', default='.', help="包含 spam_model/vectorizer/optimal_threshold 的目录")
+    proxy.add_argument('--workers', type=int, default=2, help="批量打分的工作线程数")
+    proxy.add_argument('--max-concurrency', type=int, default=32)
+    proxy.add_argument('--timeout', type=float, default=10.0, help="单封邮件的打分时限（秒）")
+    proxy.add_argument('--max-size', type=int, default=DEFAULT_MAX_SIZE)
+
+    sink = commands.add_parser('sink', help="本地测试用的收件端")
+    sink.add_argument('--listen', default='127.0.0.1:10026')
+
+    selftest = commands.add_parser('selftest', help="在回环地址上检查代理的转发和 X-Spam-* 处理")
+    selftest.add_argument('--model-dir', default='.', help="包含 spam_model/vectorizer/optimal_threshold 的目录")
+    selftest.add_argument('--timeout', type=float, default=10.0, help="单封邮件的打分时限（秒）")
+
+    args = parser.parse_args()
+    runners = {'proxy': run_proxy, 'sink': run_sink, 'selftest': run_selftest}
+    try:
+        asyncio.run(runners[args.command](args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
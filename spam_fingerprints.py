@@ -0,0 +1,174 @@
+"""
+已知垃圾邮件指纹库：对邮件正文规范化后的哈希建 Bloom 过滤器
+SpamPredictor 在预处理之前查询，命中即直接判为垃圾邮件，查询耗时与正文长度成正比（语料中位数 24KB 的邮件约 0.2ms，预处理约 1.8ms）
+误判率（正常邮件被误认为已知垃圾邮件的概率）在构建时指定，与位数组一起保存；
+用户举报的垃圾邮件可以随时增量加入
+指纹取自按 latin-1 解码的原始邮件（corpus.read_email）；英文邮件在 smtp_proxy、score.py 等路径上也按 latin-1 解码，可以命中。
+中文邮件在所有打分路径上都先按 GBK/UTF-8 解码并翻译，predict 收到的是英文译文，所以默认不对中文语料建指纹
+
+    python spam_fingerprints.py build --fpr 1e-6
+    python spam_fingerprints.py add reported/*.eml
+"""
+import argparse
+import hashlib
+import math
+import os
+import threading
+
+import numpy as np
+
+import corpus
+
+DEFAULT_PATH = 'spam_fingerprints.npz'
+# 不包括 data/chinese/spam：中文邮件翻译后才交给 predict，原文指纹不会命中，见模块说明
+SPAM_FOLDERS = ('data/english/spam', 'data/english/reinforced_spam', 'data/english/failed_spam')
+# 正文规范化后短于该长度的邮件不参与指纹（避免空正文等匹配到所有同类邮件）
+MIN_BODY_CHARS = 20
+
+
+def normalized_body(email_text):
+    """去掉邮件头（第一个空行之前的部分），ASCII 字母转小写并合并空白，返回字节串"""
+    data = email_text.encode('utf-8', 'surrogatepass')
+    splits = [i for i in (data.find(b'\n\n'), data.find(b'\r\n\r\n')) if i >= 0]
+    body = data[min(splits):] if splits else data
+    return b' '.join(body.lower().split())
+
+
+def fingerprint(email_text):
+    """正文指纹（两个 64 位整数，用于双重哈希）；正文过短时返回 None"""
+    body = normalized_body(email_text)
+    if len(body) < MIN_BODY_CHARS:
+        return None
+    digest = hashlib.sha256(body).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class SpamFingerprints:
+    """
+    Bloom 过滤器：位数 m = -n·ln(p) / ln(2)²，哈希个数 k = m/n·ln(2)
+    第 i 个位置为 (h1 + i·h2) mod m（双重哈希，只需计算一次摘要）
+    加入的邮件超过 capacity 后实际误判率会高于设定值，estimated_fpr() 给出当前估计
+    """
+
+    def __init__(self, capacity=20000, fpr=1e-6, path=DEFAULT_PATH):
+        if capacity <= 0 or not 0 < fpr < 1:
+            raise ValueError("capacity 须为正数，fpr 须在 (0, 1) 之间")
+        self.capacity = int(capacity)
+        self.fpr = float(fpr)
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(self.fpr) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, digest):
+        h1, h2 = digest
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, email_text):
+        digest = fingerprint(email_text)
+        if digest is None:
+            return False
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    def add(self, email_text):
+        """加入一封垃圾邮件；正文过短或已存在时返回 False"""
+        digest = fingerprint(email_text)
+        if digest is None:
+            return False
+        with self._lock:
+            new = False
+            for position in self._positions(digest):
+                mask = 1 << (position & 7)
+                if not self.bits[position >> 3] & mask:
+                    self.bits[position >> 3] |= mask
+                    new = True
+            self.count += new
+        return new
+
+    def add_files(self, paths):
+        """按 corpus.read_email 读取并加入邮件文件，返回新加入的数量"""
+        return sum(self.add(corpus.read_email(p)) for p in paths)
+
+    def estimated_fpr(self):
+        """按当前已加入的数量估计的误判率"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def save(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._lock:
+            np.savez(path, bits=np.frombuffer(bytes(self.bits), dtype=np.uint8),
+                     capacity=self.capacity, fpr=self.fpr, num_bits=self.num_bits,
+                     num_hashes=self.num_hashes, count=self.count, min_body_chars=MIN_BODY_CHARS)
+        self.path = path
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as saved:
+            if int(saved['min_body_chars']) != MIN_BODY_CHARS:
+                raise ValueError(f"指纹库 {path} 的规范化参数与当前版本不一致，请重新构建")
+            store = cls(int(saved['capacity']), float(saved['fpr']), path)
+            store.num_bits = int(saved['num_bits'])
+            store.num_hashes = int(saved['num_hashes'])
+            store.bits = bytearray(saved['bits'].tobytes())
+            store.count = int(saved['count'])
+        return store
+
+    @classmethod
+    def build(cls, folders=SPAM_FOLDERS, capacity=None, fpr=1e-6, path=DEFAULT_PATH):
+        """
+        由已知垃圾邮件文件夹构建指纹库
+        capacity 默认为语料邮件数的两倍，为之后举报的邮件留出余量
+        """
+        paths = [p for folder in folders if os.path.isdir(folder) for p in corpus.list_folder(folder)]
+        store = cls(capacity or max(2 * len(paths), 1000), fpr, path)
+        added = store.add_files(paths)
+        print(f"已加入 {added} 个垃圾邮件指纹（共 {len(paths)} 封，其余为重复或正文过短）")
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="已知垃圾邮件指纹库")
+    parser.add_argument('--path', default=DEFAULT_PATH, help="指纹库文件路径")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="由垃圾邮件语料构建指纹库")
+    build.add_argument('--folders', nargs='*', default=list(SPAM_FOLDERS))
+    build.add_argument('--capacity', type=int, default=None, help="预计容纳的邮件数（默认为语料的两倍）")
+    build.add_argument('--fpr', type=float, default=1e-6, help="容量内的误判率")
+
+    add = commands.add_parser('add', help="加入用户举报的垃圾邮件文件")
+    add.add_argument('files', nargs='+')
+
+    check = commands.add_parser('check', help="检查邮件文件是否命中指纹库")
+    check.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        store = SpamFingerprints.build(args.folders, args.capacity, args.fpr, args.path)
+        store.save()
+    elif args.command == 'add':
+        store = SpamFingerprints.load(args.path)
+        print(f"新加入 {store.add_files(args.files)} 个指纹")
+        store.save()
+    else:
+        store = SpamFingerprints.load(args.path)
+        for file_path in args.files:
+            print(f"{'命中' if corpus.read_email(file_path) in store else '未命中'}  {file_path}")
+        return
+
+    print(f"✅ 指纹库已保存到: {store.path}（{len(store)}/{store.capacity} 个指纹，"
+          f"{len(store.bits) / 1024:.1f} KB，k={store.num_hashes}，"
+          f"设定误判率 {store.fpr:g}，当前估计 {store.estimated_fpr():.2g}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -58,6 +58,12 @@ if __name__ == "__main__":
     # 指定输入目录和输出目录
     input_directory = "./adversarial_analysis/categorized_samples/failed"  # 替换为你的txt文件目录
     output_directory = "./data/english/failed_spam"  # 输出目录
+    archive = "./adversarial_analysis/categorized_samples"  # 分类样本归档（sample_archive.py）
 
-    # 调用函数
-    save_last_lines_separately(input_directory, output_directory)
\ No newline at end of file
+    # 有归档时直接从归档导出，不再逐个读取样本文件
+    if os.path.exists(archive + '.idx.npz'):
+        from sample_archive import export_to_folder
+        export_to_folder(archive, output_directory, category='failed', last_line=True,
+                         prefix='last_line_sample_')
+    else:
+        save_last_lines_separately(input_directory, output_directory)
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+阈值优化工具：对带标签语料只打分一次并缓存概率，
+之后以向量化方式一次性扫描所有候选阈值，重新生成 optimal_threshold.joblib
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+import corpus
+import utils
+
+
+def model_paths(model_dir):
+    """返回模型目录下的 (模型, 向量器, 阈值) 文件路径"""
+    return (os.path.join(model_dir, 'spam_model.joblib'),
+            os.path.join(model_dir, 'vectorizer.joblib'),
+            os.path.join(model_dir, 'optimal_threshold.joblib'))
+
+
+def model_stamp(model_dir):
+    """模型与向量器文件的大小和修改时间，用于判断缓存是否过期"""
+    model_path, vectorizer_path, _ = model_paths(model_dir)
+    parts = []
+    for path in (model_path, vectorizer_path):
+        stat = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}")
+    return '|'.join(parts)
+
+
+def default_cache_path(model_dir):
+    """默认缓存位置：cache/scores_<模型目录>.npz"""
+    tag = os.path.normpath(model_dir).replace(os.sep, '_').strip('._') or 'default'
+    return os.path.join('cache', f'scores_{tag}.npz')
+
+
+def score_corpus(model_dir='.', data_dir='data/english', cache_path=None, refresh=False):
+    """
+    对语料批量打分并缓存为 NumPy 数组，模型文件或语料（各文件夹的邮件数、修改时间）变化时重新打分
+    返回 (概率, 标签, 所属文件夹)
+    """
+    if cache_path is None:
+        cache_path = default_cache_path(model_dir)
+    stamp = f'{model_stamp(model_dir)}|{corpus.corpus_stamp(data_dir)}'
+
+    if not refresh and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if str(cached['stamp']) == stamp and str(cached['data_dir']) == data_dir:
+            print(f"使用缓存的概率: {cache_path}")
+            return cached['scores'], cached['labels'], cached['groups']
+        print("模型或语料已变化，重新打分")
+
+    model_path, vectorizer_path, threshold_path = model_paths(model_dir)
+    predictor = utils.SpamPredictor(model_path, vectorizer_path, threshold_path)
+
+    texts, labels, groups, _ = corpus.load_labeled_corpus(data_dir)
+    print(f"正在为 {len(texts)} 封邮件打分...")
+    start = time.perf_counter()
+    scores, _ = predictor.spam_probabilities(texts)
+    print(f"打分耗时: {time.perf_counter() - start:.2f}s")
+
+    labels = np.array(labels, dtype=np.int8)
+    groups = np.array(groups)
+
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    np.savez(cache_path, scores=scores, labels=labels, groups=groups,
+             stamp=stamp, data_dir=data_dir)
+    print(f"概率已缓存到: {cache_path}")
+
+    return scores, labels, groups
+
+
+def candidate_thresholds(scores, step=0.01):
+    """候选阈值：固定网格 + 语料中出现过的每个概率值"""
+    grid = np.round(np.arange(step, 1.0, step), 6)
+    observed = scores[(scores > 0) & (scores < 1)]
+    return np.unique(np.concatenate([grid, observed]))
+
+
+def sweep_thresholds(scores, labels, groups, thresholds):
+    """
+    一次性计算所有阈值下的指标（概率 >= 阈值判为垃圾邮件）
+    对各类别概率排序后用 searchsorted 计数，不逐阈值循环
+    """
+    scores = np.asarray(scores, dtype=float)
+    labels = np.asarray(labels).astype(bool)
+    groups = np.asarray(groups)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    spam_sorted = np.sort(scores[labels])
+    ham_sorted = np.sort(scores[~labels])
+    hard_ham_sorted = np.sort(scores[groups == 'hard_ham'])
+
+    def count_at_least(sorted_scores):
+        return len(sorted_scores) - np.searchsorted(sorted_scores, thresholds, side='left')
+
+    tp = count_at_least(spam_sorted)
+    fp = count_at_least(ham_sorted)
+    hard_fp = count_at_least(hard_ham_sorted)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+        recall = tp / len(spam_sorted) if len(spam_sorted) else np.zeros(len(thresholds))
+        f1 = np.where(precision + recall > 0,
+                      2 * precision * recall / (precision + recall), 0.0)
+        fpr = fp / len(ham_sorted) if len(ham_sorted) else np.zeros(len(thresholds))
+        hard_ham_fpr = (hard_fp / len(hard_ham_sorted) if len(hard_ham_sorted)
+                        else np.zeros(len(thresholds)))
+
+    return {
+        'threshold': thresholds,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'fpr': fpr,
+        'hard_ham_fpr': hard_ham_fpr,
+    }
+
+
+def select_threshold(sweep, max_hard_ham_fpr=None):
+    """选择 F1 最高的阈值，可限制 hard_ham 误判率上限；返回下标"""
+    f1 = sweep['f1']
+    if max_hard_ham_fpr is not None:
+        allowed = sweep['hard_ham_fpr'] <= max_hard_ham_fpr
+        if not allowed.any():
+            raise ValueError(f"没有阈值能满足 hard_ham 误判率 <= {max_hard_ham_fpr}")
+        f1 = np.where(allowed, f1, -1.0)
+    return int(np.argmax(f1))
+
+
+def print_report(sweep, best, current=None, report_step=0.05):
+    """打印网格阈值上的指标，以及当前阈值与最优阈值"""
+    thresholds = sweep['threshold']
+    rows = set(np.flatnonzero(np.isclose(np.mod(thresholds + 1e-9, report_step), 0, atol=1e-6)))
+    rows.add(best)
+    if current is not None:
+        rows.add(int(np.argmin(np.abs(thresholds - current))))
+
+    print(f"\n{'阈值':>8} {'精确率':>8} {'召回率':>8} {'F1':>8} {'误判率':>8} {'hard_ham误判率':>14}")
+    for i in sorted(rows):
+        mark = ' <- 最优' if i == best else ''
+        if current is not None and np.isclose(thresholds[i], current) and i != best:
+            mark = ' <- 当前'
+        print(f"{thresholds[i]:>10.4f} {sweep['precision'][i]:>10.3f} {sweep['recall'][i]:>10.3f} "
+              f"{sweep['f1'][i]:>10.3f} {sweep['fpr'][i]:>10.3f} {sweep['hard_ham_fpr'][i]:>14.3f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重新计算最优分类阈值")
+    parser.add_argument('--model-dir', default='.', help="包含 spam_model/vectorizer/optimal_threshold 的目录")
+    parser.add_argument('--data-dir', default='data/english', help="带标签语料目录")
+    parser.add_argument('--cache', default=None, help="概率缓存文件（.npz）")
+    parser.add_argument('--refresh', action='store_true', help="忽略缓存，重新打分")
+    parser.add_argument('--step', type=float, default=0.01, help="候选阈值网格步长")
+    parser.add_argument('--max-hard-ham-fpr', type=float, default=None, help="hard_ham 误判率上限")
+    parser.add_argument('--output', default=None, help="阈值输出路径（默认覆盖模型目录中的阈值文件）")
+    parser.add_argument('--dry-run', action='store_true', help="只输出报告，不写入阈值文件")
+    args = parser.parse_args()
+
+    scores, labels, groups = score_corpus(args.model_dir, args.data_dir, args.cache, args.refresh)
+
+    start = time.perf_counter()
+    thresholds = candidate_thresholds(scores, args.step)
+    sweep = sweep_thresholds(scores, labels, groups, thresholds)
+    best = select_threshold(sweep, args.max_hard_ham_fpr)
+    elapsed = time.perf_counter() - start
+
+    threshold_path = model_paths(args.model_dir)[2]
+    current = float(joblib.load(threshold_path)) if os.path.exists(threshold_path) else None
+
+    print_report(sweep, best, current)
+    print(f"\n扫描 {len(thresholds)} 个候选阈值耗时: {elapsed * 1000:.1f}ms")
+
+    best_threshold = float(thresholds[best])
+    print(f"最优阈值: {best_threshold:.4f} (F1: {sweep['f1'][best]:.3f}, "
+          f"hard_ham 误判率: {sweep['hard_ham_fpr'][best]:.3f})")
+
+    if args.dry_run:
+        return
+
+    output = args.output or threshold_path
+    joblib.dump(best_threshold, output)
+    print(f"✅ 阈值已保存到: {output}")
+
+
+if __name__ == "__main__":
+    main()
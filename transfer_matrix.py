@@ -0,0 +1,222 @@
+"""
+跨代对抗样本迁移矩阵
+一次性加载 models/model* 的所有模型，用每一代模型分别生成 method1..method4 对抗样本，
+再把全部原始样本和对抗样本按批次交给每一代模型打分，输出 N×N 迁移成功率表（按方法细分）
+对抗样本和各代模型的特征矩阵都缓存在 cache/ 下，重复运行只需重新预测
+
+    python transfer_matrix.py --num-emails 100 --seed 0
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+import adversarial_attack as aa
+import benchmark
+import corpus
+from threshold_optimizer import model_stamp
+
+METHODS = ('method1', 'method2', 'method3', 'method4')
+
+
+def load_generations(model_dirs):
+    """按顺序加载各代模型，返回 {代名: (utils 模块, SpamPredictor)}"""
+    generations = {}
+    for model_dir in model_dirs:
+        generation = os.path.basename(os.path.normpath(model_dir))
+        generations[generation] = benchmark.load_generation(model_dir)
+    return generations
+
+
+def make_featurizer(module, predictor):
+    """按该代模型自己的预处理和特征构造，将原始文本列表转换为稀疏特征矩阵"""
+    def featurize(texts):
+        processed = [predictor.preprocess_email(text) for text in texts]
+        return benchmark.build_features(module, predictor, processed, texts)
+    return featurize
+
+
+def apply_method(attacker, method, text):
+    if method == 'method1':
+        return attacker.method1_feature_manipulation(text)
+    if method == 'method2':
+        return attacker.method2_semantic_rewriting(text)
+    if method == 'method3':
+        return attacker.method3_context_injection(text)
+    return attacker.method4_hybrid_attack(text, verbose=False)
+
+
+def generate_samples(generations, originals, seed=0, methods=METHODS):
+    """
+    以每一代模型为源模型生成对抗样本
+    每封邮件在每个 (源模型, 方法) 下都使用由 (seed, 序号) 派生的随机种子，结果可复现
+    返回 [{'source', 'method', 'original', 'text'}, ...]，original 为原始邮件序号
+    """
+    samples = []
+    for source, (module, predictor) in generations.items():
+        start = time.perf_counter()
+        attacker = aa.AdvancedAdversarialAttacker(predictor.model, predictor.vectorizer,
+                                                  featurize=make_featurizer(module, predictor))
+        for method in methods:
+            for index, text in enumerate(originals):
+                aa.seed_everything(aa.sample_seed(seed, index))
+                samples.append({'source': source, 'method': method, 'original': index,
+                                'text': apply_method(attacker, method, text)})
+        print(f"  {source}: 生成 {len(originals) * len(methods)} 个对抗样本，"
+              f"耗时 {time.perf_counter() - start:.1f}s")
+    return samples
+
+
+def texts_digest(texts):
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def load_or_generate_samples(generations, model_dirs, originals, seed, cache_dir='cache', refresh=False):
+    """对抗样本缓存：源模型文件、原始邮件和种子都不变时直接复用"""
+    key = texts_digest([model_stamp(d) for d in model_dirs] + [str(seed)] + originals)
+    cache_path = os.path.join(cache_dir, f'transfer_samples_{key}.json')
+    if not refresh and os.path.exists(cache_path):
+        print(f"使用缓存的对抗样本: {cache_path}")
+        with open(cache_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    print("正在生成对抗样本...")
+    samples = generate_samples(generations, originals, seed)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(samples, f, ensure_ascii=False)
+    return samples
+
+
+def cached_features(generation, model_dir, module, predictor, texts, cache_dir='cache', refresh=False):
+    """某一代模型对一组文本的特征矩阵，按模型文件和文本内容缓存为 .npz"""
+    key = texts_digest([model_stamp(model_dir)] + texts)
+    cache_path = os.path.join(cache_dir, f'transfer_features_{generation}_{key}.npz')
+    if not refresh and os.path.exists(cache_path):
+        return sparse.load_npz(cache_path)
+
+    features = make_featurizer(module, predictor)(texts).tocsr()
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    sparse.save_npz(cache_path, features)
+    return features
+
+
+def spam_probabilities(model, features, chunk_size=512):
+    """分块批量预测；模型不接受稀疏输入时逐块转为稠密矩阵"""
+    probs = np.empty(features.shape[0])
+    for start in range(0, features.shape[0], chunk_size):
+        chunk = features[start:start + chunk_size]
+        try:
+            probs[start:start + chunk_size] = model.predict_proba(chunk)[:, 1]
+        except (TypeError, ValueError):
+            probs[start:start + chunk_size] = model.predict_proba(chunk.toarray())[:, 1]
+    return probs
+
+
+def transfer_rates(spam_flags, num_originals, sources, methods, originals, method_names=METHODS):
+    """
+    spam_flags: {目标模型: 每个文本是否被判为垃圾邮件}，前 len(原始邮件) 个为原始邮件
+    迁移成功 = 目标模型把原始邮件判为垃圾邮件，而把对应对抗样本判为正常邮件
+    返回 {方法或 'all': N×N 成功率矩阵（行为源模型，列为目标模型）}，以及每格的样本数
+    """
+    names = list(spam_flags)
+    tables = {}
+    counts = {}
+    for method in list(method_names) + ['all']:
+        rates = np.full((len(names), len(names)), np.nan)
+        totals = np.zeros((len(names), len(names)), dtype=int)
+        for j, target in enumerate(names):
+            flags = spam_flags[target]
+            original_spam = flags[:num_originals][originals]
+            fooled = ~flags[num_originals:]
+            for i, source in enumerate(names):
+                mask = (sources == source) & original_spam
+                if method != 'all':
+                    mask &= methods == method
+                totals[i, j] = mask.sum()
+                if totals[i, j]:
+                    rates[i, j] = fooled[mask].mean()
+        tables[method] = rates
+        counts[method] = totals
+    return tables, counts
+
+
+def print_table(title, names, rates):
+    print(f"\n{title}（行: 源模型，列: 目标模型）")
+    print(f"{'':>10}" + ''.join(f"{name:>10}" for name in names))
+    for i, source in enumerate(names):
+        cells = ''.join(f"{'-':>10}" if np.isnan(rate) else f"{rate:>10.1%}" for rate in rates[i])
+        print(f"{source:>10}{cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨代对抗样本迁移矩阵")
+    parser.add_argument('--models', nargs='*', help="模型目录（默认 models/model*）")
+    parser.add_argument('--spam-dir', default='data/english/spam', help="原始垃圾邮件目录")
+    parser.add_argument('--num-emails', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--refresh', action='store_true', help="忽略缓存，重新生成样本和特征")
+    parser.add_argument('--output', default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    model_dirs = args.models or sorted(glob.glob('models/model*'))
+    generations = load_generations(model_dirs)
+    names = list(generations)
+
+    originals = [text for text in (corpus.read_email(p) for p in corpus.list_folder(args.spam_dir))
+                 if text.strip()][:args.num_emails]
+    samples = load_or_generate_samples(generations, model_dirs, originals, args.seed,
+                                       args.cache_dir, args.refresh)
+
+    start = time.perf_counter()
+    texts = originals + [sample['text'] for sample in samples]
+    spam_flags = {}
+    for model_dir, (generation, (module, predictor)) in zip(model_dirs, generations.items()):
+        features = cached_features(generation, model_dir, module, predictor, texts,
+                                   args.cache_dir, args.refresh)
+        threshold = float(getattr(predictor, 'threshold', 0.5))
+        spam_flags[generation] = spam_probabilities(predictor.model, features) >= threshold
+
+    sources = np.array([sample['source'] for sample in samples])
+    methods = np.array([sample['method'] for sample in samples])
+    sample_originals = np.array([sample['original'] for sample in samples], dtype=int)
+    tables, counts = transfer_rates(spam_flags, len(originals), sources, methods, sample_originals)
+    elapsed = time.perf_counter() - start
+
+    print_table("全部方法迁移成功率", names, tables['all'])
+    for method in METHODS:
+        print_table(f"{method} 迁移成功率", names, tables[method])
+    print(f"\n{len(texts)} 个文本 × {len(names)} 个模型，打分耗时: {elapsed:.2f}s")
+
+    output = args.output or os.path.join(
+        'adversarial_analysis', f"transfer_matrix_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output_dir = os.path.dirname(output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'models': names,
+            'num_emails': len(originals),
+            'seed': args.seed,
+            'rates': {method: np.where(np.isnan(rates), None, rates).tolist()
+                      for method, rates in tables.items()},
+            'counts': {method: totals.tolist() for method, totals in counts.items()},
+        }, f, ensure_ascii=False, indent=2)
+    print(f"✅ 迁移矩阵已保存到: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+中文邮件翻译：按句子切分为不超过 max_length 的片段，逐段翻译为英文（翻译失败的片段保留原文）
+切分与翻译分开，异步接口（async_predictor）可以并发翻译各个片段
+"""
+import re
+
+_CHINESE = re.compile(r'[\u4e00-\u9fff]')
+
+
+def has_chinese(text):
+    return bool(_CHINESE.search(text))
+
+
+def make_translator():
+    from translate import Translator
+    return Translator(from_lang="zh", to_lang="en")
+
+
+def split_chunks(text, max_length=400):
+    """按句号、感叹号、问号切分并合并为片段；单句过长且前面没有待合并的片段时按 max_length 截断"""
+    chunks = []
+    sentences = re.split(r'[。！？!?]', text)
+    current_chunk = ""
+
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        if len(current_chunk) + len(sentence) <= max_length:
+            if current_chunk:
+                current_chunk += "。" + sentence
+            else:
+                current_chunk = sentence
+        else:
+            if current_chunk:
+                chunks.append(current_chunk)
+                current_chunk = sentence
+            else:
+                for i in range(0, len(sentence), max_length):
+                    chunks.append(sentence[i:i + max_length])
+
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def translate_chunk(translator, chunk):
+    try:
+        return translator.translate(chunk)
+    except Exception:
+        return chunk
+
+
+def split_and_translate(text, max_length=400):
+    tr = make_translator()
+    return " ".join(translate_chunk(tr, chunk) for chunk in split_chunks(text, max_length))
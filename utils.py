@@ -1,19 +1,28 @@
 import joblib
 import re
 import os
+import threading
+import time
+from contextlib import nullcontext
 import numpy as np
 from scipy.sparse import hstack
+from metrics import PredictorMetrics
+from domain_reputation import host_collector
 
-def enhanced_cleaner(text):
-    """增强的文本清理，移除技术性噪音"""
+def enhanced_cleaner(text, hosts=None):
+    """
+    增强的文本清理，移除技术性噪音
+    hosts: 传入列表时，删除 URL / www 域名 / 各种域名的同时把其中的主机名追加进去
+    """
     if not text:
         return ""
     
     # 移除各种技术噪音
+    remove_host = '' if hosts is None else host_collector(hosts)
     text = re.sub(r'<.*?>', '', text)  # HTML标签
-    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)  # URL
-    text = re.sub(r'www\.[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', '', text)  # www域名
-    text = re.sub(r'[a-zA-Z0-9.-]+\.(com|org|net|edu|gov|io|co|uk)[a-zA-Z0-9./?&=-]*', '', text)  # 各种域名
+    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', remove_host, text)  # URL
+    text = re.sub(r'www\.[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', remove_host, text)  # www域名
+    text = re.sub(r'[a-zA-Z0-9.-]+\.(com|org|net|edu|gov|io|co|uk)[a-zA-Z0-9./?&=-]*', remove_host, text)  # 各种域名
     text = re.sub(r'/[a-zA-Z0-9_\-./]+', '', text)  # Unix路径
     text = re.sub(r'[a-zA-Z]:\\[a-zA-Z0-9_\-.\s\\]+', '', text)  # Windows路径
     text = re.sub(r'[a-zA-Z0-9_\-]+\.[a-zA-Z]{2,4}(?:\s|$)', '', text)  # 文件名
@@ -43,13 +52,13 @@ def extract_email_body(raw_email):
     
     return '\n'.join(body_lines)
 
-def complete_preprocess(raw_email):
-    """完整的预处理流程"""
+def complete_preprocess(raw_email, hosts=None):
+    """完整的预处理流程（hosts 见 enhanced_cleaner）"""
     # 1. 提取正文
     body = extract_email_body(raw_email)
     
     # 2. 应用增强清理
-    body = enhanced_cleaner(body)
+    body = enhanced_cleaner(body, hosts)
     
     # 3. 转换为小写
     body = body.lower()
@@ -59,6 +68,43 @@ def complete_preprocess(raw_email):
     
     return body
 
+# 对抗性特征使用的指示词（按子串匹配，统计出现了几个）
+SPAM_WORDS = ['free', 'win', 'prize', 'click', 'buy', 'discount', 'limited', 
+              'offer', 'cash', 'money', 'guarantee', 'winner', 'selected']
+NORMAL_WORDS = ['meeting', 'project', 'team', 'document', 'review', 'feedback',
+                'schedule', 'update', 'discussion', 'proposal', 'report']
+URGENT_WORDS = ['urgent', 'immediately', 'asap', 'right away', 'now']
+MONEY_INDICATORS = ['$', 'money', 'cash', 'price', 'cost', 'fee']
+ACTION_WORDS = ['click', 'call', 'visit', 'register', 'sign up', 'buy']
+INDICATOR_GROUPS = (SPAM_WORDS, NORMAL_WORDS, URGENT_WORDS, MONEY_INDICATORS, ACTION_WORDS)
+
+def adversarial_feature_row(spam_count, normal_count, urgent_count, money_count, action_count,
+                            total_words, sentence_count, length):
+    """
+    由计数统计量组合出 9 个对抗性特征（比率、风格不一致性、结构异常）
+    """
+    # 6. 计算比率特征
+    spam_ratio = spam_count / total_words if total_words > 0 else 0
+    normal_ratio = normal_count / total_words if total_words > 0 else 0
+    
+    # 7. 风格不一致性
+    style_inconsistency = abs(spam_ratio - normal_ratio)
+    
+    # 8. 文本结构特征
+    avg_sentence_length = length / (sentence_count + 1) if sentence_count > 0 else length
+    structure_anomaly = 1 if (avg_sentence_length > 200 or avg_sentence_length < 20) else 0
+    
+    return [
+        spam_count, normal_count, urgent_count, money_count, action_count,
+        spam_ratio, normal_ratio, style_inconsistency, structure_anomaly
+    ]
+
+# 与 adversarial_feature_row 的返回顺序一致
+ADVERSARIAL_FEATURE_NAMES = [
+    'spam_count', 'normal_count', 'urgent_count', 'money_count', 'action_count',
+    'spam_ratio', 'normal_ratio', 'style_inconsistency', 'structure_anomaly'
+]
+
 def extract_enhanced_adversarial_features(emails):
     """
     增强的对抗性特征提取
@@ -69,53 +115,57 @@ def extract_enhanced_adversarial_features(emails):
         email_lower = email.lower()
         
         # 1. 基础垃圾邮件特征
-        spam_words = ['free', 'win', 'prize', 'click', 'buy', 'discount', 'limited', 
-                     'offer', 'cash', 'money', 'guarantee', 'winner', 'selected']
-        spam_count = sum(1 for word in spam_words if word in email_lower)
+        spam_count = sum(1 for word in SPAM_WORDS if word in email_lower)
         
         # 2. 正常邮件特征
-        normal_words = ['meeting', 'project', 'team', 'document', 'review', 'feedback',
-                       'schedule', 'update', 'discussion', 'proposal', 'report']
-        normal_count = sum(1 for word in normal_words if word in email_lower)
+        normal_count = sum(1 for word in NORMAL_WORDS if word in email_lower)
         
         # 3. 紧急程度特征
-        urgent_words = ['urgent', 'immediately', 'asap', 'right away', 'now']
-        urgent_count = sum(1 for word in urgent_words if word in email_lower)
+        urgent_count = sum(1 for word in URGENT_WORDS if word in email_lower)
         
         # 4. 金钱相关特征
-        money_indicators = ['$', 'money', 'cash', 'price', 'cost', 'fee']
-        money_count = sum(1 for word in money_indicators if word in email_lower)
+        money_count = sum(1 for word in MONEY_INDICATORS if word in email_lower)
         
         # 5. 行动号召特征
-        action_words = ['click', 'call', 'visit', 'register', 'sign up', 'buy']
-        action_count = sum(1 for word in action_words if word in email_lower)
+        action_count = sum(1 for word in ACTION_WORDS if word in email_lower)
         
-        # 6. 计算比率特征
         total_words = len(email_lower.split())
-        spam_ratio = spam_count / total_words if total_words > 0 else 0
-        normal_ratio = normal_count / total_words if total_words > 0 else 0
-        
-        # 7. 风格不一致性
-        style_inconsistency = abs(spam_ratio - normal_ratio)
-        
-        # 8. 文本结构特征
         sentence_count = email.count('.') + email.count('!') + email.count('?')
-        avg_sentence_length = len(email) / (sentence_count + 1) if sentence_count > 0 else len(email)
-        structure_anomaly = 1 if (avg_sentence_length > 200 or avg_sentence_length < 20) else 0
         
-        features.append([
+        features.append(adversarial_feature_row(
             spam_count, normal_count, urgent_count, money_count, action_count,
-            spam_ratio, normal_ratio, style_inconsistency, structure_anomaly
-        ])
+            total_words, sentence_count, len(email)
+        ))
     
     return np.array(features)
 
+# 命中已知垃圾邮件指纹时的判定结果
+KNOWN_SPAM_RESULT = {
+    'prediction': '垃圾邮件',
+    'confidence': 1.0,
+    'spam_probability': 1.0,
+    'reason': '与已知垃圾邮件指纹相同'
+}
+
+
 class SpamPredictor:
     def __init__(self, model_path='spam_model.joblib',
                  vectorizer_path='vectorizer.joblib',
-                 threshold_path='optimal_threshold.joblib'):
+                 threshold_path='optimal_threshold.joblib', metrics=None, verdict_cache=None,
+                 fingerprints=None, domain_reputation=None, header_model=None):
         """
         初始化改进的垃圾邮件预测器
+        加载后模型和向量器只读，同一实例可在多个线程间共享；指标、缓存和指纹库各自加锁，
+        需要大批量并发打分时使用 batch_executor.BatchExecutor 合并成批
+        metrics: 指标收集器（PredictorMetrics），默认新建一个；传入 False 关闭统计
+        verdict_cache: 近重复判定缓存（near_duplicate.NearDuplicateCache），
+                       与最近高置信度判定过的邮件近似重复时直接复用其结果
+        fingerprints: 已知垃圾邮件指纹库（spam_fingerprints.SpamFingerprints），
+                      在预处理之前查询，正文与已知垃圾邮件相同时直接判为垃圾邮件
+        domain_reputation: 域名信誉索引（domain_reputation.DomainReputation），
+                           预处理时顺带收集邮件中的主机名，包含垃圾邮件域名时直接判为垃圾邮件
+        header_model: 邮件头预分类模型（header_model.HeaderClassifier），
+                      只解析邮件头，概率高于其拒收阈值时不再处理正文
         """
         # 检查文件是否存在
         if not os.path.exists(model_path):
@@ -129,23 +179,72 @@ class SpamPredictor:
         self.model = joblib.load(model_path)
         self.vectorizer = joblib.load(vectorizer_path)
         self.threshold = joblib.load(threshold_path)
+        self._explainer = None  # 预测解释器，首次请求解释时创建
+        self._explainer_lock = threading.Lock()
+        self.verdict_cache = verdict_cache
+        self.fingerprints = fingerprints
+        self.domain_reputation = domain_reputation
+        self.header_model = header_model
+        
+        # 运行指标（各阶段耗时、结果计数等）
+        if metrics is None:
+            metrics = PredictorMetrics()
+        self.metrics = metrics or None
+        
+        # 通过环境变量按需开启采样分析（未设置时不做任何包装）
+        if os.environ.get('SPAM_PROFILE_CALLS') or os.environ.get('SPAM_PROFILE_SECONDS'):
+            import profiling
+            profiling.install_from_env(self)
         
         print("改进模型加载成功！")
         print(f"使用阈值: {self.threshold}")
     
-    def preprocess_email(self, email_text):
+    def stage_timer(self, stage):
+        """
+        为预测流程之外的阶段计时（例如中文翻译），未开启统计时不做任何事
+        """
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.stage(stage)
+    
+    def preprocess_email(self, email_text, hosts=None):
         """
         预处理邮件文本（与训练时相同的逻辑）
+        hosts: 传入列表时收集清理掉的 URL / 域名中的主机名
         """
-        return complete_preprocess(email_text)
+        return complete_preprocess(email_text, hosts)
     
-    def predict(self, email_text):
+    def predict(self, email_text, explain=False, top_k=10):
         """
         预测单封邮件是否为垃圾邮件（使用改进的特征和阈值）
+        explain: 为 True 时结果中附带 'explanation'，列出对该邮件贡献最大的 top_k 个词项和对抗性特征
         """
+        start = time.perf_counter()
+        result = self._predict(email_text, explain, top_k)
+        if self.metrics is not None:
+            self.metrics.observe_request(time.perf_counter() - start, result['prediction'])
+        return result
+    
+    def _predict(self, email_text, explain=False, top_k=10):
         try:
-            # 预处理
-            processed_text = self.preprocess_email(email_text)
+            # 已知垃圾邮件指纹
+            if self._known_spam(email_text):
+                return dict(KNOWN_SPAM_RESULT)
+            
+            # 邮件头预分类（在正文处理之前拒收明显的垃圾邮件）
+            header_result = self._header_verdict(email_text)
+            if header_result is not None:
+                return header_result
+            
+            # 预处理（配置了域名信誉索引时顺带收集主机名）
+            hosts = [] if self.domain_reputation is not None else None
+            processed_text = self._timed_preprocess([email_text], hosts)[0]
+            
+            # 包含垃圾邮件域名（正文只有链接时也能判定）
+            if hosts is not None:
+                domain_result = self._domain_verdict(hosts[0])
+                if domain_result is not None:
+                    return domain_result
             
             if not processed_text or len(processed_text.strip()) < 5:
                 return {
@@ -155,18 +254,17 @@ class SpamPredictor:
                     'reason': '邮件内容过短或无效'
                 }
             
-            # TF-IDF 特征
-            email_tfidf = self.vectorizer.transform([processed_text])
-            
-            # 对抗性特征
-            email_adversarial = extract_enhanced_adversarial_features([email_text])
+            # 近重复邮件直接复用缓存的判定（需要解释时仍走完整流程）
+            signature = None
+            if self.verdict_cache is not None and not explain:
+                signature = self.verdict_cache.signature(processed_text)
+                cached = self._cached_verdict(signature)
+                if cached is not None:
+                    return cached
             
-            # 合并特征
-            email_combined = hstack([email_tfidf, email_adversarial])
-            email_dense = email_combined.toarray()
-            
-            # 预测概率
-            probability = self.model.predict_proba(email_dense)[0]
+            # 特征提取与预测概率
+            email_dense = self.build_features([processed_text], [email_text])
+            probability = self._timed_predict_proba(email_dense)[0]
             spam_prob = probability[1]
             
             # 使用调整后的阈值进行预测
@@ -174,12 +272,17 @@ class SpamPredictor:
             
             confidence = float(spam_prob if prediction == 1 else probability[0])
             
-            return {
+            result = {
                 'prediction': '垃圾邮件' if prediction == 1 else '正常邮件',
                 'confidence': confidence,
                 'spam_probability': float(spam_prob),
                 'used_threshold': self.threshold
             }
+            if explain:
+                result['explanation'] = self.explain_features(email_dense, top_k)[0]
+            elif self.verdict_cache is not None:
+                self.verdict_cache.add(signature, result)
+            return result
             
         except Exception as e:
             return {
@@ -188,6 +291,240 @@ class SpamPredictor:
                 'error': str(e)
             }
 
+    def _known_spam(self, email_text):
+        """查询已知垃圾邮件指纹库，未配置时返回 False"""
+        if self.fingerprints is None:
+            return False
+        hit = email_text in self.fingerprints
+        if self.metrics is not None:
+            self.metrics.observe_cache('fingerprint', hit)
+        return hit
+    
+    def _header_verdict(self, email_text):
+        """邮件头预分类，拒收时返回判定结果"""
+        if self.header_model is None:
+            return None
+        start = time.perf_counter()
+        probability = self.header_model.reject_probability(email_text)
+        if self.metrics is not None:
+            self.metrics.observe_stage('headers', time.perf_counter() - start)
+            self.metrics.observe_cache('header_reject', probability is not None)
+        if probability is None:
+            return None
+        return {
+            'prediction': '垃圾邮件',
+            'confidence': probability,
+            'spam_probability': probability,
+            'reason': '邮件头特征判定为垃圾邮件'
+        }
+    
+    def _domain_verdict(self, hosts):
+        """查询域名信誉索引，包含垃圾邮件域名时返回判定结果"""
+        spam_domains = self.domain_reputation.spam_domains(hosts) if hosts else []
+        if self.metrics is not None:
+            self.metrics.observe_cache('domain_reputation', bool(spam_domains))
+        if not spam_domains:
+            return None
+        score = max(score for _, score in spam_domains)
+        return {
+            'prediction': '垃圾邮件',
+            'confidence': score,
+            'spam_probability': score,
+            'reason': '包含垃圾邮件域名',
+            'spam_domains': spam_domains
+        }
+    
+    def _cached_verdict(self, signature):
+        """查询近重复判定缓存，命中时返回带相似度的结果副本"""
+        result, similarity = self.verdict_cache.lookup(signature)
+        if self.metrics is not None:
+            self.metrics.observe_cache('near_duplicate', result is not None)
+        if result is None:
+            return None
+        return dict(result, near_duplicate_similarity=similarity)
+    
+    def build_features(self, processed_texts, raw_texts):
+        """
+        构造模型输入：TF-IDF 特征 + 对抗性特征（稠密矩阵）
+        """
+        start = time.perf_counter()
+        
+        # TF-IDF 特征
+        email_tfidf = self.vectorizer.transform(processed_texts)
+        vectorized = time.perf_counter()
+        
+        # 对抗性特征
+        email_adversarial = extract_enhanced_adversarial_features(raw_texts)
+        extracted = time.perf_counter()
+        
+        # 合并特征
+        email_combined = hstack([email_tfidf, email_adversarial])
+        email_dense = email_combined.toarray()
+        
+        if self.metrics is not None:
+            self.metrics.observe_stage('vectorize', vectorized - start + time.perf_counter() - extracted)
+            self.metrics.observe_stage('features', extracted - vectorized)
+        return email_dense
+    
+    def _timed_preprocess(self, email_texts, hosts=None):
+        """hosts: 传入列表时，为每封邮件追加一个主机名列表"""
+        start = time.perf_counter()
+        if hosts is None:
+            processed_texts = [self.preprocess_email(text) for text in email_texts]
+        else:
+            processed_texts = []
+            for text in email_texts:
+                hosts.append([])
+                processed_texts.append(self.preprocess_email(text, hosts[-1]))
+        if self.metrics is not None:
+            self.metrics.observe_stage('preprocess', time.perf_counter() - start)
+        return processed_texts
+    
+    def explain_features(self, email_dense, top_k=10):
+        """
+        对已构造好的特征矩阵逐行给出解释（贡献单位为垃圾邮件 log-odds）
+        线性模型只遍历非零项；梯度提升模型使用决策路径近似，见 explain.py
+        """
+        start = time.perf_counter()
+        with self._explainer_lock:
+            if self._explainer is None:
+                import explain
+                self._feature_names = (self.vectorizer.get_feature_names_out().tolist()
+                                       + ADVERSARIAL_FEATURE_NAMES)
+                self._explainer = explain.make_explainer(self.model)
+        from explain import summarize
+        
+        contributions = self._explainer.contributions(email_dense)
+        if hasattr(contributions, 'toarray'):
+            contributions = contributions.toarray()
+        n_tokens = len(self.vectorizer.vocabulary_)
+        explanations = [summarize(contributions[i], email_dense[i], self._feature_names, n_tokens,
+                                  self._explainer.bias, top_k)
+                        for i in range(email_dense.shape[0])]
+        if self.metrics is not None:
+            self.metrics.observe_stage('explain', time.perf_counter() - start)
+        return explanations
+    
+    def _timed_predict_proba(self, email_dense):
+        start = time.perf_counter()
+        probability = self.model.predict_proba(email_dense)
+        if self.metrics is not None:
+            self.metrics.observe_stage('predict', time.perf_counter() - start)
+        return probability
+    
+    def spam_probabilities(self, email_texts, processed_texts=None):
+        """
+        批量计算垃圾邮件概率，一次向量化、一次 predict_proba
+        内容过短或无效的邮件概率记为 0.0（与 predict 一致）
+        processed_texts: 调用方已缓存的预处理结果，传入时不再预处理
+        返回 (概率数组, 有效邮件下标列表)
+        """
+        spam_probs, valid, _ = self._score_batch(email_texts, processed_texts)
+        return spam_probs, valid
+    
+    def _score_batch(self, email_texts, processed_texts=None, skip=()):
+        """
+        spam_probabilities 的实现，另外返回有效邮件的特征矩阵（供解释使用）
+        skip: 已由缓存给出结果、不需要打分的邮件下标
+        """
+        if processed_texts is None:
+            processed_texts = self._timed_preprocess(email_texts)
+        valid = [i for i, text in enumerate(processed_texts)
+                 if text and len(text.strip()) >= 5 and i not in skip]
+        
+        spam_probs = np.zeros(len(email_texts))
+        email_dense = None
+        if valid:
+            email_dense = self.build_features([processed_texts[i] for i in valid],
+                                              [email_texts[i] for i in valid])
+            spam_probs[valid] = self._timed_predict_proba(email_dense)[:, 1]
+        
+        return spam_probs, valid, email_dense
+    
+    def predict_batch(self, email_texts, explain=False, top_k=10):
+        """
+        批量预测多封邮件，返回与 predict 相同格式的结果列表
+        explain: 与 predict 相同，整批一次计算解释
+        """
+        start = time.perf_counter()
+        results = self._predict_batch(email_texts, explain, top_k)
+        if self.metrics is not None:
+            self.metrics.observe_batch(time.perf_counter() - start,
+                                       [result['prediction'] for result in results])
+        return results
+    
+    def _predict_batch(self, email_texts, explain=False, top_k=10):
+        try:
+            # 命中已知垃圾邮件指纹或被邮件头预分类拒收的邮件不再预处理
+            cached = {}
+            for i, text in enumerate(email_texts):
+                if self._known_spam(text):
+                    cached[i] = dict(KNOWN_SPAM_RESULT)
+                    continue
+                header_result = self._header_verdict(text)
+                if header_result is not None:
+                    cached[i] = header_result
+            remaining = [i for i in range(len(email_texts)) if i not in cached]
+            hosts = [] if self.domain_reputation is not None else None
+            processed_texts = [''] * len(email_texts)
+            for i, text in zip(remaining, self._timed_preprocess([email_texts[i] for i in remaining], hosts)):
+                processed_texts[i] = text
+            if hosts is not None:
+                for i, email_hosts in zip(remaining, hosts):
+                    domain_result = self._domain_verdict(email_hosts)
+                    if domain_result is not None:
+                        cached[i] = domain_result
+            signatures = {}
+            if self.verdict_cache is not None and not explain:
+                for i, text in enumerate(processed_texts):
+                    if i not in cached and text and len(text.strip()) >= 5:
+                        signatures[i] = self.verdict_cache.signature(text)
+                        hit = self._cached_verdict(signatures[i])
+                        if hit is not None:
+                            cached[i] = hit
+            
+            spam_probs, valid, email_dense = self._score_batch(email_texts, processed_texts, cached)
+            explanations = {}
+            if explain and valid:
+                explanations = dict(zip(valid, self.explain_features(email_dense, top_k)))
+        except Exception as e:
+            return [{
+                'prediction': '错误',
+                'confidence': 0.0,
+                'error': str(e)
+            } for _ in email_texts]
+        
+        valid = set(valid)
+        results = []
+        for i, spam_prob in enumerate(spam_probs):
+            if i in cached:
+                results.append(cached[i])
+                continue
+            if i not in valid:
+                results.append({
+                    'prediction': '无法判断',
+                    'confidence': 0.0,
+                    'spam_probability': 0.0,
+                    'reason': '邮件内容过短或无效'
+                })
+                continue
+            
+            prediction = 1 if spam_prob >= self.threshold else 0
+            confidence = float(spam_prob if prediction == 1 else 1 - spam_prob)
+            
+            results.append({
+                'prediction': '垃圾邮件' if prediction == 1 else '正常邮件',
+                'confidence': confidence,
+                'spam_probability': float(spam_prob),
+                'used_threshold': self.threshold
+            })
+            if i in explanations:
+                results[-1]['explanation'] = explanations[i]
+            elif i in signatures:
+                self.verdict_cache.add(signatures[i], results[-1])
+        
+        return results
+
 def main():
     print("=== 改进版垃圾邮件分类器演示 ===")
     
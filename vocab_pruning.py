@@ -0,0 +1,335 @@
+"""
+词表压缩：去掉模型几乎不用的 TF-IDF 词项，生成更小的模型文件组（模型、向量器、阈值）
+refit（默认）: 用压缩后的向量器构造语料特征，以相同超参数从头训练；按文件夹分层留出一部分语料，
+               同时在同一训练部分上用原词表以相同超参数重新训练作为对照，压缩的影响 = 压缩后 - 原词表重训，
+               两者的阈值都在训练部分的交叉验证概率上重新扫描，准确率都在留出的部分上比较
+reproject: 梯度提升模型保留原有的树，只把分裂用到的特征下标映射到新词表，不需要重新训练，在全部语料上比较，
+           阈值沿用原模型（概率分布已变化，会打印提示）
+报告 data/english 每个文件夹的准确率变化，以及文件大小、加载时间、模型内存和延迟的变化
+
+    python vocab_pruning.py --model-dir models/model3 --output-dir models/model3_pruned
+    python vocab_pruning.py --model-dir models/model3 --keep-importance 0.99 --holdout 0.25
+    python vocab_pruning.py --model-dir models/model3 --mode reproject
+
+注意：向量器做 L2 归一化，去掉的词项不再参与归一化，保留词项的 TF-IDF 值会变大，
+所以即使只去掉从未用于分裂的词项，重投影后的预测也会变化（Model 3 上各文件夹准确率下降 3%~9%），
+一般应使用 refit；原模型的训练集未知，留出部分可能在原模型的训练集中，原模型的准确率会偏高
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+import corpus
+import utils
+from threshold_optimizer import candidate_thresholds, model_paths, select_threshold, sweep_thresholds
+
+
+def feature_importance(model):
+    """
+    每个输入特征的重要性
+    梯度提升模型为该特征所有分裂的增益之和；线性模型为系数绝对值；随机森林等使用 feature_importances_
+    """
+    if isinstance(model, HistGradientBoostingClassifier):
+        importance = np.zeros(model.n_features_in_)
+        for predictors in model._predictors:
+            for predictor in predictors:
+                nodes = predictor.nodes[predictor.nodes['is_leaf'] == 0]
+                np.add.at(importance, nodes['feature_idx'], nodes['gain'])
+        return importance
+    if hasattr(model, 'coef_'):
+        return np.abs(model.coef_).sum(axis=0)
+    if hasattr(model, 'feature_importances_'):
+        return np.asarray(model.feature_importances_, dtype=float)
+    raise ValueError(f"不支持计算 {type(model).__name__} 的特征重要性")
+
+
+def select_terms(importance, n_tokens, keep_importance=1.0, max_terms=None):
+    """
+    按重要性从高到低选取词项，直到累计重要性达到词项总重要性的 keep_importance 比例
+    重要性为 0 的词项总是去掉；max_terms 限制最多保留的词项数
+    返回保留的词项下标（升序）
+    """
+    token_importance = importance[:n_tokens]
+    order = np.argsort(-token_importance, kind='stable')
+    order = order[token_importance[order] > 0]
+    if len(order) and keep_importance < 1.0:
+        cumulative = np.cumsum(token_importance[order]) / token_importance[order].sum()
+        order = order[:int(np.searchsorted(cumulative, keep_importance)) + 1]
+    if max_terms is not None:
+        order = order[:max_terms]
+    return np.sort(order)
+
+
+def prune_vectorizer(vectorizer, kept_terms):
+    """只保留 kept_terms 中的词项（按原下标顺序重新编号），idf 取对应的值"""
+    idf = vectorizer.idf_
+    terms = vectorizer.get_feature_names_out()
+    pruned = copy.deepcopy(vectorizer)
+    pruned.vocabulary_ = {terms[old]: new for new, old in enumerate(kept_terms)}
+    pruned.idf_ = idf[kept_terms]
+    pruned._tfidf.n_features_in_ = len(kept_terms)
+    if hasattr(pruned, 'stop_words_'):
+        del pruned.stop_words_
+    return pruned
+
+
+def reproject_model(model, kept_columns):
+    """
+    梯度提升模型的树结构和阈值保持不变，只把分裂特征的下标映射到保留的列
+    被去掉的列必须没有被任何分裂使用
+    """
+    if not isinstance(model, HistGradientBoostingClassifier):
+        raise ValueError(f"{type(model).__name__} 不支持直接重投影，请使用 --refit")
+    if model.is_categorical_ is not None:
+        raise ValueError("包含类别特征的模型不支持直接重投影，请使用 --refit")
+
+    mapping = np.full(model.n_features_in_, -1, dtype=np.int64)
+    mapping[kept_columns] = np.arange(len(kept_columns))
+    model = copy.deepcopy(model)
+    for predictors in model._predictors:
+        for predictor in predictors:
+            nodes = predictor.nodes
+            splits = nodes['is_leaf'] == 0
+            new_index = mapping[nodes['feature_idx'][splits]]
+            if (new_index < 0).any():
+                raise ValueError("被去掉的特征仍被模型的分裂使用，无法直接重投影")
+            nodes['feature_idx'][splits] = new_index
+
+    bin_mapper = model._bin_mapper
+    bin_mapper.bin_thresholds_ = [bin_mapper.bin_thresholds_[i] for i in kept_columns]
+    bin_mapper.n_bins_non_missing_ = bin_mapper.n_bins_non_missing_[kept_columns]
+    bin_mapper.is_categorical_ = bin_mapper.is_categorical_[kept_columns]
+    model.n_features_in_ = len(kept_columns)
+    model._n_features = len(kept_columns)
+    return model
+
+
+def preprocess_corpus(predictor, data_dir):
+    texts, labels, groups, _ = corpus.load_labeled_corpus(data_dir)
+    start = time.perf_counter()
+    processed = [predictor.preprocess_email(text) for text in texts]
+    print(f"预处理 {len(texts)} 封邮件用时 {time.perf_counter() - start:.1f} 秒")
+    return texts, processed, np.array(labels), np.array(groups)
+
+
+def refit_model(model, predictor, texts, processed, labels, groups, cv=3, seed=0):
+    """
+    用预测器的向量器构造训练语料的特征，以相同超参数从头训练，返回 (模型, 阈值)
+    阈值与 threshold_optimizer 相同取 F1 最高，但在 cv 折交叉验证的概率上扫描：
+    训练集上的拟合概率过于自信，扫描出的阈值没有意义
+    """
+    valid = [i for i, text in enumerate(processed) if text and len(text.strip()) >= 5]
+    X = predictor.build_features([processed[i] for i in valid], [texts[i] for i in valid])
+    y = labels[valid]
+    start = time.perf_counter()
+    folds = StratifiedKFold(cv, shuffle=True, random_state=seed)
+    scores = cross_val_predict(clone(model), X, y, cv=folds, method='predict_proba')[:, 1]
+    thresholds = candidate_thresholds(scores)
+    threshold = float(thresholds[select_threshold(sweep_thresholds(scores, y, groups[valid], thresholds))])
+    model = clone(model).fit(X, y)
+    print(f"重新训练（含 {cv} 折阈值扫描）用时 {time.perf_counter() - start:.1f} 秒，阈值 {threshold:.4f}")
+    return model, threshold
+
+
+def folder_accuracy(predictor, texts, processed, labels, groups, batch_size=256):
+    """每个文件夹在预测器阈值下的准确率（内容无效的邮件按 predict 的规则记为正常邮件）"""
+    spam_probs = np.zeros(len(texts))
+    for start in range(0, len(texts), batch_size):
+        end = start + batch_size
+        spam_probs[start:end] = predictor.spam_probabilities(texts[start:end], processed[start:end])[0]
+    predictions = (spam_probs >= predictor.threshold).astype(int)
+    return {folder: float((predictions[groups == folder] == labels[groups == folder]).mean())
+            for folder in corpus.ENGLISH_FOLDERS if folder in groups}
+
+
+def artifact_size(model_dir):
+    return sum(os.path.getsize(path) for path in model_paths(model_dir) if os.path.exists(path))
+
+
+def load_profile(model_dir):
+    """
+    在新的解释器中加载模型文件组，返回 (加载耗时秒, 加载后模型占用的内存 MB)
+    先导入 sklearn 再计时，内存用 tracemalloc 统计加载期间新分配且仍在使用的部分
+    """
+    code = (
+        "import sys, time, tracemalloc, joblib\n"
+        "import sklearn.ensemble, sklearn.feature_extraction.text\n"
+        "tracemalloc.start()\n"
+        "start = time.perf_counter()\n"
+        "loaded = [joblib.load(path) for path in sys.argv[1:]]\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, tracemalloc.get_traced_memory()[0] / 2 ** 20)\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code, *model_paths(model_dir)],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def latency(predictor, texts, batch_size=64, repeat=3):
+    """单封 predict 的平均耗时与 batch_size 封 predict_batch 的耗时（秒，repeat 次取最少）"""
+    sample = texts[::max(1, len(texts) // batch_size)][:batch_size]
+    predictor.predict_batch(sample)  # 预热
+    single, batch = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in sample:
+            predictor.predict(text)
+        single.append((time.perf_counter() - start) / len(sample))
+        start = time.perf_counter()
+        predictor.predict_batch(sample)
+        batch.append(time.perf_counter() - start)
+    return min(single), min(batch)
+
+
+def profile(model_dir, predictor, texts):
+    load_s, memory_mb = load_profile(model_dir)
+    single_s, batch_s = latency(predictor, texts)
+    return {
+        'files_bytes': artifact_size(model_dir),
+        'load_s': load_s,
+        'model_memory_mb': memory_mb,
+        'predict_s': single_s,
+        'predict_batch_64_s': batch_s,
+        'feature_width': len(predictor.vectorizer.vocabulary_) + len(utils.ADVERSARIAL_FEATURE_NAMES),
+    }
+
+
+def save_artifacts(model, vectorizer, model_dir, output_dir, threshold=None):
+    """保存压缩后的模型和向量器；阈值为重新扫描的结果，未给出时复制原阈值文件"""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    _, _, threshold_path = model_paths(model_dir)
+    output_model, output_vectorizer, output_threshold = model_paths(output_dir)
+    joblib.dump(model, output_model)
+    joblib.dump(vectorizer, output_vectorizer)
+    if threshold is not None:
+        joblib.dump(threshold, output_threshold)
+    elif os.path.exists(threshold_path):
+        shutil.copy(threshold_path, output_threshold)
+        print("警告: 阈值沿用原模型，压缩后概率分布已变化，"
+              f"可用 python threshold_optimizer.py --model-dir {output_dir} 重新扫描")
+
+
+def print_report(report):
+    before, after = report['before'], report['after']
+    print(f"\n=== 词表压缩：{report['terms_before']} -> {report['terms_after']} 个词项"
+          f"（{report['mode']}，在 {report['eval_size']} 封邮件上比较）===")
+    full_refit = report.get('accuracy_full_refit')
+    if full_refit is not None:
+        # 原模型只作参考；压缩的影响与同一划分、同一超参数下的原词表重训比较
+        print(f"{'文件夹':<24}{'原模型':>10}{'原词表重训':>10}{'压缩后':>10}{'压缩影响':>10}")
+        for folder, accuracy in report['accuracy_before'].items():
+            full, pruned = full_refit[folder], report['accuracy_after'][folder]
+            print(f"{folder:<24}{accuracy:>10.2%}{full:>10.2%}{pruned:>10.2%}{pruned - full:>+10.2%}")
+        print(f"阈值：原模型 {report['threshold_before']:.4f}，原词表重训 {report['threshold_full_refit']:.4f}，"
+              f"压缩后 {report['threshold_after']:.4f}")
+    else:
+        print(f"{'文件夹':<24}{'压缩前':>10}{'压缩后':>10}{'变化':>10}")
+        for folder, accuracy in report['accuracy_before'].items():
+            pruned = report['accuracy_after'][folder]
+            print(f"{folder:<24}{accuracy:>10.2%}{pruned:>10.2%}{pruned - accuracy:>+10.2%}")
+    rows = [
+        ('文件大小 (KB)', 'files_bytes', 1 / 1024),
+        ('加载耗时 (ms)', 'load_s', 1000),
+        ('模型内存 (MB)', 'model_memory_mb', 1),
+        ('单封 predict (ms)', 'predict_s', 1000),
+        ('64 封 predict_batch (ms)', 'predict_batch_64_s', 1000),
+        ('特征宽度', 'feature_width', 1),
+    ]
+    print(f"\n{'指标':<24}{'压缩前':>10}{'压缩后':>10}{'节省':>10}")
+    for label, key, scale in rows:
+        saving = 1 - after[key] / before[key] if before[key] else 0.0
+        print(f"{label:<24}{before[key] * scale:>10.1f}{after[key] * scale:>10.1f}{saving:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="词表压缩")
+    parser.add_argument('--model-dir', default='models/model3')
+    parser.add_argument('--output-dir', default=None, help="压缩后的模型目录（默认 <model-dir>_pruned）")
+    parser.add_argument('--data-dir', default='data/english')
+    parser.add_argument('--keep-importance', type=float, default=1.0,
+                        help="保留累计重要性达到该比例的词项（默认 1.0：只去掉从未使用的词项）")
+    parser.add_argument('--max-terms', type=int, default=None, help="最多保留的词项数")
+    parser.add_argument('--mode', choices=('refit', 'reproject'), default='refit')
+    parser.add_argument('--holdout', type=float, default=0.25, help="refit 时按文件夹分层留出用于比较的比例")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    output_dir = args.output_dir or os.path.normpath(args.model_dir) + '_pruned'
+
+    predictor = utils.SpamPredictor(*model_paths(args.model_dir), metrics=False)
+    n_tokens = len(predictor.vectorizer.vocabulary_)
+    importance = feature_importance(predictor.model)
+    kept_terms = select_terms(importance, n_tokens, args.keep_importance, args.max_terms)
+    kept_columns = np.concatenate([kept_terms, np.arange(n_tokens, len(importance))])
+    print(f"保留 {len(kept_terms)}/{n_tokens} 个词项，"
+          f"覆盖 {importance[kept_terms].sum() / max(importance[:n_tokens].sum(), 1e-12):.2%} 的词项重要性")
+
+    texts, processed, labels, groups = preprocess_corpus(predictor, args.data_dir)
+    vectorizer = prune_vectorizer(predictor.vectorizer, kept_terms)
+    evaluation = np.arange(len(texts))
+    full_predictor = threshold = None
+    if args.mode == 'refit':
+        from sklearn.model_selection import train_test_split
+
+        train, evaluation = train_test_split(evaluation, test_size=args.holdout, stratify=groups,
+                                             random_state=args.seed)
+        train_texts = [texts[i] for i in train]
+        train_processed = [processed[i] for i in train]
+        # 对照：原词表在同一训练部分上重训，与压缩后的差距才只来自去掉的词项
+        full_predictor = copy.copy(predictor)
+        full_predictor.model, full_predictor.threshold = refit_model(
+            predictor.model, predictor, train_texts, train_processed, labels[train], groups[train], seed=args.seed)
+        pruned_predictor = copy.copy(predictor)
+        pruned_predictor.vectorizer = vectorizer
+        model, threshold = refit_model(predictor.model, pruned_predictor, train_texts, train_processed,
+                                       labels[train], groups[train], seed=args.seed)
+    else:
+        try:
+            model = reproject_model(predictor.model, kept_columns)
+        except ValueError as e:
+            parser.error(f"{e}（--keep-importance 小于 1 或设置 --max-terms 时通常需要 --mode refit）")
+    save_artifacts(model, vectorizer, args.model_dir, output_dir, threshold)
+
+    pruned_predictor = utils.SpamPredictor(*model_paths(output_dir), metrics=False)
+    eval_texts = [texts[i] for i in evaluation]
+    eval_processed = [processed[i] for i in evaluation]
+    report = {
+        'model_dir': args.model_dir,
+        'output_dir': output_dir,
+        'mode': args.mode,
+        'terms_before': n_tokens,
+        'terms_after': int(len(kept_terms)),
+        'eval_size': int(len(evaluation)),
+        'accuracy_before': folder_accuracy(predictor, eval_texts, eval_processed,
+                                           labels[evaluation], groups[evaluation]),
+        'accuracy_after': folder_accuracy(pruned_predictor, eval_texts, eval_processed,
+                                          labels[evaluation], groups[evaluation]),
+        'threshold_before': float(predictor.threshold),
+        'threshold_after': float(pruned_predictor.threshold),
+        'before': profile(args.model_dir, predictor, texts),
+        'after': profile(output_dir, pruned_predictor, texts),
+    }
+    if full_predictor is not None:
+        report['accuracy_full_refit'] = folder_accuracy(full_predictor, eval_texts, eval_processed,
+                                                        labels[evaluation], groups[evaluation])
+        report['threshold_full_refit'] = float(full_predictor.threshold)
+    print_report(report)
+    report_path = os.path.join(output_dir, 'pruning_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 压缩后的模型已保存到: {output_dir}/，报告: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
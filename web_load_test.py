@@ -0,0 +1,86 @@
+"""
+网页界面并发压测：多个模拟用户各自通过 gradio_client 连续提交语料中的邮件，
+统计端到端延迟分位数、吞吐量和失败数
+
+    python english_spam_check.py &
+    python web_load_test.py --users 50 --requests 20
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+import corpus
+
+
+def load_texts(limit):
+    texts = []
+    for folder in ('data/english/spam', 'data/english/ham'):
+        for file_path in corpus.list_folder(folder)[:limit // 2]:
+            texts.append(corpus.read_email(file_path))
+    return texts
+
+
+def run_user(url, texts, offset, count, latencies, errors, lock):
+    from gradio_client import Client
+
+    client = Client(url, verbose=False)
+    for i in range(count):
+        text = texts[(offset + i) % len(texts)]
+        start = time.perf_counter()
+        try:
+            html = client.predict(text, api_name="/check")
+            ok = "处理结果" in html
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def load_test(url, users=50, requests=20, corpus_size=400):
+    texts = load_texts(corpus_size)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=run_user, args=(url, texts, i * requests, requests, latencies, errors, lock))
+               for i in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    p50, p95, p99 = np.quantile(latencies, (0.5, 0.95, 0.99)) if latencies else (0.0, 0.0, 0.0)
+    return {
+        'users': users,
+        'completed': len(latencies),
+        'errors': len(errors),
+        'wall_s': wall,
+        'throughput_per_s': len(latencies) / wall,
+        'p50_ms': p50 * 1000,
+        'p95_ms': p95 * 1000,
+        'p99_ms': p99 * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网页界面并发压测")
+    parser.add_argument('--url', default='http://127.0.0.1:7860/')
+    parser.add_argument('--users', type=int, default=50, help="并发用户数")
+    parser.add_argument('--requests', type=int, default=20, help="每个用户的提交数")
+    args = parser.parse_args()
+
+    stats = load_test(args.url, args.users, args.requests)
+    print(f"📊 {stats['users']} 个用户：完成 {stats['completed']}，失败 {stats['errors']}，"
+          f"耗时 {stats['wall_s']:.1f} 秒，吞吐 {stats['throughput_per_s']:.1f} 封/秒")
+    print(f"📊 延迟 p50 {stats['p50_ms']:.0f} ms，p95 {stats['p95_ms']:.0f} ms，p99 {stats['p99_ms']:.0f} ms")
+    if stats['errors'] == 0:
+        print("✅ 压测期间没有失败的请求")
+
+
+if __name__ == "__main__":
+    main()